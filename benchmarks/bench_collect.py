@@ -0,0 +1,138 @@
+"""
+    End-to-end benchmark of collectswitchfacts_hybrid.py against fake switches.
+
+        python benchmarks/bench_collect.py --hosts 10 100 1000 --json bench-collect.json
+
+    For every inventory size a fresh working directory gets a fake switch inventory and
+    the collector runs in its own process, so wall time, hosts per second and peak RSS
+    belong to that run alone. Per-phase cost comes from the ALL rows of the run's Run Stats
+    sheet. --compare checks the results against an earlier --json file.
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+from fakeinventory import write_inventory
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+COLLECTOR = REPO / 'collectswitchfacts_hybrid.py'
+
+
+def run_collector(workdir, formats):
+    """
+    Run the collector in workdir and return (wall seconds, peak RSS in MB, exit status).
+    """
+    args = [sys.executable, str(COLLECTOR), '--metrics', 'metrics.prom']
+    for fmt in formats:
+        args += ['--format', fmt]
+    start = time.perf_counter()
+    process = subprocess.Popen(args, cwd=str(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    #wait4 reports the resource usage of this child only.
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    #ru_maxrss is in kilobytes on Linux.
+    return wall, usage.ru_maxrss / 1024.0, process.returncode
+
+
+def phase_costs(workdir):
+    """
+    Sum the Run Stats ALL rows over models and OS versions: total seconds, span count and
+    the largest p95 and max per phase.
+    """
+    phases = {}
+    for stats_file in pathlib.Path(workdir).glob('NACFACTS-*/run-stats.csv.gz'):
+        with gzip.open(stats_file, 'rt', newline='') as f:
+            for row in csv.DictReader(f):
+                if row['Switch'] != 'ALL':
+                    continue
+                phase = phases.setdefault(row['Phase'], {'count': 0, 'total': 0.0, 'p95': 0.0, 'max': 0.0})
+                phase['count'] += int(row['Count'])
+                phase['total'] += float(row['Total Seconds'])
+                phase['p95'] = max(phase['p95'], float(row['p95']))
+                phase['max'] = max(phase['max'], float(row['Max']))
+    return phases
+
+
+def bench(hosts, args):
+    with tempfile.TemporaryDirectory(prefix='nacbench-') as workdir:
+        write_inventory(workdir, hosts=hosts, ports=args.ports, macs_per_port=args.macs_per_port, latency=args.latency, failure_rate=args.failure_rate, workers=args.workers)
+        wall, rss, status = run_collector(workdir, args.formats)
+        return {
+            'hosts': hosts,
+            'seconds': round(wall, 3),
+            'hosts_per_second': round(hosts / wall, 2),
+            'peak_rss_mb': round(rss, 1),
+            'status': status,
+            'phases': phase_costs(workdir),
+        }
+
+
+def print_result(result):
+    print(f"\n{result['hosts']} hosts: {result['seconds']:.2f}s, {result['hosts_per_second']:.1f} hosts/s, peak RSS {result['peak_rss_mb']:.1f} MB, exit status {result['status']}")
+    print(f"  {'phase':34} {'spans':>7} {'total s':>10} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, phase in sorted(result['phases'].items(), key=lambda item: -item[1]['total']):
+        mean = phase['total'] / phase['count'] * 1000 if phase['count'] else 0
+        print(f"  {name:34} {phase['count']:7d} {phase['total']:10.3f} {mean:9.2f} {phase['p95'] * 1000:9.2f} {phase['max'] * 1000:9.2f}")
+
+
+def compare(results, baseline_file, tolerance):
+    """
+    Return the regressions of results against a baseline --json file: runs whose wall time
+    or peak RSS grew by more than tolerance.
+    """
+    with open(baseline_file) as f:
+        baseline = {run['hosts']: run for run in json.load(f)['runs']}
+    regressions = []
+    for result in results:
+        before = baseline.get(result['hosts'])
+        if not before:
+            continue
+        for key in ('seconds', 'peak_rss_mb'):
+            if result[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{result['hosts']} hosts: {key} {before[key]} -> {result[key]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the discovery collector against fake switches.')
+    parser.add_argument('--hosts', type=int, nargs='+', default=[10, 100, 1000], help='inventory sizes (default: 10 100 1000)')
+    parser.add_argument('--ports', type=int, default=48)
+    parser.add_argument('--macs-per-port', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per fake getter call')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=20)
+    parser.add_argument('--format', dest='formats', action='append', help='collector output format (default: xlsx and csv)')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    parser.add_argument('--compare', default=None, help='baseline --json file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown or RSS growth against the baseline (default: 0.2)')
+    args = parser.parse_args(argv)
+    args.formats = args.formats or ['xlsx', 'csv']
+
+    results = []
+    for hosts in args.hosts:
+        result = bench(hosts, args)
+        print_result(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'collect', 'ports': args.ports, 'macs_per_port': args.macs_per_port, 'latency': args.latency, 'runs': results}, f, indent=1)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print('!Regression:', regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
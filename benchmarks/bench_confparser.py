@@ -0,0 +1,71 @@
+"""
+    Benchmark iosnacconfparser.py on generated switch configurations.
+
+        python benchmarks/bench_confparser.py --files 500 --ports 48 --json bench-confparser.json
+
+    Generates configs with napalm_fakeswitch.generate_config, then times a full rebuild with
+    each engine and an incremental run where every file is skipped by the manifest.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+
+from napalm_fakeswitch import generate_config, host_seed
+
+PARSER = REPO / 'iosnacconfparser.py'
+
+
+def write_configs(directory, files, ports):
+    directory.mkdir(parents=True, exist_ok=True)
+    for number in range(files):
+        hostname = 'fake-sw%04d' % number
+        (directory / (hostname + '.txt')).write_text(generate_config(hostname, ports, seed=host_seed(hostname)))
+
+
+def run_parser(workdir, args):
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, str(PARSER)] + args, cwd=str(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    #wait4 reports the resource usage of this child and its waited-for workers.
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return time.perf_counter() - start, usage.ru_maxrss / 1024.0, process.returncode
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark iosnacconfparser.py on generated configurations.')
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--ports', type=int, default=48)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--engines', nargs='+', default=['scan', 'ciscoconfparse'])
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    runs = []
+    with tempfile.TemporaryDirectory(prefix='nacconfbench-') as workdir:
+        workdir = pathlib.Path(workdir)
+        write_configs(workdir / 'configs', args.files, args.ports)
+        for engine in args.engines:
+            common = ['--configs', 'configs', '--output', 'nac-' + engine, '--workers', str(args.workers), '--engine', engine]
+            for mode, extra in (('full', ['--force']), ('incremental', [])):
+                seconds, rss, status = run_parser(workdir, common + extra)
+                run = {'engine': engine, 'mode': mode, 'files': args.files, 'seconds': round(seconds, 3), 'files_per_second': round(args.files / seconds, 1), 'peak_rss_mb': round(rss, 1), 'status': status}
+                runs.append(run)
+                print(f"{engine:15} {mode:12} {args.files} files: {seconds:.2f}s, {run['files_per_second']:.1f} files/s, peak RSS {rss:.1f} MB, exit status {status}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'confparser', 'ports': args.ports, 'workers': args.workers, 'runs': runs}, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
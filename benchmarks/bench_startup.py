@@ -0,0 +1,87 @@
+"""
+    Startup time of the command line tools.
+
+        python benchmarks/bench_startup.py --repeat 10 --json bench-startup.json
+
+    Times '--help' of every nacdiscovery.py command, and a bare import of each module, in a
+    fresh interpreter per run, and reports the median and best wall time. The import runs
+    also say whether Nornir, napalm, netmiko or paramiko were loaded. --compare checks the
+    results against an earlier --json file.
+"""
+
+import argparse
+import json
+import pathlib
+import statistics
+import subprocess
+import sys
+import time
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+
+COMMANDS = ['collect', 'replay', 'parse-configs', 'shards', 'db', 'config-store']
+MODULES = ['nacdiscovery', 'collectswitchfacts_hybrid', 'iosnacconfparser', 'nacshards', 'nacdb', 'nacconfigstore', 'nacscheduler', 'nacoutput']
+
+#Modules that must not be loaded at startup.
+HEAVY_MODULES = ('nornir', 'napalm', 'netmiko', 'paramiko')
+
+IMPORT_CHECK = "import sys, %s; print(' '.join(m for m in %r if m in sys.modules))"
+
+
+def run(args):
+    """Wall seconds and standard output of one fresh interpreter."""
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-W', 'ignore'] + args, cwd=str(REPO), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+    seconds = time.perf_counter() - start
+    if completed.returncode:
+        raise RuntimeError('%s exited with status %d' % (' '.join(args), completed.returncode))
+    return seconds, completed.stdout
+
+
+def measure(name, args, repeat):
+    times = []
+    output = ''
+    for _ in range(repeat):
+        seconds, output = run(args)
+        times.append(seconds)
+    return {'name': name, 'median_ms': round(statistics.median(times) * 1000, 1), 'best_ms': round(min(times) * 1000, 1)}, output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the startup time of the command line tools.')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, the median is reported')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    parser.add_argument('--compare', default=None, help='earlier --json results to compare with')
+    args = parser.parse_args(argv)
+
+    runs = []
+    baseline, _ = measure('python', ['-c', 'pass'], args.repeat)
+    runs.append(baseline)
+    print(f"{'python':40} {baseline['median_ms']:8.1f} ms")
+    for command in COMMANDS:
+        result, _ = measure('nacdiscovery.py %s --help' % command, ['nacdiscovery.py', command, '--help'], args.repeat)
+        runs.append(result)
+        print(f"{result['name']:40} {result['median_ms']:8.1f} ms")
+    for module in MODULES:
+        result, output = measure('import ' + module, ['-c', IMPORT_CHECK % (module, HEAVY_MODULES)], args.repeat)
+        result['heavy_modules'] = output.split()
+        runs.append(result)
+        print(f"{result['name']:40} {result['median_ms']:8.1f} ms" + (f"  loads {', '.join(result['heavy_modules'])}" if result['heavy_modules'] else ''))
+
+    if args.compare:
+        with open(args.compare) as f:
+            earlier = {run['name']: run for run in json.load(f)['runs']}
+        print('\nChange in median against %s:' % args.compare)
+        for result in runs:
+            if result['name'] in earlier:
+                before = earlier[result['name']]['median_ms']
+                print(f"{result['name']:40} {before:8.1f} -> {result['median_ms']:8.1f} ms ({result['median_ms'] / before:.2f}x)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'startup', 'repeat': args.repeat, 'runs': runs}, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
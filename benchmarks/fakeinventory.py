@@ -0,0 +1,124 @@
+"""
+    Generate a Nornir inventory of synthetic switches served by the napalm_fakeswitch driver.
+
+        python benchmarks/fakeinventory.py --hosts 100 --ports 48 --macs-per-port 4 bench-run
+
+    writes config.yaml, hosts.yaml and groups.yaml to bench-run/, which can then be used as
+    the working directory of collectswitchfacts_hybrid.py. With --sites N the hosts are spread
+    round-robin over the sites bench-site00 to bench-site<N-1> for nacshards.py. --source csv
+    or json writes the hosts as a devices.csv/devices.json export for nacinventory.FileInventory
+    instead of hosts.yaml. --procurve-ratio puts that share of the hosts in a fakeprocurve
+    group whose switches answer like HP Procurve ones, for mixed-vendor runs.
+"""
+
+import argparse
+import copy
+import csv
+import json
+import pathlib
+
+import yaml
+
+#Site targeted by the collector's inventory filter.
+SITE = 'herndon-dev'
+
+
+def write_inventory(directory, hosts=10, ports=48, macs_per_port=4, multimac_ratio=0.1, latency=0.0, failure_rate=0.0, transient_rate=0.0, workers=20, seed=0, sites=1, source='yaml', procurve_ratio=0.0):
+    """
+    Write a SimpleInventory config for hosts fake switches to directory and return its path.
+    """
+    path = pathlib.Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    if source == 'yaml':
+        inventory_config = {
+            'plugin': 'nornir.plugins.inventory.simple.SimpleInventory',
+            'options': {'host_file': 'hosts.yaml', 'group_file': 'groups.yaml'},
+        }
+    else:
+        inventory_config = {
+            'plugin': 'nacinventory.FileInventory',
+            'options': {'source': 'devices.' + source, 'group_file': 'groups.yaml', 'cache_dir': '.inventory-cache'},
+        }
+    config = {
+        'core': {'num_workers': workers},
+        'inventory': inventory_config,
+    }
+    groups = {
+        'fakeswitch': {
+            'platform': 'fakeswitch',
+            'username': 'bench',
+            'password': 'bench',
+            'connection_options': {
+                'napalm': {
+                    'extras': {
+                        'optional_args': {
+                            'ports': ports,
+                            'macs_per_port': macs_per_port,
+                            'multimac_ratio': multimac_ratio,
+                            'latency': latency,
+                            'failure_rate': failure_rate,
+                            'transient_rate': transient_rate,
+                            'seed': seed,
+                        },
+                    },
+                },
+            },
+        },
+    }
+    groups['fakeprocurve'] = copy.deepcopy(groups['fakeswitch'])
+    groups['fakeprocurve']['connection_options']['napalm']['extras']['optional_args']['personality'] = 'procurve'
+    inventory = {}
+    for number in range(hosts):
+        name = 'fake-sw%04d' % number
+        #Spread the Procurve hosts evenly through the inventory.
+        procurve = int((number + 1) * procurve_ratio) > int(number * procurve_ratio)
+        inventory[name] = {
+            'hostname': name,
+            'groups': ['fakeprocurve' if procurve else 'fakeswitch'],
+            'data': {
+                'site': SITE if sites == 1 else 'bench-site%02d' % (number % sites),
+                'role': 'core' if number % 50 == 0 else 'access',
+                'tags': ['bench'],
+            },
+        }
+    with open(path / 'config.yaml', 'w') as f:
+        yaml.safe_dump(config, f, default_flow_style=False)
+    with open(path / 'groups.yaml', 'w') as f:
+        yaml.safe_dump(groups, f, default_flow_style=False)
+    if source == 'yaml':
+        with open(path / 'hosts.yaml', 'w') as f:
+            yaml.safe_dump(inventory, f, default_flow_style=False)
+    elif source == 'json':
+        with open(path / 'devices.json', 'w') as f:
+            json.dump([dict(host['data'], name=name, hostname=host['hostname'], groups=host['groups']) for name, host in inventory.items()], f)
+    else:
+        with open(path / 'devices.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'hostname', 'groups', 'site', 'role', 'tags'])
+            for name, host in inventory.items():
+                writer.writerow([name, host['hostname'], ';'.join(host['groups']), host['data']['site'], host['data']['role'], ';'.join(host['data']['tags'])])
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a Nornir inventory of fake switches.')
+    parser.add_argument('directory', help='directory for config.yaml, hosts.yaml and groups.yaml')
+    parser.add_argument('--hosts', type=int, default=10)
+    parser.add_argument('--ports', type=int, default=48)
+    parser.add_argument('--macs-per-port', type=int, default=4, help='MACs on each multi-MAC port')
+    parser.add_argument('--multimac-ratio', type=float, default=0.1, help='share of ports with several MACs')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per getter call')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of hosts that always fail')
+    parser.add_argument('--transient-rate', type=float, default=0.0, help='chance each connection attempt fails')
+    parser.add_argument('--workers', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source', choices=('yaml', 'csv', 'json'), default='yaml', help='host file format (default: yaml, a SimpleInventory)')
+    parser.add_argument('--sites', type=int, default=1, help='spread the hosts over this many sites (default: 1, %s)' % SITE)
+    parser.add_argument('--procurve-ratio', type=float, default=0.0, help='share of hosts answering like HP Procurve switches')
+    args = parser.parse_args(argv)
+    write_inventory(args.directory, args.hosts, args.ports, args.macs_per_port, args.multimac_ratio, args.latency, args.failure_rate, args.transient_rate, args.workers, args.seed, args.sites, args.source, args.procurve_ratio)
+    print('Inventory for', args.hosts, 'fake switches written to', args.directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,301 +7,618 @@
     Currently Recommendations based on based on LLDP Vendorlookup, RemoteCapability,
     Description keywords, and multiple macs present on port.
 
-    Refactor of collectswitchfacts.py - combined napalm getters and introduced logic for HP Procurve.
-    Might require additional logic to run in multivendor scenarios.
+    Refactor of collectswitchfacts.py - combined napalm getters. Each host's getter output is
+    normalized for its platform (see nacnormalize) and processed as soon as its getters return
+    (see HostStreamProcessor). The command line options are described in README.md.
 """
 
-from nornir import InitNornir
-from nornir.core.exceptions import NornirExecutionError
-from nornir.core.exceptions import NornirSubTaskError
-from nornir.plugins.tasks import networking
-from nornir.plugins.tasks.networking import napalm_get
-from nornir.plugins.functions.text import print_result
-from mac_vendor_lookup import MacLookup
-from collections import defaultdict
-import openpyxl
-from openpyxl.styles import Font
+#nornir (and with it napalm, netmiko and paramiko) is only imported by collect_from_devices, so
+#--help and --replay runs start without it.
+from ouiindex import get_oui_index
+from nacexclusions import PortExclusions
+from nacoutput import open_sinks, OUTPUT_FORMATS, DIFF_SHEETS
+from nacrules import load_rules
+from nacsnapshots import save_snapshot, iter_snapshots
+from naccache import GetterCache, DEFAULT_TTLS, parse_ttls
+from nacscheduler import CollectionScheduler, parse_timeouts, scheduled_napalm_get
+from nacstate import HostState, StateStore, diff_states, state_digest
+from nactiming import RunStats, HostTimer
+from naclogging import log, start_logging, stop_logging
+from nacconfigstore import ConfigStore
+from nacmactable import aggregate_mac_table
+from nacnormalize import normalize_host
+from naccorrelation import CorrelationIndex
+from iosnacconfparser import generate_nac_config
+from collections import defaultdict, namedtuple
+import argparse
 import pathlib
-import re
+import threading
 import time
 import datetime as dt
 
-def create_workbook():
+#Getters requested from every switch in a single napalm_get task.
+GETTERS = ['mac_address_table', 'facts', 'lldp_neighbors_detail', 'interfaces']
+
+#Inventory site collected when no --site or --tag is given.
+DEFAULT_SITES = ['herndon-dev']
+
+#Options of a discovery run, one field per command line option (see main() and README.md).
+RunOptions = namedtuple('RunOptions', 'output_formats rules_file capture_dir replay_dir cache_dir cache_ttls state_dir scheduler metrics_file verbosity quiet config_dir nac_dir sites roles tags group_name output_dir mac_sample correlate oui_files')
+RunOptions.__new__.__defaults__ = (('xlsx', 'csv'), None, None, None, None, None, None, None, 'logs/nacdiscovery.prom', 0, False, None, None, None, None, None, 'MixGrouping1', '.', None, False, None)
+
+
+def host_error(result):
     """
-    Create an Excel workbook to store values retrieved from switches
+    Return the exception of the innermost failed task and the number of attempts made, so
+    failures are reported with the device error rather than a wrapping exception.
     """
+    failed = [r for r in result if r.failed]
+    error = failed[-1].exception if failed else result[0].exception
+    return getattr(error, 'error', error), getattr(error, 'attempts', 1)
+
+
+class HostStreamProcessor:
+    """
+    Nornir processor which runs the per-host analysis from the worker thread as soon as
+    a host's napalm_get task completes, so processing overlaps with collection from the
+    remaining switches. The analysis and output of each host are serialized with a lock
+    and its raw getter payload is released once its rows are written. options is a
+    RunOptions; its capture, diff, config store, NAC config, MAC sample and correlate
+    settings apply per host. diff_output receives the --diff changes.
+    """
+
+    def __init__(self, output, portexclusions, rules, options=RunOptions(), stats=None, diff_output=None):
+        self.output = output
+        self.portexclusions = portexclusions
+        self.rules = rules
+        self.stats = stats
+        self.diff_output = diff_output
+        self.capture_dir = options.capture_dir
+        self.nac_dir = options.nac_dir
+        self.mac_sample = options.mac_sample
+        self.state_store = StateStore(options.state_dir) if options.state_dir else None
+        self.config_store = ConfigStore(options.config_dir) if options.config_dir else None
+        self.correlation = CorrelationIndex() if options.correlate else None
+        #Reentrant so a failure reported while the lock is held does not deadlock.
+        self.lock = threading.RLock()
+        #Host -> (hostname, state, configs) of hosts whose exclusions wait for the correlation.
+        self.deferred = {}
+        self.processed_hosts = 0
+        self.failed_hosts = []
+        self.changed_hosts = 0
+        self.unchanged_hosts = 0
+
+    def task_started(self, task):
+        pass
+
+    def task_completed(self, task, result):
+        pass
+
+    def task_instance_started(self, task, host):
+        pass
+
+    def task_instance_completed(self, task, host, result):
+        #Check for switches that failed and continue. Nornir automatically removes failed devices from future tasks.
+        if result.failed:
+            error, attempts = host_error(result)
+            if self.capture_dir:
+                save_snapshot(self.capture_dir, host.name, host.hostname, error=error, attempts=attempts)
+            self.host_failed(host.name, host.hostname, error, attempts)
+            return
+        #Nornir calls processors outside the task's error handling, so an exception here would end the run.
+        try:
+            configs = result[0].result.pop('config', None)
+            if configs and self.config_store:
+                changed = self.config_store.save_host(host.name, configs)
+                log.debug('Config stored' + (' (changed)' if changed else ''), extra={'host': host.name})
+            if self.capture_dir:
+                save_snapshot(self.capture_dir, host.name, host.hostname, result[0].result, platform=host.platform)
+            self.host_completed(host.name, result[0].result, configs, host.platform, host.hostname)
+        except Exception as e:
+            self.processing_failed(host.name, host.hostname, e)
+        finally:
+            #Drop the raw getter payload now that the rows for this host have been emitted.
+            result[0].result = None
+
+    def host_completed(self, host, getters_result, configs=None, platform=None, hostname=None):
+        """
+        Normalize and analyze a host's getter results and write its rows. A host whose results
+        cannot be processed is reported in Failed Devices and the run goes on.
+        """
+        try:
+            self.process_results(host, getters_result, configs, platform, hostname or host)
+        except Exception as e:
+            self.processing_failed(host, hostname or host, e)
+
+    def process_results(self, host, getters_result, configs, platform, hostname):
+        state = HostState() if self.state_store else None
+        starttime = time.perf_counter()
+        #Normalize the platform's getter output in this worker thread, before taking the lock.
+        normalizetimer = HostTimer(self.stats, host)
+        record = normalize_host(getters_result, platform)
+        normalizetimer.lap('normalize')
+        correlate = self.correlation is not None
+        with self.lock:
+            timer = HostTimer(self.stats, host)
+            exclusions = process_host(host, record, self.output, self.portexclusions, self.rules, state, timer, self.mac_sample, correlate)
+            self.output.flush()
+            timer.lap('output')
+            self.processed_hosts += 1
+            if correlate:
+                #Exclusion rows, state and NAC configs wait for the run-wide correlation.
+                self.correlation.add_host(host, record)
+                self.deferred[host] = (hostname, state, configs if self.nac_dir else None)
+                timer.lap('correlate')
+            elif state is not None:
+                self.record_changes(host, state)
+                timer.lap('changes')
+        if self.nac_dir and not correlate:
+            self.write_nac_config(host, configs, exclusions, timer)
+        log.info('Host processed', extra={'host': host, 'duration': time.perf_counter() - starttime})
+
+    def write_nac_config(self, host, configs, exclusions, timer):
+        """
+        Pipeline mode: merge the host's exclusion evidence with its running config and write
+        host.delta and host.new to nac_dir.
+        """
+        running = (configs or {}).get('running')
+        if not running:
+            log.warning('No running config collected, NAC configs not generated', extra={'host': host})
+            return
+        excluded = frozenset(exclusion.port for exclusion in exclusions)
+        interfaces = generate_nac_config(host, running, self.nac_dir, self.rules, excluded)
+        timer.lap('nac-config')
+        log.debug('NAC config generated for %d interfaces, %d ports excluded', len(interfaces), len(excluded), extra={'host': host})
+
+    def add_correlation_exclusions(self):
+        """
+        Add the uplink and inventory neighbor exclusions found by the correlation index once
+        every host has been processed, then export each deferred host's exclusions (one row
+        per port with every reason), record its changes and write its NAC configs. Returns
+        the number of ports flagged by the correlation.
+        """
+        exclusions = self.correlation.find_exclusions(self.rules.uplink_max_shared_macs, self.rules.uplink_shared_ratio)
+        for switch, port, reason in exclusions:
+            self.portexclusions.add(switch, port, reason)
+        with self.lock:
+            for host, (hostname, state, configs) in list(self.deferred.items()):
+                try:
+                    timer = HostTimer(self.stats, host)
+                    host_exclusions = export_exclusions(host, self.output, self.portexclusions, state, timer)
+                    if state is not None:
+                        self.record_changes(host, state)
+                        timer.lap('changes')
+                    if self.nac_dir:
+                        self.write_nac_config(host, configs, host_exclusions, timer)
+                except Exception as e:
+                    self.processing_failed(host, hostname, e)
+            self.deferred.clear()
+            self.output.flush()
+        return len({(switch, port) for switch, port, _ in exclusions})
+
+    def record_changes(self, host, state):
+        """
+        Compare a host's state with the one saved by the previous run, append the changes
+        to the diff output and save the new state.
+        """
+        new_state = state.as_dict()
+        digest = state_digest(new_state)
+        previous = self.state_store.load(host)
+        if previous is not None and previous['digest'] == digest:
+            self.unchanged_hosts += 1
+            return
+        if previous is None:
+            self.diff_output.append('Changes', [host, '', 'Host added', ''])
+        else:
+            for row in diff_states(host, previous['state'], new_state):
+                self.diff_output.append('Changes', row)
+        self.diff_output.flush()
+        self.changed_hosts += 1
+        self.state_store.save(host, new_state, digest)
+
+    def processing_failed(self, host, hostname, error):
+        """
+        Log the traceback of a host whose results could not be processed, drop its pending
+        exclusions and list it in Failed Devices. Rows already written for it are kept.
+        """
+        log.error('Processing failed, host skipped: %s', error, exc_info=True, extra={'host': host})
+        with self.lock:
+            self.portexclusions.pop_switch(host)
+            self.deferred.pop(host, None)
+            self.host_failed(host, hostname, 'Processing failed: %s: %s' % (type(error).__name__, error))
+
+    def host_failed(self, host, hostname, error, attempts=1):
+        with self.lock:
+            log.warning('Failed after %d attempts, removed from future tasks: %s', attempts, error, extra={'host': host, 'attempts': attempts})
+            self.output.append('Failed Devices', [host, hostname, str(error), attempts])
+            self.output.flush()
+            self.failed_hosts.append(host)
+
+    def subtask_instance_started(self, task, host):
+        pass
+
+    def subtask_instance_completed(self, task, host, result):
+        pass
 
-    #Setup logfile and naming based on date/time. Create directory if needed.
-    current_time = dt.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-    log_dir = "logs"
-    pathlib.Path(log_dir).mkdir(exist_ok=True)
-    filename = str("DISCOVERY-LOG") + "-" + current_time + ".txt"
-    log_filepath = log_dir + "/" + filename
-    # Create the log file
-    logfile = open(log_filepath, "w")
 
-    wb = openpyxl.Workbook()
-    groupname = "MixGrouping1" #TODO: Replace with function that takes list of location codes.
-    wb_name = "NACFACTS-" + groupname + "-" + current_time + ".xlsx"
+def process_host(host, record, output, portexclusions, rules, state=None, timer=None, mac_sample=None, defer_exclusions=False):
+    """
+    Process the normalized getter results of a single host (a nacnormalize.HostRecord) and
+    append its rows to the output sheets. When state is a nacstate.HostState it is filled in
+    for change detection. timer is a nactiming.HostTimer which records and logs a lap per
+    processing phase. With mac_sample the MAC table is aggregated per port (see
+    process_mac_counters). Returns the host's port exclusion records, or nothing with
+    defer_exclusions, which leaves them in portexclusions for export_exclusions().
+    """
+    timer = timer or HostTimer(None, host)
+
+    """PROCESS MAC TABLE RESULTS - Lookup MAC OUI Vendors and Determine Ports with multiple MACs assigned."""
+    oui_index = get_oui_index()
+    mactable_result = record.mac_table
+
+    if mac_sample is not None:
+        process_mac_counters(host, mactable_result, output, portexclusions, rules, oui_index, mac_sample, state)
+        mactable_result = ()
+
+    vendor_mactable = defaultdict(list)
+    interfaces = defaultdict(list)
+    #Resolve the vendor of every distinct MAC in the table with a single batched lookup.
+    mac_vendors = oui_index.lookup_many(entry.mac for entry in mactable_result)
+    #Loop through each Host's MAC Table and Create dictionary of interfaces and the vendor MACs that are attached.
+    #Entries are already limited to MACs learned on a port and keyed by the normalized port name.
+    for interface_value, mac_value, _ in mactable_result:
+        vendor_value = mac_vendors[mac_value]
+
+        #Store relevant values for worksheet row and append to sheet.
+        line = [host, interface_value, mac_value, vendor_value]
+        output.append('Mac Table Vendors', line)
+        #Append Vendor lookup results to vendor_mactable so we can use them for port exclusion recommendations.
+        vendor_mactable[interface_value].append(vendor_value)
+        if state is not None:
+            state.macs[interface_value].add(mac_value)
+
+    #build dictionary of interfaces containing lists of vendors and identify ports with multiple MACs.
+    for iface, value in vendor_mactable.items():
+        if rules.is_multimac(len(value)):
+            interfaces[iface].extend(value)
+
+            line = [host, iface, len(interfaces[iface]), str(interfaces[iface])]
+            output.append('Multi Mac Ports', line)
+            #Append to portexclusions store
+            portexclusions.add(host, iface, 'multimac')
+            if state is not None:
+                state.multimac.add(iface)
+    timer.lap('mac')
 
-    #Define the regex keywords that we want to look for in interface descriptions
-    desc_keywords = "(ASR|ENCS|UPLINK|CIRCUIT|ISP|SWITCH|TRUNK|ESXI|VMWARE)"
+    """
+    Get Facts  from all inventory targets using nornir napalm
+    task=get_facts and output results to facts_ws
+    """
 
-    #Create sheets and column headers
-    facts_ws = wb.create_sheet("Facts")
-    facts_ws.append(['Switch Hostname','Vendor','Model','OS Version','Serial Number','Uptime'])
+    facts = record.facts
+    line = [host, facts.vendor, facts.model, facts.os_version, facts.serial_number, facts.uptime]
 
-    interfaces_ws = wb.create_sheet("Interfaces")
-    interfaces_ws.append(['Switch', 'Interface name', 'Description', 'Admin Status', 'Oper Status', 'Speed'])
+    output.append('Facts', line)
+    if timer.stats is not None:
+        timer.stats.set_labels(host, facts.model, facts.os_version)
+    timer.lap('facts')
 
-    mactablevendor_ws = wb.create_sheet("Mac Table Vendors")
-    mactablevendor_ws.append(['Switch', 'Interface', 'MACaddr', 'Vendor OUI'])
+    """PROCESS LLDP NEIGHBOR DETAIL RESULTS - only the first neighbor of each port is reported."""
 
-    lldpneighbor_ws = wb.create_sheet("LLDP Neighbors")
-    lldpneighbor_ws.append(['Local Switch', 'Local Port', 'Remote System ID', 'Remote System Name', 'Remote System Description', 'Remote Port ID', 'Remote Port Description', 'Remote Capability', 'Remote Vendor'])
+    neighbors = {}
+    for neighbor in record.lldp:
+        neighbors.setdefault(neighbor.port, neighbor)
+    chassis_vendors = oui_index.lookup_many(neighbor.chassis_id for neighbor in neighbors.values())
+    for interface, neighbor in neighbors.items():
+        remotecapability = neighbor.capabilities
+        remotevendor = chassis_vendors[neighbor.chassis_id]
 
-    multimacports_ws = wb.create_sheet("Multi Mac Ports")
-    multimacports_ws.append(['Switch', 'Interface', 'Count', 'Vendor MACs'])
+        line = [host, interface, neighbor.chassis_id, neighbor.system_name, neighbor.system_description, neighbor.port_id, neighbor.port_description, str(remotecapability), remotevendor]
+        output.append('LLDP Neighbors', line)
+        if state is not None:
+            state.lldp[interface] = str(neighbor.system_name) + ' ' + str(neighbor.port_id)
 
-    portexclusions_ws = wb.create_sheet("Port Exclusion Recommendations")
-    portexclusions_ws.append(['Switch', 'Interface', 'Reason', 'Port Description'])
+        if rules.match_capabilities(remotecapability):
+            portexclusions.add(host, interface, 'LLDP Neighbor' + str(remotecapability))
 
-    devicefailures_ws = wb.create_sheet("Failed Devices")
-    devicefailures_ws.append(['Switch', 'Hostname', 'Error'])
+    timer.lap('lldp')
 
     """
-    Initialize Nornir settings and set the right inventory targets and filters
+    Get Interfaces, check descriptions for keywords and append to port exclusions.
     """
-    nr = InitNornir(config_file="config.yaml", core={"raise_on_error": False})
-    #target_devices = nr.filter(hostname='10.83.8.163')
-    target_devices = nr.filter(site='herndon-dev')
-    #target_devices = nr.filter(tag='mix')
 
-    #Initialize nested dictionary for tracking recomended ports and reasoning to exclude from NAC.
-    portexclusions = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-    #portexclusions = {'SwitchName': {'Gi1/1:' {'description': 'trunk to mdf', macvendor: 'VMWare', Reasoning: ['Port is trunk', 'multimacs'] }}
+    for interface, description, adminstatus, operstatus, speed in record.interfaces:
+        line = [host, interface, description, adminstatus, operstatus, speed]
 
-    print('Collecting information from the following Nornir inventory hosts:', target_devices.inventory.hosts.keys())
-    logfile.write('Collecting information from the following Nornir inventory hosts:' + str(target_devices.inventory.hosts.keys()) + '\n')
-    logfile.write('Interesting Interface keywords: ' + desc_keywords + '\n')
+        output.append('Interfaces', line)
 
-    print("Grabbing Data With Nornir/Napalm - Start Clock\n")
-    starttime = time.perf_counter()
-    napalm_results = target_devices.run(task=napalm_get, getters=['mac_address_table', 'facts', 'lldp_neighbors_detail', 'interfaces'], name="Get Switch info: Facts, MAC Table, LLDP, and Interfaces")
-    stoptime = time.perf_counter()
-    print(f"Done Grabbing Data\n Execution took: {stoptime - starttime:0.4f} seconds")
+        #Check for Exclusion keywords and add interfaces to the portexclusions store.
+        keyword = rules.match_description(description)
+        if keyword:
+            reasondescript = 'Description contains: ' + keyword
+            portexclusions.add(host, interface, reasondescript, description)
 
-    for host, task_results in napalm_results.items():
-        #Check for switches that failed and continue. Nornir automatically removes failed devices from future tasks.
-        if task_results.failed:
-            print(' ######', '\n!Failed Host in task_results:>', host, 'will be removed from future tasks!\n', '######', '\n')
-            logfile.write('!Failed Host in task_results:> ' + host + ' will be removed from future tasks!\n')
-            continue
-        print("Start processing Host - ", str(host), '\n')
-        logfile.write('Start processing Host - ' + str(host) + '\n')
-
-        facts_result = task_results[0].result['facts']
-        #print("Facts_Results are:> (task_results[0].result['facts'] >>\n)", facts_result)
-        lldp_result = task_results[0].result['lldp_neighbors_detail']
-        #print("lldp_result are:> (task_results[0].result['lldp_neighbors_detail'] >>\n)", lldp_result)
-        mactable_result = task_results[0].result['mac_address_table']
-        #print("mactable_result are:> (task_results[0].result['mac_address_table'] >>\n)", mactable_result)
-        interfaces_result = task_results[0].result['interfaces']
-        #print("interfaces_result are:> (task_results[0].result['interfaces'] >>\n)", interfaces_result)
-
-        """PROCESS MAC TABLE RESULTS - Lookup MAC OUI Vendors and Determine Ports with multiple MACs assigned."""
-        macQ = MacLookup()
-        #loop through each switch in the Nornir Task Result object
-        print("Start processing Host - Mac_Results:", str(host), '\n')
-        logfile.write("Start processing Host - Mac_Results: " + str(host) + '\n')
-
-        #unnecessary since captured above?
-        if task_results.failed:
-            print(' ######', '\n!Failed Host in task_results (MACTABLE):>', host, 'will be removed from future tasks!\n', '######', '\n')
-            continue
-        #Store the actual serialized mac table dict for the current switch
-
-        vendor_mactable = defaultdict(list)
-        interfaces = defaultdict(list)
-        multimacinterfaces = defaultdict(dict)
-        #Loop through each Host's MAC Table and Create dictionary of interfaces and the vendor MACs that are attached.
-        for entry in mactable_result:
-            if not entry['interface']:  #skip mac address not assigned to interfaces
-                continue
-            try:
-                vendor = macQ.lookup(entry['mac'])
-            except:
-                vendor = "Unknown"
-
-            interface_value = entry['interface']
-            vendor_value = vendor
-            mac_value = entry['mac']
-
-            #Store relevant values for worksheet row and append to sheet.
-            line = [host, interface_value, mac_value, vendor_value]
-            mactablevendor_ws.append(line)
-            #Append Vendor lookup results to vendor_mactable so we can use them for port exclusion recommendations.
-            vendor_mactable[entry['interface']].append(vendor_value)
-
-        #build dictionary of interfaces containing lists of vendors and identify ports with multiple MACs.
-        for iface, value in vendor_mactable.items():
-            #print(iface, value)
-            if len(value) > 1:
-                #print(iface, '>', value)
-                interfaces[iface].extend(value)
-
-                line = [host, iface, len(interfaces[iface]), str(interfaces[iface])]
-                multimacports_ws.append(line)
-                #Append to portexlcusions dictionary
-                portexclusions[host][iface]['reason'].append('multimac')
-        #print('vendor mactable\n\n', vendor_mactable)
-        #print('interfact dict \n\n', interfaces)
-        print("End Processing Host - Mac_Results: " + str(host) + "\n")
-        logfile.write("End Processing Host - Mac_Results: " + str(host) + "\n")
+    timer.lap('interfaces')
+
+    if defer_exclusions:
+        return []
+    return export_exclusions(host, output, portexclusions, state, timer)
 
-        """
-        Get Facts  from all inventory targets using nornir napalm
-        task=get_facts and output results to facts_ws
-        """
 
+def export_exclusions(host, output, portexclusions, state=None, timer=None):
+    """
+    Export this host's entries from the portexclusions store to portexclusions_ws
+    so that port exclusion recommendations show up in the workbook. Records are
+    removed from the store as they are written so each one is exported exactly once.
+    """
+    timer = timer or HostTimer(None, host)
+    exclusions = portexclusions.pop_switch(host)
+    for exclusion in exclusions:
+        output.append('Port Exclusion Recommendations', exclusion.as_row())
+        if state is not None:
+            state.exclusions[exclusion.port].extend(exclusion.reasons)
+    timer.lap('exclusions')
+    return exclusions
 
-        print("Start processing Host - Get Facts:", str(host), '\n')
-        logfile.write("Start processing Host - Get Facts: " + str(host) + '\n')
-
-        hostname_result = facts_result['hostname']
-        vendor_result = facts_result['vendor']
-        model_result = facts_result['model']
-        version_result = facts_result['os_version']
-        serial_result = facts_result['serial_number']
-        uptime_result = facts_result['uptime']
-        #HP Devices will return a list of interfaces with get_facts
-        if facts_result['interface_list']:
-            interfacelist_result = facts_result['interface_list']
-
-        line = [host, vendor_result, model_result, version_result, serial_result, uptime_result]
-
-        facts_ws.append(line)
-        print("End Processing Host - Get Facts: " + str(host) + "\n")
-        logfile.write("End Processing Host - Get Facts: " + str(host) + "\n")
-
-
-        """PROCESS LLDP NEIGHBOR DETAIL RESULTS - ."""
-
-        print("Start processing Host - Get LLDP Neighbors:", str(host), '\n')
-        logfile.write("Start processing Host - Get LLDP Neighbors: " + str(host) + '\n')
-        for interface in lldp_result:
-            #print(lldp_detail)
-
-            remotesysid = lldp_result[interface][0]['remote_chassis_id']
-            remotesysname = lldp_result[interface][0]['remote_system_name']
-            remotesysdescription = lldp_result[interface][0]['remote_system_description']
-            remoteportid = lldp_result[interface][0]['remote_port']
-            remoteportdesc = lldp_result[interface][0]['remote_port_description']
-            remotecapability = lldp_result[interface][0]['remote_system_capab']
-            try:
-                remotevendor = macQ.lookup(remotesystemid)
-            except:
-                remotevendor = "Unknown"
-
-            line = [host, interface, remotesysid, remotesysname, remotesysdescription, remoteportid, remoteportdesc, str(remotecapability), remotevendor]
-            lldpneighbor_ws.append(line)
-
-            if ('router' in remotecapability) or ('bridge' in remotecapability):
-                #TODO: generalize for all interfaces and move to function
-                if re.search('TenGigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Te' + digits.group()
-                elif re.search('TwoGigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Tw' + digits.group()
-                elif re.search('^Gigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Gi' + digits.group()
-
-                portexclusions[host][interface]['reason'].append('LLDP Neighbor' + str(remotecapability))
-                #print(host, interface, remotecapability)
-
-        print("End Processing Host - Get LLDP Neighors: " + str(host) + "\n")
-        logfile.write("End Processing Host - Get LLDP Neighors: " + str(host) + "\n")
 
-        """
-        Get Interfaces, check descriptions for keywords and append to port exclusions.
-        """
-        print("Start processing Host - Get Interfaces:", str(host), '\n')
-        logfile.write("Start processing Host - Get Interfaces: " + str(host) + '\n')
-
-        for interface in interfaces_result:
-            #if 'C9500-16X' in host:
-
-            interface_id = interface
-            adminstatus = interfaces_result[interface]['is_enabled']
-            operstatus = interfaces_result[interface]['is_up']
-            description = interfaces_result[interface]['description']
-            speed = interfaces_result[interface]['speed']
-
-            line = [host, interface_id, description, adminstatus, operstatus, speed]
-
-            interfaces_ws.append(line)
-
-            #Check for Exclusion keywords and add interfaces to portexclusion dictionary then append to portexlusion_ws.
-            #TODO: Replace search literals with variable at top for quicker modification.
-            keyword = re.search(desc_keywords, str(description), re.IGNORECASE)
-            if keyword:
-                #Normalize Interface names because different napalm getters return full interfaces name and some return shortened names which result in multiple dictionary keys being created.
-                #TODO: generalize for all interfaces and move to function
-                if re.search('TenGigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Te' + digits.group()
-                elif re.search('TwoGigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Tw' + digits.group()
-                elif re.search('^Gigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Gi' + digits.group()
-
-                reasondescript = 'Description contains: ' + keyword.group()
-                portexclusions[host][interface]['reason'].append(reasondescript)
-                portexclusions[host][interface]['description']= str(description)
-
-        print("End processing Host - Get Interfaces:", str(host), '\n')
-        logfile.write("End processing Host - Get Interfaces: " + str(host) + '\n')
+def process_mac_counters(host, mac_table, output, portexclusions, rules, oui_index, mac_sample, state=None):
+    """
+    Large MAC table mode: fold the table into per-port counters, write up to mac_sample MAC
+    rows per port and flag multi-MAC ports from the counts. Only ports whose MACs all fit in
+    the sample are recorded in state, larger ports are marked untracked so change detection
+    skips their MACs.
+    """
+    for iface, port in aggregate_mac_table(mac_table, oui_index, mac_sample).items():
+        for mac_value, vendor_value in port.sample:
+            output.append('Mac Table Vendors', [host, iface, mac_value, vendor_value])
+        if state is not None:
+            if port.complete:
+                state.macs[iface].update(mac for mac, _ in port.sample)
+            else:
+                state.untracked[iface] = port.count
+        if rules.is_multimac(port.count):
+            output.append('Multi Mac Ports', [host, iface, port.count, str(port.vendor_summary())])
+            portexclusions.add(host, iface, 'multimac')
+            if state is not None:
+                state.multimac.add(iface)
+
+
+def create_workbook(options=RunOptions()):
+    """
+    Create an Excel workbook to store values retrieved from switches.
 
+    options is a RunOptions: the output formats, ruleset, capture or replay directory,
+    cache, --diff state, scheduler, metrics file, logging level, config store, NAC config
+    directory, inventory targets, output names, MAC sample, correlation and extra OUI files
+    of the run.
+    """
 
-        """
-        Export all entries from portexlusions dictionary to portexclusions_ws
-        so that port exclusion recommendations show up in the workbook.
-        """
-        for host, value in portexclusions.items():
-            print("Start processing Host - Port Exclusions:", str(host), '\n')
-            logfile.write("Start processing Host - Port Exclusions: " + str(host) + '\n')
-
-            for interface in portexclusions[host]:
-                line = [host, interface, str(portexclusions[host][interface]['reason']), str(portexclusions[host][interface]['description'])]
-                portexclusions_ws.append(line)
-            print("End processing Host - Port Exclusions:", str(host), '\n')
-            logfile.write("End processing Host - Port Exclusions: " + str(host) + '\n')
-
-    #check if there are any failed hosts and save failed switches to worksheet
-    if nr.data.failed_hosts:
-        print("The following switches failed during a task and were not added to the workbook:", nr.data.failed_hosts, '\n')
-        logfile.write("The following switches failed during a task and were not added to the workbook: " + str(nr.data.failed_hosts) + '\n')
-        for host in nr.data.failed_hosts:
-            error = napalm_results[host][0].exception
-            #print(target_devices.inventory.hosts[host].keys())
-            hostname = target_devices.inventory.get_hosts_dict()[host]['hostname']
-            line = [host, hostname, str(error)]
-            devicefailures_ws.append(line)
-
-    wb.remove(wb["Sheet"])
-    #catch potential save errors on workbook.
+    #Setup logging and naming based on date/time. Create directory if needed.
+    current_time = dt.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    log_dir = "logs"
+    pathlib.Path(log_dir).mkdir(exist_ok=True)
+    #Shards of a nacshards.py run start together, so the group keeps their log files apart.
+    filename = str("DISCOVERY-LOG") + "-" + options.group_name + "-" + current_time + ".jsonl"
+    log_filepath = log_dir + "/" + filename
+    listener = start_logging(log_filepath, options.verbosity, options.quiet)
+    try:
+        run_discovery(current_time, options)
+    except Exception:
+        log.exception('Discovery run failed')
+        raise
+    finally:
+        stop_logging(listener)
+
+
+def run_discovery(current_time, options):
+    """
+    Open the outputs, collect or replay every host through the stream processor and close
+    the outputs. options is the run's RunOptions.
+    """
+    #Load the exclusion ruleset: description keywords, LLDP capabilities and multi-MAC threshold.
+    rules = load_rules(options.rules_file)
+    #Load the OUI index before any host, so the MA-M and MA-S files are part of it.
+    oui_index = get_oui_index(options.oui_files or ())
+    log.debug('OUI index: %d vendor assignments', len(oui_index))
+
+    output_dir = pathlib.Path(options.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_name = str(output_dir / ("NACFACTS-" + options.group_name + "-" + current_time))
+
+    #Open the output sinks. Sheets and column headers are defined in nacoutput.SHEETS.
+    output = open_sinks(output_name, options.output_formats)
+    #Change detection writes its own NACDIFF output with only the hosts that changed.
+    diff_name = str(output_dir / ("NACDIFF-" + options.group_name + "-" + current_time))
+    diff_output = open_sinks(diff_name, options.output_formats, DIFF_SHEETS) if options.state_dir else None
+
+    #Initialize keyed store for tracking recomended ports and reasoning to exclude from NAC, one record per (switch, port).
+    portexclusions = PortExclusions()
+    log.debug('Interesting Interface keywords: %s (ruleset version %s)', rules.description_keywords, rules.version)
+
+    #Each host is processed by the stream processor from its worker thread as soon as its getters return.
+    #Sinks are closed in the finally block so rows already flushed are kept if the run is interrupted.
+    stats = RunStats()
+    if options.nac_dir:
+        pathlib.Path(options.nac_dir).mkdir(parents=True, exist_ok=True)
+    stream_processor = HostStreamProcessor(output, portexclusions, rules, options, stats, diff_output)
+    try:
+        starttime = time.perf_counter()
+        if options.replay_dir:
+            log.info('Replaying captured getter results', extra={'path': str(options.replay_dir)})
+            replay_snapshots(options.replay_dir, stream_processor)
+        else:
+            cache = GetterCache(options.cache_dir, options.cache_ttls or DEFAULT_TTLS) if options.cache_dir else None
+            scheduler = options.scheduler or CollectionScheduler()
+            scheduler.stats = stats
+            getters = GETTERS + ['config'] if options.config_dir or options.nac_dir else GETTERS
+            targets = {'sites': options.sites, 'roles': options.roles, 'tags': options.tags}
+            collect_from_devices(stream_processor, scheduler, cache, getters, targets)
+        stoptime = time.perf_counter()
+        stats.record_run('collect', stoptime - starttime)
+        log.info('Done Grabbing and Processing Data for %d hosts', stream_processor.processed_hosts, extra={'phase': 'collect', 'duration': stoptime - starttime, 'hosts': stream_processor.processed_hosts})
+
+        if stream_processor.correlation is not None:
+            correlatestart = time.perf_counter()
+            flagged = stream_processor.add_correlation_exclusions()
+            stats.record_run('correlate', time.perf_counter() - correlatestart)
+            log.info('Correlation: %d ports flagged as uplinks or inventory neighbors from %d MAC entries', flagged, len(stream_processor.correlation), extra={'phase': 'correlate', 'duration': time.perf_counter() - correlatestart})
+
+        #Failed switches were added to the Failed Devices sheet as they completed.
+        if stream_processor.failed_hosts:
+            log.warning('The following switches failed during a task and were not added to the workbook: %s', ', '.join(stream_processor.failed_hosts))
+        if stream_processor.state_store:
+            log.info('Change detection: %d hosts changed, %d unchanged', stream_processor.changed_hosts, stream_processor.unchanged_hosts)
+
+        #Per-host phase timings followed by p50/p95/max summaries by model and OS version.
+        for line in stats.host_rows() + stats.summary_rows():
+            output.append('Run Stats', line)
+    finally:
+        #catch potential save errors on workbook and other outputs.
+        savestart = time.perf_counter()
+        for sink, e in output.close():
+            log.error('Failed to Save %s output, please close it if open and ensure you have access to save location: %s', type(sink).__name__, e)
+        log.info('Output - %s - Created', output_name, extra={'path': output_name})
+        if diff_output:
+            for sink, e in diff_output.close():
+                log.error('Failed to Save %s change output: %s', type(sink).__name__, e)
+            log.info('Changes - %s - Created', diff_name, extra={'path': diff_name})
+        stats.record_run('save', time.perf_counter() - savestart)
+        if options.metrics_file:
+            stats.write_prometheus(options.metrics_file, stream_processor.processed_hosts, len(stream_processor.failed_hosts))
+            log.debug('Metrics written', extra={'path': str(options.metrics_file)})
+
+
+def target_filter(sites=None, roles=None, tags=None):
+    """
+    Nornir filter for the hosts in one of the given sites (host data 'site'), with one of
+    the given roles (host data 'role') and one of the given tags (host data 'tag' or a 'tags'
+    list). Criteria left empty match every host; without any the DEFAULT_SITES are collected.
+    """
+    from nornir.core.filter import F
+
+    if not sites and not roles and not tags:
+        sites = DEFAULT_SITES
+    targets = F()
+    if sites:
+        targets = targets & F(site__in=list(sites))
+    if roles:
+        targets = targets & F(role__in=list(roles))
+    if tags:
+        targets = targets & (F(tag__in=list(tags)) | F(tags__any=list(tags)))
+    return targets
+
+
+def collect_from_devices(stream_processor, scheduler, cache=None, getters=GETTERS, targets=None):
+    """
+    Initialize Nornir settings, set the right inventory targets and filters and run the
+    getters with the stream processor attached, one session per host. The scheduler enforces
+    worker and per-site limits, getter timeouts and retries. With a cache only stale getters
+    are requested.
+    """
+    from nacinventory import init_nornir, inventory_hosts
+
+    targets = targets or {}
+    if not any(targets.values()):
+        targets = {'sites': DEFAULT_SITES}
+    #A FileInventory only builds the selected hosts, the filter then applies to any inventory plugin.
+    nr = init_nornir("config.yaml", core={"raise_on_error": False}, **targets)
+    #target_devices = nr.filter(hostname='10.83.8.163')
+    target_devices = nr.filter(target_filter(**targets))
+    if stream_processor.correlation is not None:
+        #LLDP neighbors outside the targets still resolve to inventory switches.
+        for name, hostname in inventory_hosts("config.yaml", nr):
+            stream_processor.correlation.add_inventory_host(name, hostname)
+
+    log.info('Collecting information from %d Nornir inventory hosts', len(target_devices.inventory.hosts), extra={'hosts': len(target_devices.inventory.hosts)})
+    log.debug('Inventory hosts: %s', ', '.join(target_devices.inventory.hosts))
+    if cache is not None:
+        log.debug('Getter cache: %s TTLs: %s', cache.path, cache.ttls)
+    scheduler.start(nr.config.core.num_workers)
+    log.debug('Scheduler: workers %s, per-site limit %s, retries %s, getter timeouts %s', scheduler.max_workers, scheduler.site_limit, scheduler.retries, scheduler.getter_timeouts)
+    scheduler.order_hosts(target_devices)
     try:
-        wb.save(wb_name)
-        print("Workbook -", wb_name, "- Created")
-        logfile.write("Workbook - " + wb_name + " Created\n")
-    except Exception as e:
-        print("\n######", e , "######\nFailed to Save workbook, please close it if open and ensure you have access to save location")
-    logfile.close()
+        target_devices.with_processors([stream_processor]).run(task=scheduled_napalm_get, scheduler=scheduler, getters=getters, cache=cache, num_workers=scheduler.max_workers, name="Get Switch info: Facts, MAC Table, LLDP, and Interfaces")
+    finally:
+        scheduler.close()
+        target_devices.close_connections()
+
+
+def replay_snapshots(replay_dir, stream_processor):
+    """
+    Feed every snapshot in replay_dir through the stream processor, as if the hosts had
+    just answered.
+    """
+    for snapshot in iter_snapshots(replay_dir):
+        if snapshot['failed']:
+            stream_processor.host_failed(snapshot['host'], snapshot['hostname'], snapshot['error'], snapshot.get('attempts', 1))
+        else:
+            stream_processor.host_completed(snapshot['host'], snapshot['getters'], platform=snapshot.get('platform'), hostname=snapshot['hostname'])
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Collect switch facts and NAC port exclusion recommendations.')
+    parser.add_argument('--site', dest='sites', action='append', help='collect the hosts of this inventory site, repeat for several (default: herndon-dev)')
+    parser.add_argument('--role', dest='roles', action='append', help='only collect the hosts with this inventory role, repeat for several')
+    parser.add_argument('--tag', dest='tags', action='append', help='collect the hosts with this inventory tag, repeat for several')
+    parser.add_argument('--group', default='MixGrouping1', help='name used in the output and log file names (default: MixGrouping1)')
+    parser.add_argument('--output-dir', metavar='DIR', default='.', help='directory for the NACFACTS and NACDIFF outputs (default: current directory)')
+    parser.add_argument('--format', dest='formats', action='append', choices=OUTPUT_FORMATS, help='output format, repeat for several (default: xlsx and csv)')
+    parser.add_argument('--rules', default=None, help='exclusion ruleset file (default: nacrules.json)')
+    parser.add_argument('--capture', metavar='DIR', default=None, help='save raw getter results per host to DIR for later replay')
+    parser.add_argument('--replay', metavar='DIR', default=None, help='build the output from a capture directory instead of the devices')
+    parser.add_argument('--cache', metavar='DIR', default=None, help='cache slow-changing getter results per host in DIR')
+    parser.add_argument('--config-store', metavar='DIR', default=None, help='also back up running and startup configs to a content-addressed store in DIR')
+    parser.add_argument('--nac-configs', metavar='DIR', default=None, help='pipeline mode: collect running configs and write NAC .delta/.new configs to DIR')
+    parser.add_argument('--mac-sample', metavar='N', type=int, default=None, help='large MAC table mode: count MACs per port and write only the first N per port (0 for none)')
+    parser.add_argument('--oui-file', dest='oui_files', action='append', metavar='FILE', help='IEEE registry CSV (mam.csv, oui36.csv) or PREFIX:Vendor file with extra vendor assignments, repeat for several')
+    parser.add_argument('--correlate', action='store_true', help='flag uplinks and ports facing other inventory switches from MAC tables and LLDP across all hosts')
+    parser.add_argument('--diff', metavar='DIR', default=None, help='keep per-host state in DIR and write the changes since the previous run')
+    parser.add_argument('--workers', type=int, default=None, help='maximum concurrent device sessions (default: Nornir num_workers)')
+    parser.add_argument('--site-limit', type=int, default=None, help='maximum concurrent sessions per site (default: no limit)')
+    parser.add_argument('--retries', type=int, default=2, help='retries for transient SSH, connection and auth failures (default: 2)')
+    parser.add_argument('--backoff', type=float, default=5.0, help='first retry delay in seconds, doubled per attempt (default: 5)')
+    parser.add_argument('--timeout', action='append', metavar='GETTER=SECONDS', help='getter timeout override, repeat for several (e.g. mac_address_table=600)')
+    parser.add_argument('--metrics', metavar='FILE', default='logs/nacdiscovery.prom', help='Prometheus textfile for run timings (default: logs/nacdiscovery.prom)')
+    parser.add_argument('--ttl', action='append', metavar='GETTER=SECONDS', help='cache TTL override, repeat for several (e.g. interfaces=3600)')
+    parser.add_argument('-v', '--verbose', action='count', default=0, help='show per-phase debug events on the terminal')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only show warnings and errors on the terminal, e.g. for cron')
+    args = parser.parse_args(argv)
+    if args.capture and args.replay:
+        parser.error('--capture and --replay cannot be combined')
+    try:
+        cache_ttls = parse_ttls(args.ttl)
+        getter_timeouts = parse_timeouts(args.timeout)
+    except ValueError as e:
+        parser.error(str(e))
+    scheduler = CollectionScheduler(args.workers, args.site_limit, args.retries, args.backoff, getter_timeouts)
+
+    create_workbook(RunOptions(
+        output_formats=args.formats or ('xlsx', 'csv'),
+        rules_file=args.rules,
+        capture_dir=args.capture,
+        replay_dir=args.replay,
+        cache_dir=args.cache,
+        cache_ttls=cache_ttls,
+        state_dir=args.diff,
+        scheduler=scheduler,
+        metrics_file=args.metrics,
+        verbosity=args.verbose,
+        quiet=args.quiet,
+        config_dir=args.config_store,
+        nac_dir=args.nac_configs,
+        sites=args.sites,
+        roles=args.roles,
+        tags=args.tags,
+        group_name=args.group,
+        output_dir=args.output_dir,
+        mac_sample=args.mac_sample,
+        correlate=args.correlate,
+        oui_files=args.oui_files,
+    ))
+
+
 """
 Run the main function to pull device information and create the workbook.
 """
-create_workbook()
+if __name__ == '__main__':
+    main()
@@ -14,17 +14,21 @@ from nornir.core.exceptions import NornirSubTaskError
 from nornir.plugins.tasks import networking
 from nornir.plugins.tasks.networking import napalm_get
 from nornir.plugins.functions.text import print_result
-from mac_vendor_lookup import MacLookup
+from ouiindex import get_oui_index
+from interfacenames import normalize_interface
+from nacrules import load_rules
 from collections import defaultdict
 import openpyxl
 from openpyxl.styles import Font
-import re
 
 def create_workbook():
     """
     Create an Excel workbook to store values retrieved from switches
     """
 
+    #Load the shared exclusion ruleset (nacrules.json).
+    rules = load_rules()
+
     wb = openpyxl.Workbook()
     groupname = "Grouping1" #TODO: Replace with function that takes list of location codes.
     wb_name = "NACFACTS -" + groupname + ".xlsx"
@@ -77,7 +81,8 @@ def create_workbook():
     #except Exception as e:
         #print('ERROR!!!\n\n', e)
 
-    macQ = MacLookup()
+    #Shared OUI index, loaded once for every host.
+    oui_index = get_oui_index()
     #loop through each switch in the Nornir Task Result object
     for host, task_results in mac_results.items():
         print("Start processing Host - Mac_Results:", str(host), '\n')
@@ -92,29 +97,27 @@ def create_workbook():
         vendor_mactable = defaultdict(list)
         interfaces = defaultdict(list)
         multimacinterfaces = defaultdict(dict)
+        #Look up the vendor of every distinct MAC on the switch in one batch.
+        mac_vendors = oui_index.lookup_many(entry['mac'] for entry in mac_results_host['mac_address_table'] if entry['interface'])
         #Loop through each Host's MAC Table and Create dictionary of interfaces and the vendor MACs that are attached.
         for entry in mac_results_host['mac_address_table']:
             if not entry['interface']:  #skip mac address not assigned to interfaces
                 continue
-            try:
-                vendor = macQ.lookup(entry['mac'])
-            except:
-                vendor = "Unknown"
 
-            interface_value = entry['interface']
-            vendor_value = vendor
+            interface_value = normalize_interface(entry['interface'])
+            vendor_value = mac_vendors[entry['mac']]
             mac_value = entry['mac']
 
             #Store relevant values for worksheet row and append to sheet.
             line = [host, interface_value, mac_value, vendor_value]
             mactablevendor_ws.append(line)
             #Append Vendor lookup results to vendor_mactable so we can use them for port exclusion recommendations.
-            vendor_mactable[entry['interface']].append(vendor_value)
+            vendor_mactable[interface_value].append(vendor_value)
 
         #build dictionary of interfaces containing lists of vendors and identify ports with multiple MACs.
         for iface, value in vendor_mactable.items():
             #print(iface, value)
-            if len(value) > 1:
+            if rules.is_multimac(len(value)):
                 #print(iface, '>', value)
                 interfaces[iface].extend(value)
 
@@ -164,6 +167,8 @@ def create_workbook():
         lldp_result =  task_results[0].result
         #store actual result dicitonary from the Nornir result object.
         lldp_detail = lldp_result['lldp_neighbors_detail']
+        #Look up the vendor of every neighbor chassis ID in one batch, IDs that are not MACs are 'Unknown'.
+        chassis_vendors = oui_index.lookup_many(lldp_detail[interface][0]['remote_chassis_id'] for interface in lldp_detail)
 
         for interface in lldp_detail:
             #print(lldp_detail)
@@ -174,26 +179,14 @@ def create_workbook():
             remoteportid = lldp_detail[interface][0]['remote_port']
             remoteportdesc = lldp_detail[interface][0]['remote_port_description']
             remotecapability = lldp_detail[interface][0]['remote_system_capab']
-            try:
-                remotevendor = macQ.lookup(remotesystemid)
-            except:
-                remotevendor = "Unknown"
+            remotevendor = chassis_vendors[remotesysid]
 
             line = [host, interface, remotesysid, remotesysname, remotesysdescription, remoteportid, remoteportdesc, str(remotecapability), remotevendor]
             #print(line)
             lldpneighbor_ws.append(line)
 
-            if ('router' in remotecapability) or ('bridge' in remotecapability):
-                #TODO: generalize for all interfaces and move to function
-                if re.search('TenGigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Te' + digits.group()
-                elif re.search('TwoGigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Tw' + digits.group()
-                elif re.search('^Gigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Gi' + digits.group()
+            if rules.match_capabilities(remotecapability):
+                interface = normalize_interface(interface)
 
                 portexclusions[host][interface]['reason'].append('LLDP Neighbor' + str(remotecapability))
                 #print(host, interface, remotecapability)
@@ -225,22 +218,12 @@ def create_workbook():
             interfaces_ws.append(line)
 
             #Check for Exclusion keywords and add interfaces to portexclusion dictionary then append to portexlusion_ws.
-            #TODO: Replace search literals with variable at top for quicker modification.
-            keyword = re.search('(ASR|ENCS|UPLINK|CIRCUIT|ISP|SWITCH|TRUNK|ESXI|VMWARE)', str(description), re.IGNORECASE)
+            keyword = rules.match_description(description)
             if keyword:
                 #Normalize Interface names because different napalm getters return full interfaces name and some return shortened names which result in multiple dictionary keys being created.
-                #TODO: generalize for all interfaces and move to function
-                if re.search('TenGigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Te' + digits.group()
-                elif re.search('TwoGigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Tw' + digits.group()
-                elif re.search('^Gigabit', str(interface), re.IGNORECASE):
-                    digits = re.search('([0-9]*\/?[0-9]*\/?[0-9]*$)', str(interface))
-                    interface = 'Gi' + digits.group()
-
-                reasondescript = 'Description contains: ' + keyword.group()
+                interface = normalize_interface(interface)
+
+                reasondescript = 'Description contains: ' + keyword
                 portexclusions[host][interface]['reason'].append(reasondescript)
                 portexclusions[host][interface]['description']= str(description)
 
@@ -290,4 +273,5 @@ def nornir_set_creds(norn, username=None, password=None):
 """
 Run the main function to pull device information and create the workbook.
 """
-create_workbook()
+if __name__ == '__main__':
+    create_workbook()
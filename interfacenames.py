@@ -0,0 +1,57 @@
+"""
+    Interface name normalization shared by every napalm getter path.
+
+    Napalm getters disagree on interface naming: get_interfaces and get_lldp_neighbors_detail
+    return full names (GigabitEthernet1/0/1) while get_mac_address_table returns short names
+    (Gi1/0/1). Every interface key is normalized to the short IOS form so results from
+    different getters join on the same port.
+"""
+
+from functools import lru_cache
+import re
+
+#Short form for each interface type, keyed by lowercase type name without hyphens.
+#Long names and the abbreviations seen in IOS, IOS-XE, NX-OS and show command output.
+INTERFACE_PREFIXES = {
+    'Hu': ('hundredgigabitethernet', 'hundredgige', 'hundredgig', 'hu'),
+    'Fo': ('fortygigabitethernet', 'fortygige', 'fortygig', 'fo'),
+    'Twe': ('twentyfivegigabitethernet', 'twentyfivegige', 'twentyfivegig', 'twe'),
+    'Te': ('tengigabitethernet', 'tengige', 'tengig', 'te'),
+    'Fi': ('fivegigabitethernet', 'fivegige', 'fivegig', 'fi'),
+    'Tw': ('twogigabitethernet', 'twogige', 'twogig', 'tw'),
+    'Ap': ('appgigabitethernet', 'appgige', 'ap'),
+    'Gi': ('gigabitethernet', 'gige', 'gig', 'gi'),
+    'Fa': ('fastethernet', 'fa'),
+    'Et': ('ethernet', 'eth', 'et'),
+    'Po': ('portchannel', 'po'),
+    'Vl': ('vlan', 'vl'),
+    'Lo': ('loopback', 'lo'),
+    'Tu': ('tunnel', 'tu'),
+    'Mg': ('mgmt', 'mg'),
+}
+
+_PREFIX_LOOKUP = {alias: short for short, aliases in INTERFACE_PREFIXES.items() for alias in aliases}
+
+#Interface type letters (optionally hyphenated, e.g. Port-channel) followed by the port number.
+_INTERFACE_RE = re.compile(r'^\s*([A-Za-z][A-Za-z-]*?)\s*(\d[\w/.:]*)\s*$')
+
+
+@lru_cache(maxsize=65536)
+def normalize_interface(name):
+    """
+    Return the short form of an interface name, e.g. TenGigabitEthernet1/1/1 -> Te1/1/1.
+
+    Names without a recognised type prefix, such as HP Procurve numeric ports (1, 24) or
+    module ports (A1), are returned unchanged apart from surrounding whitespace.
+    """
+    if name is None:
+        return name
+    name = str(name).strip()
+    match = _INTERFACE_RE.match(name)
+    if not match:
+        return name
+    letters, number = match.groups()
+    short = _PREFIX_LOOKUP.get(letters.lower().replace('-', ''))
+    if short is None:
+        return name
+    return short + number
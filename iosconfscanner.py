@@ -0,0 +1,187 @@
+"""
+    Single-pass IOS interface block scanner.
+
+    A lightweight alternative to building CiscoConfParse object trees when the only
+    question is which interfaces get NAC config. Each configuration file is streamed
+    line by line (memory-mapped when possible) and every top level 'interface' line is
+    yielded as an InterfaceBlock together with its child statements. Everything else is
+    passed through untouched.
+
+    Line handling mirrors CiscoConfParse(syntax='ios') so the generated .delta and .new
+    files are byte-identical: universal newlines, blank lines dropped, a child is any
+    indented config line whose nearest less-indented config line is the interface, and
+    indented comments directly below a deeper line are not children.
+
+    scan_lines works on any iterable of lines, so configs collected in memory (see
+    split_config_lines) go through the same code as files on disk.
+"""
+
+import mmap
+import re
+
+from interfacenames import normalize_interface
+
+_DESCRIPTION_RE = re.compile(r'^\s*description\s')
+
+
+def read_config_lines(path):
+    """
+    Yield the non-blank lines of a configuration file without line terminators.
+    \\r\\n, \\r and \\n all end a line, matching Python's universal newlines mode.
+    """
+    with open(path, 'rb') as config_file:
+        try:
+            data = mmap.mmap(config_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            #Empty files cannot be memory-mapped.
+            data = config_file.read()
+        try:
+            start = 0
+            size = len(data)
+            while start < size:
+                end = data.find(b'\n', start)
+                if end == -1:
+                    end = size
+                raw_line = data[start:end]
+                start = end + 1
+                for line in raw_line.decode('utf-8').split('\r'):
+                    if line.strip():
+                        yield line
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+
+def split_config_lines(text):
+    """
+    Yield the non-blank lines of a configuration held in memory, with the same line
+    handling as read_config_lines.
+    """
+    for raw_line in text.split('\n'):
+        for line in raw_line.split('\r'):
+            if line.strip():
+                yield line
+
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+
+def _is_comment(line):
+    return line.lstrip().startswith('!')
+
+
+class InterfaceBlock:
+    """
+    A top level 'interface' line and the lines that follow it up to the next top level
+    configuration statement. children holds the direct child statements and
+    last_child the index in lines after which new child statements are inserted.
+    """
+    __slots__ = ('text', 'lines', 'children', 'last_child')
+
+    def __init__(self, text):
+        self.text = text
+        self.lines = []
+        self.children = []
+        self.last_child = -1
+
+    def has_child_with(self, substring):
+        return any(substring in child for child in self.children)
+
+    def descriptions(self):
+        return [child for child in self.children if _DESCRIPTION_RE.match(child)]
+
+
+def iter_blocks(lines):
+    """
+    Group configuration lines into InterfaceBlocks. Lines outside interface blocks are
+    yielded as plain strings.
+    """
+    block = None
+    #Indents of the config lines above the current line in the block, nearest last.
+    stack = []
+    previous_indent = 0
+    for line in lines:
+        indent = _indent(line)
+        is_comment = _is_comment(line)
+        if indent == 0 and not is_comment:
+            if block is not None:
+                yield block
+                block = None
+            if line.startswith('interface'):
+                block = InterfaceBlock(line)
+                stack = [0]
+            else:
+                yield line
+            previous_indent = indent
+            continue
+        if block is None:
+            yield line
+            previous_indent = indent
+            continue
+        block.lines.append(line)
+        if indent > 0:
+            if is_comment:
+                #Comments are children unless the line above is indented further. They are
+                #never parents, so the stack is only searched, not popped.
+                if previous_indent <= indent:
+                    if all(parent_indent >= indent for parent_indent in stack[1:]):
+                        block.children.append(line)
+                    block.last_child = len(block.lines) - 1
+            else:
+                while stack[-1] >= indent:
+                    stack.pop()
+                if len(stack) == 1:
+                    block.children.append(line)
+                stack.append(indent)
+                block.last_child = len(block.lines) - 1
+        previous_indent = indent
+    if block is not None:
+        yield block
+
+
+def scan_config(path, delta_path, new_path, rules, nac_description, excluded=frozenset()):
+    """
+    Stream a configuration file and write its .delta (NAC additions only) and .new
+    (complete configuration) files. Returns the list of interfaces that were changed.
+    """
+    with open(delta_path, 'w') as delta_file, open(new_path, 'w') as new_file:
+        return scan_lines(read_config_lines(path), delta_file, new_file, rules, nac_description, excluded)
+
+
+def scan_lines(lines, delta_file, new_file, rules, nac_description, excluded=frozenset()):
+    """
+    Write the .delta and .new output for configuration lines to open files. excluded holds
+    normalized interface names (e.g. Gi1/0/1) that must not get NAC config whatever their
+    configuration says. Returns the list of interfaces that were changed.
+    """
+    interfaces = []
+    for item in iter_blocks(lines):
+        if not isinstance(item, InterfaceBlock):
+            new_file.write(item + '\n')
+            continue
+        has_switchport_access = item.has_child_with('switchport mode access')
+        has_shutdown = item.has_child_with('shutdown')
+        has_netdescript = any(rules.match_description(line) for line in item.descriptions())
+        eligible = (has_switchport_access or has_shutdown) and not has_netdescript
+        if eligible and excluded and interface_key(item.text) in excluded:
+            eligible = False
+
+        new_file.write(item.text + '\n')
+        if eligible and item.last_child == -1:
+            new_file.write(nac_description + '\n')
+        for index, line in enumerate(item.lines):
+            new_file.write(line + '\n')
+            if eligible and index == item.last_child:
+                new_file.write(nac_description + '\n')
+        if eligible:
+            interfaces.append(item.text)
+            delta_file.write(item.text)
+            delta_file.write('\n' + nac_description + '\n')
+    return interfaces
+
+
+def interface_key(text):
+    """Normalized interface name of an 'interface ...' line, e.g. Gi1/0/1."""
+    parts = text.split(None, 1)
+    return normalize_interface(parts[1]) if len(parts) == 2 else ''
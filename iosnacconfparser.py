@@ -4,44 +4,251 @@
     configuration files that include NAC changes.
 
     Config Changes based on configured switchport mode, admin state, and description.
+    Description keywords come from the shared nacrules.json ruleset.
+
+    Files are parsed in parallel over a process pool:
+        python iosnacconfparser.py --configs configs --output nac-configs --workers 8
+
+    Two engines produce identical output: 'scan' (default) streams each file through the
+    single-pass iosconfscanner, 'ciscoconfparse' builds full CiscoConfParse object trees.
+    --verify runs both and reports any file where the outputs differ.
+
+    Runs are incremental: a manifest in the output directory records each input's content
+    hash, the ruleset version and the hashes of the files generated from it. Inputs whose
+    hash, ruleset and outputs are unchanged are skipped; --force rebuilds everything. When an
+    input is deleted, its manifest entry and the outputs it recorded are removed.
+
+    The collector's pipeline mode (--nac-configs) calls generate_nac_config() with the running
+    config it just collected and the ports its exclusions ruled out, without files in between.
 """
 
+import argparse
+import filecmp
+import hashlib
+import json
 import os
-from ciscoconfparse import CiscoConfParse
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from iosconfscanner import scan_config, scan_lines, split_config_lines
+from nacrules import load_rules
+
+NAC_DESCRIPTION = ' description **This Port Has Been NAC Enabled**'
 
-# Set config directories for existing and new output
-dir = 'configs'
-changes = 'nac-configs'
+ENGINES = ('scan', 'ciscoconfparse')
 
-# Iterate through each file in the config directory
-for filename in os.listdir('configs'):
-    file = 'configs/'+filename
-    outFile = open(changes+'/'+filename+'.delta', 'w')
+MANIFEST_NAME = 'nac-manifest.json'
+
+
+def parse_config(filename, config_dir='configs', changes='nac-configs', rules_file=None, engine='scan'):
+    """
+    Parse a single configuration file and write its .delta (NAC additions only) and .new
+    (complete configuration) files. Returns the list of interfaces that were changed.
+    Runs inside the worker processes, so the ruleset is loaded once per worker.
+    """
+    rules = load_rules(rules_file)
+    file = os.path.join(config_dir, filename)
+    if engine == 'scan':
+        return scan_config(file, os.path.join(changes, filename + '.delta'), os.path.join(changes, filename + '.new'), rules, NAC_DESCRIPTION)
+
+    from ciscoconfparse import CiscoConfParse
     # Parse the config file into objects
     parse = CiscoConfParse(file, syntax='ios')
     interfaces = []
 
     SWversion = parse.re_match_iter_typed(r'^version\s(\S+)', default='no version')
-    #print('SW Version: ' + SWversion)
-
-    # Iterate over all the interface objects
-    for intf_obj in parse.find_objects('^interface'):
-
-        has_switchport_access = intf_obj.has_child_with(r'switchport mode access')
-        has_shutdown = intf_obj.has_child_with(r'shutdown')
-        has_netdescript = intf_obj.has_child_with(r'description.*(router|switch|uplink|circuit).*')
-
-        if (has_switchport_access or has_shutdown) and not has_netdescript:
-            interfaces.append(intf_obj.text)
-            intf_obj.append_to_family(' description **This Port Has Been NAC Enabled**')
-            outFile.write(intf_obj.text)
-            outFile.write('\n description **This Port Has Been NAC Enabled**\n')
-        #else:
-            #print(intf_obj.text + ' did not meet critera and won\'t be modified')
-
-    #Print interfaces which meet the child critera - for debugging
-    print(*interfaces, sep = ', ')
-    #Close the new configuration file that only contains NAC additions
-    outFile.close()
+
+    with open(os.path.join(changes, filename + '.delta'), 'w') as outFile:
+        # Iterate over all the interface objects
+        for intf_obj in parse.find_objects('^interface'):
+
+            has_switchport_access = intf_obj.has_child_with(r'switchport mode access')
+            has_shutdown = intf_obj.has_child_with(r'shutdown')
+            has_netdescript = any(rules.match_description(child.text) for child in intf_obj.re_search_children(r'^\s*description\s'))
+
+            if (has_switchport_access or has_shutdown) and not has_netdescript:
+                interfaces.append(intf_obj.text)
+                intf_obj.append_to_family(NAC_DESCRIPTION)
+                outFile.write(intf_obj.text)
+                outFile.write('\n' + NAC_DESCRIPTION + '\n')
+
     #Write new file that contains complete config, including old and new lines
-    parse.save_as(changes+'/'+filename+'.new')
+    parse.save_as(os.path.join(changes, filename + '.new'))
+    return interfaces
+
+
+def generate_nac_config(name, config_text, changes, rules, excluded=frozenset()):
+    """
+    Write name.delta and name.new to changes for a configuration held in memory. Ports in
+    excluded (normalized names, e.g. Gi1/0/1) never get NAC config. Returns the list of
+    interfaces that were changed.
+    """
+    with open(os.path.join(changes, name + '.delta'), 'w') as delta_file, open(os.path.join(changes, name + '.new'), 'w') as new_file:
+        return scan_lines(split_config_lines(config_text), delta_file, new_file, rules, NAC_DESCRIPTION, excluded)
+
+
+def file_digest(path):
+    """Return the sha256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_config(filename, config_dir, changes, rules_file=None, engine='scan'):
+    """
+    Worker entry point for incremental runs: parse a configuration file and return its
+    changed interfaces along with the hashes of the generated files for the manifest.
+    """
+    interfaces = parse_config(filename, config_dir, changes, rules_file, engine)
+    outputs = {name: file_digest(os.path.join(changes, name)) for name in (filename + '.delta', filename + '.new')}
+    return interfaces, outputs
+
+
+def load_manifest(changes):
+    path = os.path.join(changes, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'files': {}}
+
+
+def save_manifest(changes, manifest):
+    """Write the manifest atomically so an interrupted run never leaves it half written."""
+    path = os.path.join(changes, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def is_unchanged(entry, input_hash, rules, changes):
+    """
+    Return True when a manifest entry matches the input hash and ruleset and every output
+    it recorded is still present and unmodified.
+    """
+    if not entry or entry.get('sha256') != input_hash:
+        return False
+    if entry.get('ruleset_version') != rules.version or entry.get('ruleset_digest') != rules.digest:
+        return False
+    for name, output_hash in entry.get('outputs', {}).items():
+        output_path = os.path.join(changes, name)
+        if not os.path.exists(output_path) or file_digest(output_path) != output_hash:
+            return False
+    return True
+
+
+def remove_outputs(entry, changes):
+    """Delete the outputs a manifest entry recorded, for an input that no longer exists."""
+    for name in entry.get('outputs', {}):
+        try:
+            os.remove(os.path.join(changes, name))
+        except FileNotFoundError:
+            pass
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Generate NAC configuration changes from saved Cisco IOS configurations.')
+    parser.add_argument('--configs', default='configs', help='directory of saved switch configurations (default: configs)')
+    parser.add_argument('--output', default='nac-configs', help='directory for the .delta and .new files (default: nac-configs)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of parser processes (default: CPU count)')
+    parser.add_argument('--rules', default=None, help='exclusion ruleset file (default: nacrules.json)')
+    parser.add_argument('--engine', choices=ENGINES, default='scan', help='config parser to use (default: scan)')
+    parser.add_argument('--verify', action='store_true', help='also run the other engine and report files whose output differs')
+    parser.add_argument('--force', action='store_true', help='rebuild every configuration, ignoring the manifest')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    filenames = sorted(f for f in os.listdir(args.configs) if os.path.isfile(os.path.join(args.configs, f)))
+    rules = load_rules(args.rules)
+
+    results = {}
+    failures = {}
+    skipped = []
+    starttime = time.perf_counter()
+
+    # Compare every input against the manifest and only rebuild new or changed configurations
+    manifest = load_manifest(args.output)
+    previous = manifest.get('files', {})
+    manifest = {'ruleset_version': rules.version, 'ruleset_digest': rules.digest, 'files': {}}
+    input_hashes = {}
+    pending = []
+    for filename in filenames:
+        input_hashes[filename] = file_digest(os.path.join(args.configs, filename))
+        if not args.force and is_unchanged(previous.get(filename), input_hashes[filename], rules, args.output):
+            skipped.append(filename)
+            manifest['files'][filename] = previous[filename]
+        else:
+            pending.append(filename)
+    # Drop the outputs of configurations deleted since the last run, their entries are not carried over
+    removed = sorted(set(previous) - set(input_hashes))
+    for filename in removed:
+        remove_outputs(previous[filename], args.output)
+
+    # Fan the configuration files out over the worker processes and collect results as they finish
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(build_config, filename, args.configs, args.output, args.rules, args.engine): filename for filename in pending}
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    results[filename], outputs = future.result()
+                except Exception as e:
+                    failures[filename] = e
+                    print('!Failed to parse', filename + ':', e)
+                    continue
+                manifest['files'][filename] = {
+                    'sha256': input_hashes[filename],
+                    'ruleset_version': rules.version,
+                    'ruleset_digest': rules.digest,
+                    'outputs': outputs,
+                    'interfaces': len(results[filename]),
+                }
+                #Print interfaces which meet the child critera - for debugging
+                print(filename + ':', ', '.join(results[filename]))
+    finally:
+        save_manifest(args.output, manifest)
+    stoptime = time.perf_counter()
+
+    if args.verify:
+        mismatches = verify_engines(sorted(results), args)
+        print(f"\nVerified {len(results)} files against the {'ciscoconfparse' if args.engine == 'scan' else 'scan'} engine: {len(mismatches)} differ")
+        for filename in mismatches:
+            print('!Output differs:', filename)
+            failures[filename] = 'engine output mismatch'
+
+    print(f"\nProcessed {len(filenames)} configuration files with {args.workers} workers in {stoptime - starttime:0.4f} seconds")
+    print(f"Rebuilt: {len(results)}  Skipped (unchanged): {len(skipped)}  Removed (deleted): {len(removed)}  Failed: {len(failures)}")
+    print(f"NAC enabled interfaces in rebuilt files: {sum(len(interfaces) for interfaces in results.values())}")
+    if failures:
+        print(f"Failed files ({len(failures)}):", ', '.join(sorted(failures)))
+    return 1 if failures else 0
+
+
+def verify_engines(filenames, args):
+    """
+    Re-run filenames with the engine that was not selected into a temporary directory and
+    return the files whose .delta or .new output is not byte-identical.
+    """
+    other_engine = 'ciscoconfparse' if args.engine == 'scan' else 'scan'
+    mismatches = []
+    with tempfile.TemporaryDirectory() as verify_dir:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(parse_config, filename, args.configs, verify_dir, args.rules, other_engine): filename for filename in filenames}
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    future.result()
+                except Exception:
+                    mismatches.append(filename)
+                    continue
+                for suffix in ('.delta', '.new'):
+                    if not filecmp.cmp(os.path.join(args.output, filename + suffix), os.path.join(verify_dir, filename + suffix), shallow=False):
+                        mismatches.append(filename)
+                        break
+    return sorted(mismatches)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
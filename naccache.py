@@ -0,0 +1,127 @@
+"""
+    Per-host, per-getter cache of napalm getter results.
+
+    Slow-changing getters (interfaces, ...) are kept in <directory>/<host>.json.gz with the
+    time they were fetched, and are only requested from the device again once their TTL
+    has expired. facts is always fetched first and acts as the validator: a host's cache is
+    dropped when its uptime went backwards (the switch reloaded) or its OS version changed.
+"""
+
+import gzip
+import json
+import pathlib
+import time
+
+CACHE_SUFFIX = '.json.gz'
+CACHE_FORMAT = 1
+
+#Seconds a getter result stays valid. 0 means always fetched. facts is the validator and is always fetched.
+DEFAULT_TTLS = {
+    'facts': 0,
+    'interfaces': 6 * 3600,
+    'lldp_neighbors_detail': 0,
+    'mac_address_table': 0,
+}
+
+
+def parse_ttls(values, ttls=DEFAULT_TTLS):
+    """
+    Apply 'getter=seconds' overrides, e.g. from the command line, to a copy of ttls.
+    """
+    ttls = dict(ttls)
+    for value in values or ():
+        getter, sep, seconds = value.partition('=')
+        if not sep or getter not in ttls:
+            raise ValueError("TTL must be getter=seconds with getter one of %s: %s" % (', '.join(sorted(ttls)), value))
+        ttls[getter] = int(seconds)
+    ttls['facts'] = 0
+    return ttls
+
+
+class GetterCache:
+    """
+    Cached getter results for every host in a directory. Each host's file is only read
+    and written from the worker thread handling that host.
+    """
+
+    def __init__(self, directory, ttls=DEFAULT_TTLS):
+        self.path = pathlib.Path(directory)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.ttls = dict(ttls)
+
+    def host_path(self, host):
+        return self.path / (host + CACHE_SUFFIX)
+
+    def load(self, host):
+        try:
+            with gzip.open(self.host_path(host), 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('format') != CACHE_FORMAT:
+            return None
+        return entry
+
+    def is_valid(self, entry, facts):
+        """
+        A cache entry is valid while the switch has not reloaded and runs the same OS version.
+        """
+        if entry is None:
+            return False
+        if entry.get('os_version') != facts.get('os_version'):
+            return False
+        cached_uptime = entry.get('uptime', -1)
+        uptime = facts.get('uptime', -1)
+        #Drivers report -1 when uptime is unknown, then only the OS version is compared.
+        if cached_uptime >= 0 and uptime >= 0 and uptime < cached_uptime:
+            return False
+        return True
+
+    def lookup(self, host, getters, facts, now=None):
+        """
+        Return (cached, stale): the still-valid cached results and the getters that have to
+        be requested from the device.
+        """
+        now = time.time() if now is None else now
+        entry = self.load(host)
+        cached = {}
+        stale = []
+        if not self.is_valid(entry, facts):
+            entry = {'getters': {}}
+        for getter in getters:
+            if getter == 'facts':
+                continue
+            ttl = self.ttls.get(getter, 0)
+            item = entry['getters'].get(getter)
+            if ttl > 0 and item is not None and now - item['fetched'] < ttl:
+                cached[getter] = item['result']
+            else:
+                stale.append(getter)
+        return cached, stale
+
+    def update(self, host, facts, results, now=None):
+        """
+        Store freshly fetched results for the getters that have a TTL, keeping still-valid
+        entries for the others.
+        """
+        now = time.time() if now is None else now
+        entry = self.load(host)
+        if not self.is_valid(entry, facts):
+            entry = {'getters': {}}
+        getters = entry['getters']
+        for getter, result in results.items():
+            if self.ttls.get(getter, 0) > 0:
+                getters[getter] = {'fetched': now, 'result': result}
+        entry = {
+            'format': CACHE_FORMAT,
+            'host': host,
+            'os_version': facts.get('os_version'),
+            'uptime': facts.get('uptime', -1),
+            'getters': getters,
+        }
+        path = self.host_path(host)
+        #Write to a temporary name first so an interrupted run never leaves a truncated cache file.
+        tmp_path = path.with_name(path.name + '.tmp')
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f, default=str)
+        tmp_path.replace(path)
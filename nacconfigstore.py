@@ -0,0 +1,132 @@
+"""
+    Content-addressed, compressed store for switch configurations.
+
+    Every distinct configuration text is stored once as objects/<sha256[:2]>/<sha256>.gz,
+    so unchanged configs cost nothing across runs and identical configs are shared between
+    hosts. refs/<host>.json points at the latest running and startup config of each host and
+    refs/<host>.history.jsonl gets a line whenever one of them changes.
+
+    The collector fills the store from the same session as the getters (--config-store DIR).
+    Export the latest running configs for iosnacconfparser.py with:
+
+        python nacconfigstore.py export config-store configs
+"""
+
+import argparse
+import datetime as dt
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import threading
+
+#get_config() keys kept in the store; the candidate config is empty on IOS.
+CONFIG_KINDS = ('running', 'startup')
+
+
+class ConfigStore:
+    """
+    Configuration archive in a directory. Safe to use from several worker threads as long
+    as each host is only saved by one thread at a time.
+    """
+
+    def __init__(self, directory):
+        self.path = pathlib.Path(directory)
+        (self.path / 'objects').mkdir(parents=True, exist_ok=True)
+        (self.path / 'refs').mkdir(parents=True, exist_ok=True)
+
+    def object_path(self, digest):
+        return self.path / 'objects' / digest[:2] / (digest + '.gz')
+
+    def put(self, text):
+        """
+        Store a configuration text and return its sha256 digest. Existing objects are not
+        rewritten.
+        """
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            #Unique temporary name per process and thread: two hosts may store the same config at
+            #once, also from different nacshards.py shards.
+            tmp_path = path.with_name('%s.%d.%d.tmp' % (path.name, os.getpid(), threading.get_ident()))
+            with gzip.open(tmp_path, 'wb', compresslevel=9) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        with gzip.open(self.object_path(digest), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def ref_path(self, host):
+        return self.path / 'refs' / (host + '.json')
+
+    def latest(self, host):
+        """Return the latest ref of a host: {'host', 'captured', 'configs': {kind: digest}} or None."""
+        try:
+            with open(self.ref_path(host)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_host(self, host, configs):
+        """
+        Store a host's get_config() result. Returns True when any config differs from the
+        host's previous ref.
+        """
+        digests = {kind: self.put(configs[kind]) for kind in CONFIG_KINDS if configs.get(kind)}
+        previous = self.latest(host)
+        ref = {'host': host, 'captured': dt.datetime.now().isoformat(timespec='seconds'), 'configs': digests}
+        changed = previous is None or previous.get('configs') != digests
+        if changed:
+            with open(self.path / 'refs' / (host + '.history.jsonl'), 'a') as f:
+                f.write(json.dumps(ref, sort_keys=True) + '\n')
+        tmp_path = self.ref_path(host).with_name(host + '.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(ref, f, sort_keys=True)
+        os.replace(tmp_path, self.ref_path(host))
+        return changed
+
+    def hosts(self):
+        return sorted(path.name[:-len('.json')] for path in (self.path / 'refs').glob('*.json'))
+
+    def export(self, directory, kind='running'):
+        """
+        Write the latest config of each host to directory/<host>.txt, leaving files whose
+        content is unchanged untouched. Returns the number of files written.
+        """
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        written = 0
+        for host in self.hosts():
+            digest = self.latest(host)['configs'].get(kind)
+            if not digest:
+                continue
+            path = directory / (host + '.txt')
+            if path.exists() and hashlib.sha256(path.read_bytes()).hexdigest() == digest:
+                continue
+            path.write_bytes(self.get(digest).encode('utf-8'))
+            written += 1
+        return written
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Work with the content-addressed switch configuration store.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help='write the latest config of every host to a directory')
+    export.add_argument('store', help='config store directory')
+    export.add_argument('directory', help='output directory, e.g. the iosnacconfparser.py --configs directory')
+    export.add_argument('--kind', choices=CONFIG_KINDS, default='running')
+    args = parser.parse_args(argv)
+
+    store = ConfigStore(args.store)
+    written = store.export(args.directory, args.kind)
+    print(f"Exported {written} changed {args.kind} configs of {len(store.hosts())} hosts to {args.directory}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
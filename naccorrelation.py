@@ -0,0 +1,211 @@
+"""
+    Cross-switch MAC and LLDP correlation for uplink and daisy-chain detection.
+
+    CorrelationIndex is filled as hosts complete and holds every MAC table entry of the run
+    as integer-packed MACs in array('Q') storage, with the interned (switch, port) id in an
+    array('I') and the VLAN in an array('H') - 14 bytes per entry, split into 256 buckets by
+    the MAC's low byte. LLDP neighbors map chassis IDs and system names to inventory switches.
+
+    Inventory hosts that were not collected in this run (other sites, failed or filtered
+    hosts) are registered by name too, so LLDP neighbors still resolve to them.
+
+    Once every host is in, the first locate() sorts each bucket by MAC so every lookup
+    bisects it instead of scanning, and find_exclusions() walks one bucket at a time. A MAC
+    learned on several switches is treated as attached to the port with the fewest MACs (its
+    edge port); its other ports are transit ports that learn it from up- or downstream. Ports
+    with more transit MACs than the rules allow, making up at least the rules' share of the
+    port's MACs, are uplinks. Ports whose LLDP neighbor, or a MAC in whose table, is another
+    inventory switch face that switch.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+import ipaddress
+
+from ouiindex import mac_to_int
+
+BUCKETS = 256
+
+#Transit MACs on a port above which, and their minimum share of the port's MACs, it is
+#reported as an uplink when the rules don't say.
+DEFAULT_UPLINK_MAX_SHARED_MACS = 1
+DEFAULT_UPLINK_SHARED_RATIO = 0.5
+
+
+def short_name(name):
+    """Lower-case host name without its domain, for matching LLDP system names to hosts."""
+    return str(name or '').strip().lower().split('.')[0]
+
+
+class CorrelationIndex:
+    """
+    Run-wide index of MAC locations and LLDP neighbors. add_host() is called from the
+    stream processor under its lock, find_exclusions() and locate() after the last host.
+    """
+
+    def __init__(self):
+        self.switches = []
+        self.switch_ids = {}
+        #Inventory name, facts hostname and FQDN (short, lower case) -> switch id.
+        self.names = {}
+        self.ports = []
+        self.port_ids = {}
+        self.port_macs = array('I')
+        self.macs = [array('Q') for _ in range(BUCKETS)]
+        self.locations = [array('I') for _ in range(BUCKETS)]
+        self.vlans = [array('H') for _ in range(BUCKETS)]
+        #(port id, remote system name, chassis MAC as an int or None) per LLDP neighbor.
+        self.lldp = []
+        #Set once the buckets are sorted by MAC, cleared by add_host().
+        self.sorted = True
+
+    def __len__(self):
+        return sum(len(macs) for macs in self.macs)
+
+    def switch_id(self, switch):
+        switch_id = self.switch_ids.get(switch)
+        if switch_id is None:
+            switch_id = self.switch_ids[switch] = len(self.switches)
+            self.switches.append(switch)
+        return switch_id
+
+    def port_id(self, switch_id, port):
+        key = (switch_id, port)
+        port_id = self.port_ids.get(key)
+        if port_id is None:
+            port_id = self.port_ids[key] = len(self.ports)
+            self.ports.append(key)
+            self.port_macs.append(0)
+        return port_id
+
+    def add_name(self, switch_id, name):
+        if short_name(name):
+            self.names.setdefault(short_name(name), switch_id)
+
+    def add_inventory_host(self, host, hostname=None):
+        """
+        Register an inventory host by its name and, unless it is an IP address, its
+        hostname, whether or not it is collected in this run.
+        """
+        switch_id = self.switch_id(host)
+        self.add_name(switch_id, host)
+        try:
+            ipaddress.ip_address(str(hostname))
+        except ValueError:
+            self.add_name(switch_id, hostname)
+
+    def add_host(self, host, record):
+        """
+        Index a host's MAC table, LLDP neighbors and names from its nacnormalize.HostRecord,
+        whose port names match the exclusion rows.
+        """
+        switch_id = self.switch_id(host)
+        for name in (host, record.facts.hostname, record.facts.fqdn):
+            self.add_name(switch_id, name)
+
+        self.sorted = False
+        ports = {}
+        port_macs = self.port_macs
+        for port, mac, vlan in record.mac_table:
+            mac = mac_to_int(mac)
+            if mac is None:
+                continue
+            port_id = ports.get(port)
+            if port_id is None:
+                port_id = ports[port] = self.port_id(switch_id, port)
+            bucket = mac & 0xff
+            self.macs[bucket].append(mac)
+            self.locations[bucket].append(port_id)
+            self.vlans[bucket].append(vlan if isinstance(vlan, int) and 0 <= vlan < 0x10000 else 0)
+            port_macs[port_id] += 1
+
+        for neighbor in record.lldp:
+            self.lldp.append((self.port_id(switch_id, neighbor.port), neighbor.system_name, mac_to_int(neighbor.chassis_id)))
+
+    def sort(self):
+        """
+        Sort every bucket by MAC, keeping entries of the same MAC in the order their hosts
+        were added. Only does work when hosts were added since the last sort.
+        """
+        if self.sorted:
+            return
+        for bucket in range(BUCKETS):
+            macs = self.macs[bucket]
+            order = sorted(range(len(macs)), key=macs.__getitem__)
+            self.macs[bucket] = array('Q', (macs[position] for position in order))
+            locations = self.locations[bucket]
+            self.locations[bucket] = array('I', (locations[position] for position in order))
+            vlans = self.vlans[bucket]
+            self.vlans[bucket] = array('H', (vlans[position] for position in order))
+        self.sorted = True
+
+    def locate(self, mac):
+        """Every (switch, port, vlan) a MAC address was learned on."""
+        mac = mac_to_int(mac)
+        if mac is None:
+            return []
+        self.sort()
+        bucket = mac & 0xff
+        macs, locations, vlans = self.macs[bucket], self.locations[bucket], self.vlans[bucket]
+        start = bisect_left(macs, mac)
+        found = []
+        for position in range(start, bisect_right(macs, mac, start)):
+            switch_id, port = self.ports[locations[position]]
+            found.append((self.switches[switch_id], port, vlans[position]))
+        return found
+
+    def neighbor_switches(self):
+        """
+        LLDP neighbors that are other inventory switches: [(port id, switch id)], plus
+        {chassis MAC: switch id} for recognising those switches in MAC tables.
+        """
+        faces = []
+        chassis = {}
+        for port_id, system_name, chassis_mac in self.lldp:
+            switch_id = self.names.get(short_name(system_name))
+            if switch_id is None:
+                continue
+            if chassis_mac is not None:
+                chassis[chassis_mac] = switch_id
+            if switch_id != self.ports[port_id][0]:
+                faces.append((port_id, switch_id))
+        return faces, chassis
+
+    def find_exclusions(self, max_shared_macs=DEFAULT_UPLINK_MAX_SHARED_MACS, shared_ratio=DEFAULT_UPLINK_SHARED_RATIO):
+        """
+        Return (switch, port, reason) for every port that is an uplink or faces another
+        inventory switch, in switch and port order.
+        """
+        ports = self.ports
+        port_macs = self.port_macs
+        port_switch = array('I', (switch_id for switch_id, _ in ports))
+        faces, chassis = self.neighbor_switches()
+        facing = {}
+        for port_id, switch_id in faces:
+            facing.setdefault(port_id, set()).add(switch_id)
+        transit = {}
+
+        for macs, locations in zip(self.macs, self.locations):
+            #MAC -> the port id with the fewest MACs it was learned on, only for this bucket.
+            edge = {}
+            for mac, port_id in zip(macs, locations):
+                current = edge.get(mac)
+                if current is None or port_macs[port_id] < port_macs[current]:
+                    edge[mac] = port_id
+            for mac, port_id in zip(macs, locations):
+                if port_switch[edge[mac]] != port_switch[port_id]:
+                    transit[port_id] = transit.get(port_id, 0) + 1
+                neighbor = chassis.get(mac)
+                if neighbor is not None and neighbor != port_switch[port_id]:
+                    facing.setdefault(port_id, set()).add(neighbor)
+
+        exclusions = []
+        for port_id in sorted(set(transit) | set(facing), key=lambda port_id: (self.switches[ports[port_id][0]], ports[port_id][1])):
+            switch_id, port = ports[port_id]
+            switch = self.switches[switch_id]
+            shared = transit.get(port_id, 0)
+            if shared > max_shared_macs and shared >= shared_ratio * port_macs[port_id]:
+                exclusions.append((switch, port, 'Uplink: %d of %d MACs attached to other switches' % (transit[port_id], port_macs[port_id])))
+            for neighbor in sorted(self.switches[neighbor_id] for neighbor_id in facing.get(port_id, ())):
+                exclusions.append((switch, port, 'Faces inventory device ' + neighbor))
+        return exclusions
@@ -0,0 +1,199 @@
+"""
+    SQLite results store for discovery runs.
+
+    The 'sqlite' output format (--format sqlite) appends every run to one database,
+    nacdiscovery.sqlite next to the other outputs. Each sheet has a table with a run_id
+    column (the output name, e.g. NACFACTS-MixGrouping1-2021-03-01-10-00-00) and indexes on
+    switch, interface, MAC and vendor, so questions across switches, sites and runs are a
+    single query. vendor is indexed case-insensitively, like LIKE compares, so a vendor prefix
+    search is an index range scan:
+
+        SELECT switch, interface, mac FROM mac_entries WHERE vendor LIKE 'VMware%';
+
+    Rows are buffered per sheet and written with executemany in one transaction per host
+    when the collector flushes its outputs. A run ID that is already in the database is
+    replaced: its earlier rows are deleted when the new run starts. A run's workbook can be
+    rebuilt later:
+
+        python nacdb.py runs nacdiscovery.sqlite
+        python nacdb.py export nacdiscovery.sqlite NACFACTS-MixGrouping1-2021-03-01-10-00-00 --format xlsx
+"""
+
+import argparse
+import datetime as dt
+import json
+import pathlib
+import sqlite3
+
+DATABASE_NAME = 'nacdiscovery.sqlite'
+
+#Sheet -> (table, columns in sheet column order).
+TABLES = {
+    'Facts': ('facts', ['switch', 'vendor', 'model', 'os_version', 'serial_number', 'uptime']),
+    'Interfaces': ('interfaces', ['switch', 'interface', 'description', 'admin_status', 'oper_status', 'speed']),
+    'Mac Table Vendors': ('mac_entries', ['switch', 'interface', 'mac', 'vendor']),
+    'LLDP Neighbors': ('lldp_neighbors', ['switch', 'interface', 'remote_system_id', 'remote_system_name', 'remote_system_description', 'remote_port_id', 'remote_port_description', 'remote_capability', 'vendor']),
+    'Multi Mac Ports': ('multimac_ports', ['switch', 'interface', 'mac_count', 'vendors']),
+    'Port Exclusion Recommendations': ('exclusions', ['switch', 'interface', 'reason', 'description']),
+    'Failed Devices': ('failures', ['switch', 'hostname', 'error', 'attempts']),
+    'Run Stats': ('run_stats', ['switch', 'model', 'os_version', 'phase', 'count', 'total_seconds', 'p50', 'p95', 'max']),
+    'Changes': ('changes', ['switch', 'interface', 'change', 'detail']),
+}
+
+#Columns holding booleans, which SQLite stores as 0 and 1.
+BOOLEAN_COLUMNS = ('admin_status', 'oper_status')
+
+#Columns indexed in every table that has them.
+INDEXED_COLUMNS = ('run_id', 'switch', 'interface', 'mac', 'vendor')
+
+#Indexed columns searched with LIKE, which ignores case and only uses a NOCASE index.
+NOCASE_COLUMNS = ('vendor',)
+
+_SQL_TYPES = (int, float, str, bytes)
+
+
+def create_schema(connection):
+    connection.execute('CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, started TEXT, sheets TEXT)')
+    for table, columns in TABLES.values():
+        connection.execute('CREATE TABLE IF NOT EXISTS %s (run_id TEXT NOT NULL, %s)' % (table, ', '.join(columns)))
+        for column in INDEXED_COLUMNS:
+            if column in NOCASE_COLUMNS and column in columns:
+                connection.execute('CREATE INDEX IF NOT EXISTS %s_%s_nocase ON %s (%s COLLATE NOCASE)' % (table, column, table, column))
+            elif column == 'run_id' or column in columns:
+                connection.execute('CREATE INDEX IF NOT EXISTS %s_%s ON %s (%s)' % (table, column, table, column))
+
+
+def connect(path):
+    connection = sqlite3.connect(str(path), isolation_level=None, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class SqliteSink:
+    """
+    Output sink appending a run to the results database. The collector only uses a sink
+    from the thread holding its output lock, so one connection is shared by the workers.
+    """
+
+    def __init__(self, path, run_id, sheets):
+        unknown = [sheet for sheet in sheets if sheet not in TABLES]
+        if unknown:
+            raise ValueError("No SQLite table for sheets: %s" % ', '.join(unknown))
+        self.path = str(path)
+        self.run_id = run_id
+        self.connection = connect(path)
+        with self.connection:
+            self.connection.execute('BEGIN')
+            create_schema(self.connection)
+            #Rows of an earlier run with the same ID go in the same transaction as its runs entry.
+            for table, _ in TABLES.values():
+                self.connection.execute('DELETE FROM %s WHERE run_id = ?' % table, (run_id,))
+            self.connection.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?)', (run_id, dt.datetime.now().isoformat(timespec='seconds'), json.dumps(list(sheets))))
+        self.statements = {}
+        self.buffers = {}
+        for sheet in sheets:
+            table, columns = TABLES[sheet]
+            self.statements[sheet] = 'INSERT INTO %s VALUES (?%s)' % (table, ', ?' * len(columns))
+            self.buffers[sheet] = []
+
+    def append(self, sheet, row):
+        self.buffers[sheet].append([self.run_id] + [value if value is None or isinstance(value, _SQL_TYPES) else str(value) for value in row])
+
+    def flush(self):
+        """Write the buffered rows of every sheet in a single transaction."""
+        if not any(self.buffers.values()):
+            return
+        with self.connection:
+            self.connection.execute('BEGIN')
+            for sheet, rows in self.buffers.items():
+                if rows:
+                    self.connection.executemany(self.statements[sheet], rows)
+                    rows.clear()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+
+
+def list_runs(path):
+    """(run_id, started, rows in the first sheet's table) of every run, oldest first."""
+    connection = connect(path)
+    try:
+        runs = []
+        for run_id, started, sheets in connection.execute('SELECT run_id, started, sheets FROM runs ORDER BY started, run_id').fetchall():
+            table = TABLES[json.loads(sheets)[0]][0]
+            runs.append((run_id, started, connection.execute('SELECT COUNT(*) FROM %s WHERE run_id = ?' % table, (run_id,)).fetchone()[0]))
+        return runs
+    finally:
+        connection.close()
+
+
+def export_run(path, run_id, basename, formats=('xlsx',)):
+    """
+    Rebuild the outputs of a run from the database through the nacoutput sinks. Returns the
+    number of rows written per sheet.
+    """
+    from nacoutput import open_sinks, SHEETS, DIFF_SHEETS
+
+    connection = connect(path)
+    try:
+        found = connection.execute('SELECT sheets FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        if found is None:
+            raise KeyError("Run not found: %s" % run_id)
+        headers = dict(SHEETS, **DIFF_SHEETS)
+        sheets = {sheet: headers[sheet] for sheet in json.loads(found[0])}
+        output = open_sinks(basename, [fmt for fmt in formats if fmt != 'sqlite'], sheets)
+        counts = {}
+        try:
+            for sheet in sheets:
+                table, columns = TABLES[sheet]
+                cursor = connection.execute('SELECT %s FROM %s WHERE run_id = ? ORDER BY rowid' % (', '.join(columns), table), (run_id,))
+                booleans = [position for position, column in enumerate(columns) if column in BOOLEAN_COLUMNS]
+                counts[sheet] = 0
+                for row in cursor:
+                    row = list(row)
+                    for position in booleans:
+                        if row[position] is not None:
+                            row[position] = bool(row[position])
+                    output.append(sheet, row)
+                    counts[sheet] += 1
+                output.flush()
+        finally:
+            for sink, e in output.close():
+                print(f"Failed to save {type(sink).__name__} output {basename}: {e}")
+        return counts
+    finally:
+        connection.close()
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Work with the discovery results database.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    runs = subparsers.add_parser('runs', help='list the runs in the database')
+    runs.add_argument('database', help='database file, e.g. nacdiscovery.sqlite')
+    export = subparsers.add_parser('export', help='rebuild the workbook or other outputs of a run')
+    export.add_argument('database', help='database file, e.g. nacdiscovery.sqlite')
+    export.add_argument('run_id', help='run ID as listed by the runs command')
+    export.add_argument('--output', default=None, help='output name (default: the run ID)')
+    export.add_argument('--format', dest='formats', action='append', choices=('xlsx', 'csv', 'parquet'), help='output format, repeat for several (default: xlsx)')
+    args = parser.parse_args(argv)
+
+    if not pathlib.Path(args.database).exists():
+        parser.error('database not found: %s' % args.database)
+    if args.command == 'runs':
+        for run_id, started, rows in list_runs(args.database):
+            print(f"{run_id}  {started}  {rows} rows")
+        return 0
+    try:
+        counts = export_run(args.database, args.run_id, args.output or args.run_id, args.formats or ('xlsx',))
+    except KeyError as e:
+        parser.error(e.args[0])
+    print(f"Exported {sum(counts.values())} rows of {args.run_id} to {args.output or args.run_id}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,65 @@
+"""
+    Single command line entry point for the NAC discovery tools.
+
+        python nacdiscovery.py collect --site herndon --format xlsx
+        python nacdiscovery.py replay captures/2021-03-01-10-00-00 --format csv
+        python nacdiscovery.py parse-configs --configs configs --output nacconfigs
+        python nacdiscovery.py shards run --site herndon --site reston
+        python nacdiscovery.py db runs nacdiscovery.sqlite
+        python nacdiscovery.py config-store export configstore configs
+
+    Every command hands its remaining arguments to the main() of the module doing the work,
+    so 'nacdiscovery.py collect --help' lists the collector's options. Only the chosen
+    command's module is imported. Nornir, napalm, netmiko and paramiko are loaded by the
+    collector when it connects to devices, so --help, replay and parse-configs start
+    without them.
+"""
+
+import importlib
+import sys
+
+#Command -> (module, arguments put in front of the command's own, help).
+COMMANDS = {
+    'collect': ('collectswitchfacts_hybrid', [], 'collect switch facts and port exclusion recommendations from the devices'),
+    'replay': ('collectswitchfacts_hybrid', ['--replay'], 'build the outputs from a capture directory: replay DIR [collect options]'),
+    'parse-configs': ('iosnacconfparser', [], 'generate NAC configuration changes from saved IOS configurations'),
+    'shards': ('nacshards', [], 'run discovery sharded by site or tag and merge the outputs'),
+    'db': ('nacdb', [], 'list and export the runs in a results database'),
+    'config-store': ('nacconfigstore', [], 'work with the content-addressed configuration store'),
+}
+
+PROG = 'nacdiscovery.py'
+
+
+def usage():
+    lines = ['usage: %s COMMAND [ARGS ...]' % PROG, '', 'commands:']
+    for command, (_, _, help) in COMMANDS.items():
+        lines.append('  %-15s %s' % (command, help))
+    lines.append('')
+    lines.append("Run '%s COMMAND --help' for the options of a command." % PROG)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0
+    command = argv.pop(0)
+    if command not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        print('\n%s: error: unknown command %r' % (PROG, command), file=sys.stderr)
+        return 2
+    module, prefix, _ = COMMANDS[command]
+    if command == 'replay':
+        if {'-h', '--help'} & set(argv):
+            prefix = []
+        elif not argv or argv[0].startswith('-'):
+            print('usage: %s replay DIR [collect options]' % PROG, file=sys.stderr)
+            print('%s replay: error: the capture directory is required' % PROG, file=sys.stderr)
+            return 2
+    return importlib.import_module(module).main(prefix + argv, prog='%s %s' % (PROG, command))
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
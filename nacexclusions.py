@@ -0,0 +1,76 @@
+"""
+    Port exclusion recommendations shared by the discovery tools.
+
+    One compact PortExclusion record is kept per (switch, port) and collects every reason
+    the port should be left out of NAC. Records are handed out per switch with pop_switch()
+    so each one is exported exactly once, as soon as its switch has been processed.
+"""
+
+
+class PortExclusion:
+    """
+    Exclusion recommendation for a single switch port.
+    """
+    __slots__ = ('switch', 'port', 'reasons', 'description')
+
+    def __init__(self, switch, port):
+        self.switch = switch
+        self.port = port
+        self.reasons = []
+        self.description = ''
+
+    def as_row(self):
+        """Return the record as a 'Port Exclusion Recommendations' worksheet row."""
+        return [self.switch, self.port, str(self.reasons), self.description]
+
+    def __repr__(self):
+        return 'PortExclusion(%r, %r, reasons=%r)' % (self.switch, self.port, self.reasons)
+
+
+class PortExclusions:
+    """
+    Keyed store of PortExclusion records, one per (switch, port).
+    """
+
+    def __init__(self):
+        self._records = {}
+        #Ports of each switch in insertion order so a switch's records can be released together.
+        self._switch_ports = {}
+
+    def add(self, switch, port, reason, description=None):
+        """
+        Record a reason for excluding switch/port, creating the record on first use.
+        """
+        key = (switch, port)
+        record = self._records.get(key)
+        if record is None:
+            record = self._records[key] = PortExclusion(switch, port)
+            self._switch_ports.setdefault(switch, []).append(port)
+        record.reasons.append(reason)
+        if description is not None:
+            record.description = str(description)
+        return record
+
+    def get(self, switch, port):
+        return self._records.get((switch, port))
+
+    def for_switch(self, switch):
+        """Return the records of a switch without removing them."""
+        return [self._records[(switch, port)] for port in self._switch_ports.get(switch, ())]
+
+    def pop_switch(self, switch):
+        """
+        Remove and return every record of a switch. Used by the exporters so each record
+        is written once and memory is released as switches complete.
+        """
+        ports = self._switch_ports.pop(switch, ())
+        return [self._records.pop((switch, port)) for port in ports]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(list(self._records.values()))
+
+    def __contains__(self, key):
+        return key in self._records
@@ -0,0 +1,259 @@
+"""
+    Nornir inventory plugin for CSV or JSON device exports (NetMRI, DNA Center, SolarWinds, ...).
+
+    config.yaml:
+
+        inventory:
+          plugin: nacinventory.FileInventory
+          options:
+            source: devices.csv
+            group_file: groups.yaml
+            cache_dir: .inventory-cache
+
+    A CSV export has a header row with name, hostname, platform, site, role and tags columns
+    (tags and groups separated by ';'); port, username, password and groups are optional and
+    any other column becomes host data. A JSON export is a list of such objects, or an object
+    keyed by name, where tags and groups may also be lists. inventory-example.csv is a small
+    stand-in export for trying the collector and for tests.
+
+    The parsed export is pickled to cache_dir keyed on the sha256 of the source file, one file
+    per site, so a later run only hashes the export and unpickles the sites it needs. Hosts are
+    filtered by site, role and tag (plugin options sites, roles and tags, see init_nornir)
+    before any Nornir Host object is built, so a single-site run of a large inventory only
+    builds that site's hosts.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import shutil
+
+import ruamel.yaml
+from nornir import InitNornir
+from nornir.core import inventory
+from nornir.core.deserializer.inventory import Inventory
+
+#Bumped when the cached record layout changes so older cache files are ignored.
+CACHE_FORMAT = 1
+
+#Export columns that are Host attributes rather than host data.
+HOST_FIELDS = ('name', 'hostname', 'platform', 'port', 'username', 'password', 'groups')
+
+#Separator of several tags or groups in one CSV cell.
+LIST_SEPARATOR = ';'
+
+
+def split_list(value):
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [item.strip() for item in str(value or '').split(LIST_SEPARATOR) if item.strip()]
+
+
+def parse_record(row):
+    """
+    Compact record for one exported device: (name, hostname, platform, port, username,
+    password, groups, data). Empty values are left out of the host data.
+    """
+    row = {key.strip().lower(): value for key, value in row.items() if key and value not in (None, '')}
+    data = dict(row.pop('data', None) or {})
+    for key, value in row.items():
+        if key not in HOST_FIELDS:
+            data[key] = value
+    if 'tags' in data:
+        data['tags'] = split_list(data['tags'])
+    port = row.get('port')
+    return (
+        str(row['name']),
+        row.get('hostname') or str(row['name']),
+        row.get('platform'),
+        int(port) if port else None,
+        row.get('username'),
+        row.get('password'),
+        tuple(split_list(row.get('groups'))),
+        data,
+    )
+
+
+def read_source(path):
+    """Parse a CSV or JSON export into records grouped by site: {site: [record, ...]}."""
+    path = pathlib.Path(path)
+    if path.suffix.lower() == '.json':
+        with open(path, encoding='utf-8') as f:
+            rows = json.load(f)
+        if isinstance(rows, dict):
+            rows = [dict(row, name=name) for name, row in rows.items()]
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+    sites = {}
+    for row in rows:
+        record = parse_record(row)
+        sites.setdefault(str(record[7].get('site', '')), []).append(record)
+    return sites
+
+
+def write_cache(directory, sites):
+    """
+    Pickle each site's records to its own file in directory, with an index of the sites.
+    The directory is built under a temporary name and renamed into place.
+    """
+    tmp_dir = directory.with_name('%s.%d.tmp' % (directory.name, os.getpid()))
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    files = {}
+    for number, (site, records) in enumerate(sites.items()):
+        files[site] = 'site%05d.pickle' % number
+        with open(tmp_dir / files[site], 'wb') as f:
+            pickle.dump(records, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(tmp_dir / 'index.pickle', 'wb') as f:
+        pickle.dump({'format': CACHE_FORMAT, 'files': files}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    try:
+        os.replace(tmp_dir, directory)
+    except OSError:
+        #Another process cached the same source first.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_source(path, cache_dir=None, site_filter=None):
+    """
+    Records of an export grouped by site, {site: [record, ...]}, limited to site_filter when
+    given. With cache_dir the export is parsed once per content hash and only the selected
+    sites are unpickled afterwards; cache directories of older versions of the file are removed.
+    """
+    path = pathlib.Path(path).expanduser()
+    if not cache_dir:
+        sites = read_source(path)
+    else:
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        cache_dir = pathlib.Path(cache_dir).expanduser()
+        directory = cache_dir / ('%s-%s' % (path.stem, digest[:32]))
+        try:
+            with open(directory / 'index.pickle', 'rb') as f:
+                index = pickle.load(f)
+            if index['format'] != CACHE_FORMAT:
+                raise KeyError('format')
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError):
+            sites = read_source(path)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            for stale in cache_dir.glob(path.stem + '-' + '?' * 32):
+                shutil.rmtree(stale, ignore_errors=True)
+            write_cache(directory, sites)
+        else:
+            sites = {}
+            for site, filename in index['files'].items():
+                if site_filter and site not in site_filter:
+                    continue
+                with open(directory / filename, 'rb') as f:
+                    sites[site] = pickle.load(f)
+    if site_filter:
+        sites = {site: sites[site] for site in site_filter if site in sites}
+    return sites
+
+
+def select_records(sites, roles=None, tags=None):
+    """Records of every site whose role and tags match, if given."""
+    roles = set(roles or ())
+    tags = set(tags or ())
+    for records in sites.values():
+        for record in records:
+            data = record[7]
+            if roles and data.get('role') not in roles:
+                continue
+            if tags and tags.isdisjoint(data.get('tags', ())):
+                continue
+            yield record
+
+
+def load_yaml(path):
+    path = pathlib.Path(path).expanduser() if path else None
+    if not path or not path.exists():
+        return {}
+    with open(path) as f:
+        return ruamel.yaml.YAML(typ='safe').load(f) or {}
+
+
+def connection_options(options):
+    return {name: inventory.ConnectionOptions(**values) for name, values in (options or {}).items()}
+
+
+class FileInventory(Inventory):
+    """
+    Inventory plugin building Nornir hosts straight from a CSV or JSON export. Only the
+    hosts passing the sites, roles and tags filters are built; groups and defaults come from
+    the usual YAML files.
+    """
+
+    @classmethod
+    def deserialize(cls, transform_function=None, transform_function_options=None, source='devices.csv', group_file='groups.yaml', defaults_file='defaults.yaml', cache_dir=None, sites=None, roles=None, tags=None, config=None, **kwargs):
+        defaults_data = load_yaml(defaults_file)
+        defaults = inventory.Defaults(
+            data=defaults_data.pop('data', {}),
+            connection_options=connection_options(defaults_data.pop('connection_options', None)),
+            **defaults_data
+        )
+        groups = inventory.Groups()
+        for name, group in load_yaml(group_file).items():
+            group = dict(group or {})
+            group['connection_options'] = connection_options(group.get('connection_options'))
+            group['groups'] = inventory.ParentGroups(group.get('groups') or [])
+            groups[name] = inventory.Group(name=name, **group)
+
+        hosts = inventory.Hosts()
+        for name, hostname, platform, port, username, password, parents, data in select_records(load_source(source, cache_dir, [str(site) for site in sites or ()]), roles, tags):
+            hosts[name] = inventory.Host(
+                name=name,
+                hostname=hostname,
+                platform=platform,
+                port=port,
+                username=username,
+                password=password,
+                groups=inventory.ParentGroups(parents),
+                data=dict(data),
+                defaults=defaults,
+            )
+        return inventory.Inventory(
+            hosts=hosts,
+            groups=groups,
+            defaults=defaults,
+            transform_function=transform_function,
+            transform_function_options=transform_function_options,
+        )
+
+
+def init_nornir(config_file='config.yaml', sites=None, roles=None, tags=None, **kwargs):
+    """
+    InitNornir with the sites, roles and tags handed to a FileInventory so only the selected
+    hosts are built. Other inventory plugins load everything; the caller filters as before.
+    """
+    settings = load_yaml(config_file).get('inventory', {})
+    if str(settings.get('plugin', '')).endswith('FileInventory') and (sites or roles or tags):
+        options = dict(settings.get('options') or {}, sites=sites, roles=roles, tags=tags)
+        kwargs['inventory'] = dict(kwargs.get('inventory', {}), options=options)
+    return InitNornir(config_file=config_file, **kwargs)
+
+
+def inventory_sites(config_file='config.yaml'):
+    """Sorted sites of every host in the Nornir inventory."""
+    settings = load_yaml(config_file).get('inventory', {})
+    if str(settings.get('plugin', '')).endswith('FileInventory'):
+        options = settings.get('options') or {}
+        return sorted(site for site in load_source(options.get('source', 'devices.csv'), options.get('cache_dir')) if site)
+    nr = InitNornir(config_file=config_file)
+    return sorted({str(host.get('site')) for host in nr.inventory.hosts.values() if host.get('site')})
+
+
+def inventory_hosts(config_file='config.yaml', nr=None):
+    """
+    (name, hostname) of every host in the Nornir inventory, whatever sites, roles and tags
+    the run selected. nr, when given, is a Nornir object that already holds the whole
+    inventory of a plugin other than FileInventory.
+    """
+    settings = load_yaml(config_file).get('inventory', {})
+    if str(settings.get('plugin', '')).endswith('FileInventory'):
+        options = settings.get('options') or {}
+        sites = load_source(options.get('source', 'devices.csv'), options.get('cache_dir'))
+        return [(record[0], record[1]) for records in sites.values() for record in records]
+    nr = nr or InitNornir(config_file=config_file)
+    return [(host.name, host.hostname) for host in nr.inventory.hosts.values()]
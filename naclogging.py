@@ -0,0 +1,96 @@
+"""
+    Queue-backed logging for discovery runs.
+
+    Worker threads only put records on a queue; a QueueListener thread formats them and does
+    the file and terminal I/O. The log file holds one JSON object per line with the event
+    text, level, time and, where known, the host, phase and duration in seconds:
+
+        {"time": "2021-03-01T10:00:00.123", "level": "DEBUG", "event": "Processed mac", "host": "sw1", "phase": "mac", "duration": 0.0123}
+
+    The terminal shows INFO and above by default, DEBUG with verbosity 1 or more and only
+    warnings and errors in quiet mode.
+"""
+
+import datetime as dt
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+LOGGER_NAME = 'nacdiscovery'
+
+#Record attributes copied into the JSON event when present.
+EVENT_FIELDS = ('host', 'phase', 'duration', 'attempts', 'hosts', 'path')
+
+log = logging.getLogger(LOGGER_NAME)
+
+
+class JsonLinesFormatter(logging.Formatter):
+
+    def format(self, record):
+        event = {
+            'time': dt.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        for field in EVENT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                event[field] = round(value, 6) if field == 'duration' else value
+        return json.dumps(event, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+
+    def format(self, record):
+        text = record.getMessage()
+        host = getattr(record, 'host', None)
+        if host is not None:
+            text = str(host) + ': ' + text
+        duration = getattr(record, 'duration', None)
+        if duration is not None:
+            text += ' (%.3fs)' % duration
+        if record.levelno >= logging.WARNING:
+            text = record.levelname + ' ' + text
+        return text
+
+
+def start_logging(log_path, verbosity=0, quiet=False):
+    """
+    Route the nacdiscovery logger through a queue to a JSON-lines file at log_path and the
+    terminal. Returns the running QueueListener for stop_logging().
+    """
+    if quiet:
+        console_level = logging.WARNING
+    elif verbosity > 0:
+        console_level = logging.DEBUG
+    else:
+        console_level = logging.INFO
+
+    file_handler = logging.FileHandler(log_path, encoding='utf-8')
+    file_handler.setFormatter(JsonLinesFormatter())
+    file_handler.setLevel(logging.DEBUG)
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(ConsoleFormatter())
+    console_handler.setLevel(console_level)
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, file_handler, console_handler, respect_handler_level=True)
+    log.addHandler(logging.handlers.QueueHandler(records))
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    listener.start()
+    return listener
+
+
+def stop_logging(listener):
+    """
+    Drain the queue, close the file and detach the queue handler.
+    """
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    for handler in list(log.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            log.removeHandler(handler)
@@ -0,0 +1,56 @@
+"""
+    Per-port aggregation of large MAC address tables.
+
+    Distribution and core switches can return 100k+ MAC table entries. Instead of a vendor
+    list per port and a row per MAC, aggregate_mac_table keeps one PortMacs counter per port:
+    the number of entries, the entries per vendor and the first sample_size MACs with their
+    vendor. Memory then grows with the number of ports, not MACs, and multi-MAC detection
+    uses the counts directly.
+"""
+
+from ouiindex import mac_to_int, UNKNOWN_VENDOR
+
+#MACs kept per port for the Mac Table Vendors sheet and change detection.
+DEFAULT_SAMPLE_SIZE = 10
+
+
+class PortMacs:
+    """
+    Counters for the MAC table entries learned on one port.
+    """
+    __slots__ = ('count', 'vendors', 'sample')
+
+    def __init__(self):
+        self.count = 0
+        self.vendors = {}
+        self.sample = []
+
+    @property
+    def complete(self):
+        """True when the sample holds every MAC of the port."""
+        return self.count == len(self.sample)
+
+    def vendor_summary(self):
+        """Vendors with their entry counts, most common first."""
+        return dict(sorted(self.vendors.items(), key=lambda item: (-item[1], item[0])))
+
+
+def aggregate_mac_table(entries, oui_index, sample_size=DEFAULT_SAMPLE_SIZE):
+    """
+    Fold a host's normalized MAC table (nacnormalize.MacEntry records) into
+    {interface: PortMacs}. Vendors are resolved per entry with OuiIndex.lookup_int, so no
+    per-MAC dictionary is built.
+    """
+    ports = {}
+    lookup_int = oui_index.lookup_int
+    for interface, mac, _ in entries:
+        port = ports.get(interface)
+        if port is None:
+            port = ports[interface] = PortMacs()
+        mac_int = mac_to_int(mac)
+        vendor = UNKNOWN_VENDOR if mac_int is None else lookup_int(mac_int)
+        port.count += 1
+        port.vendors[vendor] = port.vendors.get(vendor, 0) + 1
+        if len(port.sample) < sample_size:
+            port.sample.append((mac, vendor))
+    return ports
@@ -0,0 +1,206 @@
+"""
+    Per-driver normalization of napalm getter results into compact typed records.
+
+    The analysis in collectswitchfacts_hybrid, nacmactable and naccorrelation works on one
+    record schema whatever the platform:
+
+        HostRecord(platform, facts, mac_table, lldp, interfaces)
+
+    Interface names are normalized (see interfacenames) so every table joins on the same
+    port keys, MACs and MAC-shaped LLDP chassis IDs are in the AA:BB:CC:DD:EE:FF form the
+    napalm helpers return, LLDP capabilities are a list of lower case names and missing
+    descriptions are ''. MAC table entries without a port are dropped. Each driver's
+    normalizer converts a host's tables at once, resolving each distinct raw interface
+    name a single time, and the stream processor runs it in the worker thread as soon as the
+    host's getters return, before it takes the analysis lock. The MAC table is the exception:
+    HostRecord.mac_table is a MacTable which yields MacEntry records from the raw getter list
+    on every iteration, so tables with 100k+ entries are never copied.
+
+    ios        Cisco IOS and IOS-XE (napalm 'ios'). Full interface names in LLDP and
+               interfaces, short ones in the MAC table, LLDP chassis IDs as aabb.ccdd.eeff
+               and a list of neighbors per LLDP port.
+    procurve   HP Procurve / ArubaOS-Switch (napalm-procurve). Numeric or module port names
+               (1, A1, Trk1), MACs as 001122-334455 or '00 11 22 33 44 55', a neighbor
+               dict or list per LLDP port, capabilities as a comma separated string and VLAN
+               IDs as strings.
+
+    The driver is chosen by the host's Nornir platform, and by the vendor in get_facts for
+    other platforms and for captures replayed without one.
+"""
+
+from collections import namedtuple
+import re
+
+from interfacenames import normalize_interface
+from ouiindex import mac_to_int
+
+Facts = namedtuple('Facts', 'hostname fqdn vendor model os_version serial_number uptime interface_list')
+MacEntry = namedtuple('MacEntry', 'port mac vlan')
+LldpNeighbor = namedtuple('LldpNeighbor', 'port chassis_id system_name system_description port_id port_description capabilities')
+Interface = namedtuple('Interface', 'port description is_enabled is_up speed')
+HostRecord = namedtuple('HostRecord', 'platform facts mac_table lldp interfaces')
+
+_CANONICAL_MAC_RE = re.compile(r'[0-9A-F]{2}(?::[0-9A-F]{2}){5}')
+
+
+def canonical_mac(value):
+    """
+    MAC address in the AA:BB:CC:DD:EE:FF form. Values that are not MAC addresses, such as
+    chassis IDs advertised as host names, are returned unchanged.
+    """
+    if isinstance(value, str) and _CANONICAL_MAC_RE.fullmatch(value):
+        return value
+    mac_int = mac_to_int(value)
+    if mac_int is None:
+        return value
+    digits = '%012X' % mac_int
+    return ':'.join((digits[0:2], digits[2:4], digits[4:6], digits[6:8], digits[8:10], digits[10:12]))
+
+
+class MacTable:
+    """
+    A host's normalized MAC table: iterating it yields a MacEntry per raw entry learned on a
+    port, converted on the fly. ports maps the raw interface names to normalized ports. With
+    canonical the MACs and VLAN IDs are converted too, otherwise they are passed through.
+    """
+    __slots__ = ('entries', 'ports', 'canonical')
+
+    def __init__(self, entries, canonical=False):
+        self.entries = entries or ()
+        self.ports = port_map(entry.get('interface') for entry in self.entries if entry.get('interface'))
+        self.canonical = canonical
+
+    def __iter__(self):
+        ports = self.ports
+        for entry in self.entries:
+            interface = entry.get('interface')
+            if not interface:
+                continue
+            if self.canonical:
+                yield MacEntry(ports[interface], canonical_mac(entry['mac']), vlan_id(entry.get('vlan')))
+            else:
+                yield MacEntry(ports[interface], entry['mac'], entry.get('vlan'))
+
+
+def port_map(names):
+    """{raw interface name: normalized port} for every distinct name."""
+    return {name: normalize_interface(name) for name in set(names)}
+
+
+def vlan_id(value):
+    if isinstance(value, int):
+        return value
+    value = str(value or '').strip()
+    return int(value) if value.isdigit() else None
+
+
+def split_capabilities(value):
+    """LLDP capabilities as a list of lower case names from a list or 'bridge, router' string."""
+    if isinstance(value, str):
+        value = value.split(',')
+    return sorted(str(capability).strip().lower() for capability in value or () if str(capability).strip())
+
+
+def normalize_facts(facts):
+    interface_list = facts.get('interface_list') or ()
+    ports = port_map(interface_list)
+    return Facts(
+        facts.get('hostname'),
+        facts.get('fqdn'),
+        facts.get('vendor'),
+        facts.get('model'),
+        facts.get('os_version'),
+        facts.get('serial_number'),
+        facts.get('uptime'),
+        tuple(ports[name] for name in interface_list),
+    )
+
+
+def normalize_interfaces(interfaces):
+    interfaces = interfaces or {}
+    ports = port_map(interfaces)
+    return [
+        Interface(ports[name], detail.get('description') or '', detail.get('is_enabled'), detail.get('is_up'), detail.get('speed'))
+        for name, detail in interfaces.items()
+    ]
+
+
+def lldp_neighbor(port, neighbor, capabilities):
+    return LldpNeighbor(
+        port,
+        canonical_mac(neighbor.get('remote_chassis_id')),
+        neighbor.get('remote_system_name'),
+        neighbor.get('remote_system_description'),
+        neighbor.get('remote_port'),
+        neighbor.get('remote_port_description'),
+        capabilities,
+    )
+
+
+def normalize_ios(getters_result, platform='ios'):
+    """
+    The ios driver already returns MACs through napalm's mac() helper, integer VLANs and
+    sorted capability lists, so only port names and LLDP chassis IDs are converted.
+    """
+    mac_table = MacTable(getters_result.get('mac_address_table'))
+
+    lldp = getters_result.get('lldp_neighbors_detail') or {}
+    ports = port_map(lldp)
+    neighbors = [lldp_neighbor(ports[name], neighbor, list(neighbor.get('remote_system_capab') or ())) for name, port_neighbors in lldp.items() for neighbor in port_neighbors]
+
+    return HostRecord(platform, normalize_facts(getters_result.get('facts') or {}), mac_table, neighbors, normalize_interfaces(getters_result.get('interfaces')))
+
+
+def normalize_procurve(getters_result, platform='procurve'):
+    """
+    Procurve MACs, VLAN IDs, LLDP neighbors and capabilities come in several notations
+    depending on the driver and firmware version and are all converted. Ports only listed
+    in get_facts are kept in facts.interface_list.
+    """
+    mac_table = MacTable(getters_result.get('mac_address_table'), canonical=True)
+
+    lldp = getters_result.get('lldp_neighbors_detail') or {}
+    ports = port_map(lldp)
+    neighbors = []
+    for name, port_neighbors in lldp.items():
+        if isinstance(port_neighbors, dict):
+            port_neighbors = [port_neighbors]
+        neighbors.extend(lldp_neighbor(ports[name], neighbor, split_capabilities(neighbor.get('remote_system_capab'))) for neighbor in port_neighbors or ())
+
+    return HostRecord(platform, normalize_facts(getters_result.get('facts') or {}), mac_table, neighbors, normalize_interfaces(getters_result.get('interfaces')))
+
+
+#Nornir platform -> normalizer.
+NORMALIZERS = {
+    'ios': normalize_ios,
+    'cisco_ios': normalize_ios,
+    'iosxe': normalize_ios,
+    'procurve': normalize_procurve,
+    'hp_procurve': normalize_procurve,
+    'aruba_os_switch': normalize_procurve,
+}
+
+#Lower case get_facts vendor prefixes -> driver, for platforms not in NORMALIZERS.
+VENDOR_DRIVERS = (
+    ('cisco', 'ios'),
+    ('hp', 'procurve'),
+    ('hewlett', 'procurve'),
+    ('aruba', 'procurve'),
+)
+
+
+def driver_for(platform, facts):
+    """Normalizer driver name for a host: its platform when known, else its vendor, else ios."""
+    if platform in NORMALIZERS:
+        return platform
+    vendor = str((facts or {}).get('vendor') or '').strip().lower()
+    for prefix, driver in VENDOR_DRIVERS:
+        if vendor.startswith(prefix):
+            return driver
+    return 'ios'
+
+
+def normalize_host(getters_result, platform=None):
+    """Normalize a host's raw napalm_get results into a HostRecord."""
+    driver = driver_for(platform, getters_result.get('facts'))
+    return NORMALIZERS[driver](getters_result, platform or driver)
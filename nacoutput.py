@@ -0,0 +1,208 @@
+"""
+    Output layer for the discovery workbook.
+
+    Rows are appended per sheet to one or more sinks and flushed after every host:
+
+      xlsx     - openpyxl write-only (streaming) workbook, saved when the run closes.
+      csv      - one gzip compressed CSV per sheet, sync-flushed after every host so
+                 everything collected before a crash stays readable.
+      parquet  - one Parquet file per sheet, when pyarrow is installed. Rows are buffered
+                 and written in row groups of PARQUET_ROW_GROUP_ROWS rows.
+      sqlite   - rows appended to the nacdiscovery.sqlite results database next to the
+                 outputs with one transaction per flush (see nacdb).
+"""
+
+from collections import OrderedDict
+import csv
+import gzip
+import pathlib
+
+from naclogging import log
+
+#Worksheet names and column headers, in workbook order.
+SHEETS = OrderedDict([
+    ('Facts', ['Switch Hostname', 'Vendor', 'Model', 'OS Version', 'Serial Number', 'Uptime']),
+    ('Interfaces', ['Switch', 'Interface name', 'Description', 'Admin Status', 'Oper Status', 'Speed']),
+    ('Mac Table Vendors', ['Switch', 'Interface', 'MACaddr', 'Vendor OUI']),
+    ('LLDP Neighbors', ['Local Switch', 'Local Port', 'Remote System ID', 'Remote System Name', 'Remote System Description', 'Remote Port ID', 'Remote Port Description', 'Remote Capability', 'Remote Vendor']),
+    ('Multi Mac Ports', ['Switch', 'Interface', 'Count', 'Vendor MACs']),
+    ('Port Exclusion Recommendations', ['Switch', 'Interface', 'Reason', 'Port Description']),
+    ('Failed Devices', ['Switch', 'Hostname', 'Error', 'Attempts']),
+    ('Run Stats', ['Switch', 'Model', 'OS Version', 'Phase', 'Count', 'Total Seconds', 'p50', 'p95', 'Max']),
+])
+
+#Sheets of the change-detection output written next to the discovery workbook.
+DIFF_SHEETS = OrderedDict([
+    ('Changes', ['Switch', 'Interface', 'Change', 'Detail']),
+])
+
+OUTPUT_FORMATS = ('xlsx', 'csv', 'parquet', 'sqlite')
+
+#Rows per Parquet row group. A flush per host would otherwise write one tiny row group each.
+PARQUET_ROW_GROUP_ROWS = 32768
+
+
+def sheet_filename(sheet):
+    """File name stem used for a sheet by the per-sheet sinks, e.g. 'mac-table-vendors'."""
+    return sheet.lower().replace(' ', '-')
+
+
+class WorkbookSink:
+    """
+    Excel workbook written in openpyxl write-only mode. Rows are streamed to temporary
+    files per sheet instead of being held as cells, and the workbook is assembled on close().
+    """
+
+    def __init__(self, path, sheets=SHEETS):
+        import openpyxl
+
+        self.path = str(path)
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.sheets = {}
+        for sheet, headers in sheets.items():
+            ws = self.wb.create_sheet(sheet)
+            ws.append(headers)
+            self.sheets[sheet] = ws
+
+    def append(self, sheet, row):
+        self.sheets[sheet].append(row)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.wb.save(self.path)
+
+
+class CsvSink:
+    """
+    One gzip compressed CSV file per sheet inside a directory.
+    """
+
+    def __init__(self, directory, sheets=SHEETS):
+        self.path = pathlib.Path(directory)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.files = {}
+        self.writers = {}
+        for sheet, headers in sheets.items():
+            gz = gzip.open(self.path / (sheet_filename(sheet) + '.csv.gz'), 'wt', newline='', encoding='utf-8')
+            self.files[sheet] = gz
+            self.writers[sheet] = csv.writer(gz)
+            self.writers[sheet].writerow(headers)
+
+    def append(self, sheet, row):
+        self.writers[sheet].writerow(row)
+
+    def flush(self):
+        #GzipFile.flush() uses Z_SYNC_FLUSH, ending the deflate block so the file decompresses up to this point.
+        for gz in self.files.values():
+            gz.flush()
+
+    def close(self):
+        for gz in self.files.values():
+            gz.close()
+
+
+class ParquetSink:
+    """
+    One Parquet file per sheet inside a directory. Values are stored as strings since the
+    getter results mix types within a column. flush() only writes the sheets that have
+    buffered row_group_rows rows, close() writes the rest; a Parquet file is not readable
+    before its footer is written at close anyway.
+    """
+
+    def __init__(self, directory, sheets=SHEETS, row_group_rows=PARQUET_ROW_GROUP_ROWS):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.row_group_rows = row_group_rows
+        self.path = pathlib.Path(directory)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.buffers = {sheet: [] for sheet in sheets}
+        self.writers = {}
+        for sheet, headers in sheets.items():
+            schema = pyarrow.schema([(header, pyarrow.string()) for header in headers])
+            self.writers[sheet] = pyarrow.parquet.ParquetWriter(str(self.path / (sheet_filename(sheet) + '.parquet')), schema)
+
+    def append(self, sheet, row):
+        self.buffers[sheet].append([None if value is None else str(value) for value in row])
+
+    def write(self, sheet, rows):
+        writer = self.writers[sheet]
+        columns = [self.pa.array(column, type=self.pa.string()) for column in zip(*rows)]
+        writer.write_table(self.pa.Table.from_arrays(columns, schema=writer.schema), row_group_size=self.row_group_rows)
+
+    def flush(self):
+        for sheet, rows in self.buffers.items():
+            if len(rows) >= self.row_group_rows:
+                whole = len(rows) - len(rows) % self.row_group_rows
+                self.write(sheet, rows[:whole])
+                del rows[:whole]
+
+    def close(self):
+        try:
+            for sheet, rows in self.buffers.items():
+                if rows:
+                    self.write(sheet, rows)
+                    rows.clear()
+        finally:
+            for writer in self.writers.values():
+                writer.close()
+
+
+class OutputSinks:
+    """
+    Fan rows out to every configured sink.
+    """
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def append(self, sheet, row):
+        for sink in self.sinks:
+            sink.append(sheet, row)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        """
+        Close every sink, even if one of them fails, and return the list of (sink, exception)
+        failures so the caller can report them.
+        """
+        errors = []
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                errors.append((sink, e))
+        return errors
+
+
+def open_sinks(basename, formats=('xlsx',), sheets=SHEETS):
+    """
+    Open a sink for each requested format. The workbook is written to basename.xlsx and the
+    per-sheet formats to a basename/ directory. Parquet is skipped when pyarrow is missing.
+    SQLite rows go to the shared database in basename's directory with basename as run ID.
+    """
+    sinks = []
+    for fmt in formats:
+        if fmt == 'xlsx':
+            sinks.append(WorkbookSink(basename + '.xlsx', sheets))
+        elif fmt == 'csv':
+            sinks.append(CsvSink(basename, sheets))
+        elif fmt == 'parquet':
+            try:
+                sinks.append(ParquetSink(basename, sheets))
+            except ImportError:
+                log.warning('pyarrow is not installed, skipping Parquet output', extra={'path': basename})
+        elif fmt == 'sqlite':
+            from nacdb import SqliteSink, DATABASE_NAME
+
+            path = pathlib.Path(basename)
+            sinks.append(SqliteSink(path.parent / DATABASE_NAME, path.name, sheets))
+        else:
+            raise ValueError("Unknown output format: %s" % fmt)
+    return OutputSinks(sinks)
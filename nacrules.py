@@ -0,0 +1,87 @@
+"""
+    NAC exclusion ruleset shared by the discovery collector and iosnacconfparser.
+
+    Rules are loaded from a JSON file (nacrules.json by default) and compiled once:
+
+      description_keywords  - words in an interface description that mark a network facing port.
+                              Compiled into a single case-insensitive alternation.
+      lldp_capabilities     - LLDP remote system capabilities that mark a network neighbor.
+      multimac_max_macs     - ports learning more MACs than this are flagged as multi-MAC.
+      uplink_max_shared_macs - ports learning more MACs than this that are attached to another
+                              switch are flagged as uplinks (collector --correlate)...
+      uplink_shared_ratio   - ...when those MACs are at least this share of the port's MACs.
+      version               - bumped whenever the rules change, recorded alongside outputs.
+
+    NacRules.digest is a hash of the compiled rules, so outputs can also be invalidated
+    when the rules were edited without bumping the version.
+"""
+
+import hashlib
+import json
+import pathlib
+import re
+
+DEFAULT_RULES_FILE = pathlib.Path(__file__).with_name('nacrules.json')
+
+
+class NacRules:
+    """
+    Compiled form of a ruleset file.
+    """
+
+    def __init__(self, description_keywords, lldp_capabilities=('router', 'bridge'), multimac_max_macs=1, version=0, uplink_max_shared_macs=1, uplink_shared_ratio=0.5):
+        self.version = version
+        self.description_keywords = list(description_keywords)
+        self.lldp_capabilities = frozenset(capability.lower() for capability in lldp_capabilities)
+        self.multimac_max_macs = int(multimac_max_macs)
+        self.uplink_max_shared_macs = int(uplink_max_shared_macs)
+        self.uplink_shared_ratio = float(uplink_shared_ratio)
+        #Longest keywords first so overlapping keywords report the most specific match.
+        keywords = sorted(set(self.description_keywords), key=lambda keyword: (-len(keyword), keyword))
+        self.description_re = re.compile('|'.join(re.escape(keyword) for keyword in keywords), re.IGNORECASE) if keywords else None
+        self.digest = hashlib.sha256(json.dumps([self.version, keywords, sorted(self.lldp_capabilities), self.multimac_max_macs, self.uplink_max_shared_macs, self.uplink_shared_ratio]).encode()).hexdigest()
+
+    def match_description(self, description):
+        """
+        Return the first keyword found in an interface description, or None.
+        """
+        if not description or self.description_re is None:
+            return None
+        match = self.description_re.search(str(description))
+        return match.group() if match else None
+
+    def match_capabilities(self, capabilities):
+        """
+        Return the LLDP capabilities that mark the neighbor as network equipment.
+        """
+        return [capability for capability in capabilities if capability.lower() in self.lldp_capabilities]
+
+    def is_multimac(self, mac_count):
+        return mac_count > self.multimac_max_macs
+
+    def __repr__(self):
+        return 'NacRules(version=%r, description_keywords=%r)' % (self.version, self.description_keywords)
+
+
+_loaded = {}
+
+
+def load_rules(path=None):
+    """
+    Load and compile a ruleset file, defaulting to nacrules.json next to this module.
+    Compiled rulesets are cached per path.
+    """
+    path = pathlib.Path(path or DEFAULT_RULES_FILE).resolve()
+    rules = _loaded.get(path)
+    if rules is None:
+        with open(path) as rules_file:
+            data = json.load(rules_file)
+        rules = _loaded[path] = NacRules(
+            data['description_keywords'],
+            data.get('lldp_capabilities', ('router', 'bridge')),
+            data.get('multimac_max_macs', 1),
+            data.get('version', 0),
+            data.get('uplink_max_shared_macs', 1),
+            data.get('uplink_shared_ratio', 0.5),
+        )
+    return rules
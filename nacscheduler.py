@@ -0,0 +1,266 @@
+"""
+    Collection scheduling around the napalm getters.
+
+    The CollectionScheduler limits how hard a run hits the network:
+
+      - a global worker cap (the Nornir thread pool size, --workers or Nornir's num_workers),
+      - a per-site concurrency cap so a single site's TACACS servers and WAN link only
+        see site_limit sessions at a time; hosts are interleaved by site so workers are
+        not all parked on the same busy site,
+      - a timeout per getter, after which the session is closed and the attempt fails; each
+        getter call runs on its own thread, so one that never returns holds no worker,
+      - retries with exponential backoff for transient SSH, connection and auth failures.
+
+    A host that still fails raises CollectionError carrying the attempt count, which ends up
+    in the Failed Devices sheet.
+"""
+
+from collections import defaultdict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import functools
+import random
+import threading
+import time
+
+from naclogging import log
+
+#Seconds each getter may take before the attempt is abandoned.
+DEFAULT_GETTER_TIMEOUTS = {
+    'facts': 60,
+    'interfaces': 120,
+    'lldp_neighbors_detail': 120,
+    'mac_address_table': 300,
+    'config': 300,
+}
+
+
+class GetterTimeout(Exception):
+    pass
+
+
+class CollectionError(Exception):
+    """
+    Final failure of a host after all attempts. error is the last underlying exception.
+    """
+
+    def __init__(self, error, attempts):
+        super().__init__(str(error))
+        self.error = error
+        self.attempts = attempts
+
+
+@functools.lru_cache(maxsize=None)
+def transient_errors():
+    """
+    Errors worth retrying: timeouts, dropped sessions and authentication failures from
+    overloaded AAA servers. Built on first use so importing the scheduler does not load
+    napalm, paramiko and netmiko.
+    """
+    errors = [OSError, EOFError, GetterTimeout]
+    try:
+        from napalm.base.exceptions import ConnectionException
+        errors.append(ConnectionException)
+    except ImportError:
+        pass
+    try:
+        from paramiko.ssh_exception import SSHException
+        errors.append(SSHException)
+    except ImportError:
+        pass
+    try:
+        from netmiko.ssh_exception import NetMikoTimeoutException, NetMikoAuthenticationException
+        errors.extend([NetMikoTimeoutException, NetMikoAuthenticationException])
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def parse_timeouts(values, timeouts=DEFAULT_GETTER_TIMEOUTS):
+    """
+    Apply 'getter=seconds' overrides, e.g. from the command line, to a copy of timeouts.
+    """
+    timeouts = dict(timeouts)
+    for value in values or ():
+        getter, sep, seconds = value.partition('=')
+        if not sep or not getter:
+            raise ValueError("Timeout must be getter=seconds: %s" % value)
+        timeouts[getter] = float(seconds)
+    return timeouts
+
+
+class CollectionScheduler:
+    """
+    Scheduling policy shared by every worker thread of a run.
+    """
+
+    def __init__(self, max_workers=None, site_limit=None, retries=2, backoff=5.0, getter_timeouts=DEFAULT_GETTER_TIMEOUTS, stats=None):
+        self.max_workers = max_workers
+        self.stats = stats
+        self.site_limit = site_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.getter_timeouts = dict(getter_timeouts)
+        self.lock = threading.Lock()
+        self.site_slots = {}
+        #Threads of getters that timed out and were abandoned.
+        self.abandoned = []
+
+    def start(self, num_workers):
+        """
+        Settle the worker cap once the Nornir config is known: --workers when given, else
+        Nornir's num_workers.
+        """
+        self.max_workers = self.max_workers or num_workers
+        return self.max_workers
+
+    def close(self):
+        with self.lock:
+            running = [thread for thread in self.abandoned if thread.is_alive()]
+        if running:
+            log.warning('%d timed out getters are still running', len(running))
+
+    def start_getter(self, method, name):
+        """
+        Call method on a daemon thread of its own and return (future, thread). The caller
+        waits on the future with the getter's timeout; a getter that never returns keeps
+        only its own thread, not a worker of the run.
+        """
+        future = Future()
+
+        def call():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(method())
+            except BaseException as e:
+                future.set_exception(e)
+
+        thread = threading.Thread(target=call, name=name, daemon=True)
+        thread.start()
+        return future, thread
+
+    def site_slot(self, site):
+        with self.lock:
+            if site not in self.site_slots:
+                self.site_slots[site] = threading.BoundedSemaphore(self.site_limit) if self.site_limit else None
+            return self.site_slots[site]
+
+    def order_hosts(self, nornir):
+        """
+        Interleave the inventory round robin by site so consecutive hosts handed to the
+        worker pool belong to different sites.
+        """
+        from nornir.core.inventory import Hosts
+
+        by_site = defaultdict(deque)
+        for name, host in nornir.inventory.hosts.items():
+            by_site[host.get('site')].append((name, host))
+        ordered = Hosts()
+        queues = list(by_site.values())
+        while queues:
+            for queue in queues:
+                name, host = queue.popleft()
+                ordered[name] = host
+            queues = [queue for queue in queues if queue]
+        nornir.inventory.hosts = ordered
+        return nornir
+
+    def call_getter(self, task, getter):
+        """
+        Run one napalm getter on the host's connection, closing the session and raising
+        GetterTimeout if it does not return in time. Connect and getter spans are recorded in
+        stats when set.
+        """
+        start = time.perf_counter()
+        connected = 'napalm' in task.host.connections
+        device = task.host.get_connection('napalm', task.nornir.config)
+        if not connected:
+            duration = time.perf_counter() - start
+            log.debug('Connected', extra={'host': task.host.name, 'phase': 'connect', 'duration': duration})
+            if self.stats is not None:
+                self.stats.record(task.host.name, 'connect', duration)
+        method = getattr(device, 'get_' + getter)
+        future, thread = self.start_getter(method, 'getter-%s-%s' % (task.host.name, getter))
+        try:
+            start = time.perf_counter()
+            result = future.result(timeout=self.getter_timeouts.get(getter))
+            duration = time.perf_counter() - start
+            log.debug('Fetched ' + getter, extra={'host': task.host.name, 'phase': 'getter:' + getter, 'duration': duration})
+            if self.stats is not None:
+                self.stats.record(task.host.name, 'getter:' + getter, duration)
+            return result
+        except FutureTimeoutError:
+            with self.lock:
+                self.abandoned = [running for running in self.abandoned if running.is_alive()]
+                self.abandoned.append(thread)
+            #Closing the session unblocks the stuck getter thread in most drivers.
+            task.host.close_connection('napalm')
+            raise GetterTimeout('%s timed out after %ss' % (getter, self.getter_timeouts.get(getter)))
+
+    def run(self, task, fetch, **kwargs):
+        """
+        Run fetch(task, scheduler, **kwargs) holding the host's site slot, retrying
+        transient failures with exponential backoff and jitter. The slot is released while
+        waiting to retry.
+        """
+        slot = self.site_slot(task.host.get('site'))
+        attempt = 0
+        while True:
+            attempt += 1
+            if slot:
+                slot.acquire()
+            try:
+                return fetch(task, self, **kwargs)
+            except transient_errors() as e:
+                if 'napalm' in task.host.connections:
+                    try:
+                        task.host.close_connection('napalm')
+                    except Exception:
+                        pass
+                if attempt > self.retries:
+                    raise CollectionError(e, attempt)
+                error = e
+            except Exception as e:
+                raise CollectionError(e, attempt)
+            finally:
+                if slot:
+                    slot.release()
+            delay = self.backoff * 2 ** (attempt - 1)
+            delay += random.uniform(0, delay / 2)
+            log.warning('Attempt %d failed, retrying in %.1fs: %s', attempt, delay, error, extra={'host': task.host.name, 'attempts': attempt})
+            time.sleep(delay)
+
+
+def fetch_getters(task, scheduler, getters, cache=None):
+    """
+    Fetch getters from a host through the scheduler. With a naccache.GetterCache facts is
+    fetched first and only the stale getters are requested.
+    """
+    results = {}
+    if cache is not None:
+        facts = scheduler.call_getter(task, 'facts')
+        cached, stale = cache.lookup(task.host.name, getters, facts)
+        for getter in stale:
+            results[getter] = scheduler.call_getter(task, getter)
+        cache.update(task.host.name, facts, results)
+        results.update(cached)
+        results['facts'] = facts
+    else:
+        for getter in getters:
+            results[getter] = scheduler.call_getter(task, getter)
+    return results
+
+
+def scheduled_napalm_get(task, scheduler, getters, cache=None):
+    """
+    Nornir task returning the same result as napalm_get, collected under the scheduler's
+    site limit, timeouts and retry policy. Every getter runs over one session, which is
+    closed as soon as the host is done.
+    """
+    from nornir.core.task import Result
+
+    try:
+        return Result(host=task.host, result=scheduler.run(task, fetch_getters, getters=getters, cache=cache))
+    finally:
+        if 'napalm' in task.host.connections:
+            task.host.close_connection('napalm')
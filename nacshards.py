@@ -0,0 +1,201 @@
+"""
+    Site-sharded discovery: one collector process per inventory site or tag, merged afterwards.
+
+        python nacshards.py run --site herndon --site reston --processes 4 -- --retries 3 --cache cache
+
+    runs collectswitchfacts_hybrid.py once per site (or --tag) with at most --processes shards
+    at a time, so the GIL-bound parsing and output of every shard gets its own core and a shard
+    that fails or crashes does not take the others down. Each shard writes gzip CSV outputs,
+    its metrics and its terminal output to shards/<time>/<shard>/. Arguments after -- are passed
+    to every collector, except the options each shard sets itself (SHARD_OPTIONS), which are
+    rejected. Without --site or --tag there is one shard per site in the inventory.
+
+    The shards are then merged into one NACFACTS-<group>-<time> output (and a NACDIFF output
+    when the shards ran with --diff). A run directory can also be merged again later with:
+
+        python nacshards.py merge shards/2021-03-01-10-00-00 --format xlsx
+
+    Run Stats rows of every host are kept as they are; each shard's ALL summary rows are kept
+    as ALL:<shard>, since percentiles of different shards cannot be combined.
+"""
+
+import argparse
+import csv
+import datetime as dt
+import gzip
+import os
+import pathlib
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from nacoutput import open_sinks, sheet_filename, SHEETS, DIFF_SHEETS, OUTPUT_FORMATS
+
+COLLECTOR = pathlib.Path(__file__).resolve().parent / 'collectswitchfacts_hybrid.py'
+
+#Collector options run_shard() sets for every shard. --site, --tag and --format append, so
+#the same options passed to every collector would add to the shard's own, not replace them.
+SHARD_OPTIONS = ('--site', '--tag', '--group', '--output-dir', '--format', '--metrics')
+
+
+def shard_name(value):
+    """Directory and output group name for a site or tag."""
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in value)
+
+
+def shard_options(collector_args):
+    """
+    The options in collector_args that every shard sets itself, also when given as
+    --option=value or abbreviated as argparse allows.
+    """
+    found = []
+    for arg in collector_args:
+        option = arg.split('=', 1)[0]
+        if len(option) > 2 and option.startswith('--') and any(name.startswith(option) for name in SHARD_OPTIONS):
+            found.append(option)
+    return found
+
+
+def run_shard(kind, value, shard_dir, collector_args):
+    """
+    Run the collector for one site or tag in its own process. Returns (shard, exit status,
+    seconds); the collector's terminal output goes to shard_dir/console.log.
+    """
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    name = shard_dir.name
+    #collector_args never holds SHARD_OPTIONS, main() rejects them.
+    args = [sys.executable, str(COLLECTOR)] + collector_args + [
+        '--' + kind, value,
+        '--group', name,
+        '--output-dir', str(shard_dir),
+        '--format', 'csv',
+        '--metrics', str(shard_dir / 'nacdiscovery.prom'),
+    ]
+    start = time.perf_counter()
+    with open(shard_dir / 'console.log', 'w') as console:
+        status = subprocess.call(args, stdout=console, stderr=subprocess.STDOUT)
+    return name, status, time.perf_counter() - start
+
+
+def run_shards(shards, run_dir, processes, collector_args):
+    """
+    Run every (kind, value) shard with at most processes collectors at a time and return
+    {shard: (exit status, seconds)}.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(run_shard, kind, value, run_dir / shard_name(value), collector_args) for kind, value in shards]
+        for future in as_completed(futures):
+            name, status, seconds = future.result()
+            results[name] = (status, seconds)
+            print(f"Shard {name} finished in {seconds:.1f}s" + (f" with exit status {status}" if status else ""))
+    return results
+
+
+def read_sheet(directory, sheet):
+    """Rows of a sheet written by a CsvSink to directory, without the header row."""
+    path = directory / (sheet_filename(sheet) + '.csv.gz')
+    if not path.exists():
+        return
+    with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        yield from reader
+
+
+def merge_outputs(shard_outputs, output_name, formats, sheets):
+    """
+    Append the rows of every (shard, CSV output directory) to a single output per sheet.
+    Returns the number of rows written per sheet.
+    """
+    output = open_sinks(output_name, formats, sheets)
+    counts = dict.fromkeys(sheets, 0)
+    try:
+        for shard, directory in shard_outputs:
+            for sheet in sheets:
+                for row in read_sheet(directory, sheet):
+                    if sheet == 'Run Stats' and row[0] == 'ALL':
+                        row[0] = 'ALL:' + shard
+                    output.append(sheet, row)
+                    counts[sheet] += 1
+            output.flush()
+    finally:
+        for sink, e in output.close():
+            print(f"Failed to save {type(sink).__name__} output {output_name}: {e}")
+    return counts
+
+
+def latest_output(shard_dir, prefix):
+    """The newest NACFACTS-*/NACDIFF-* CSV output directory of a shard, or None."""
+    outputs = sorted(path for path in shard_dir.glob(prefix + '-*') if path.is_dir())
+    return outputs[-1] if outputs else None
+
+
+def merge_run(run_dir, output_name, formats, diff_name=None):
+    """
+    Merge the shard outputs in run_dir into output_name and, when the shards wrote change
+    outputs, diff_name. Returns the row counts per sheet of the discovery output.
+    """
+    shard_dirs = sorted(path for path in pathlib.Path(run_dir).iterdir() if path.is_dir())
+    facts = [(path.name, latest_output(path, 'NACFACTS')) for path in shard_dirs]
+    counts = merge_outputs([(shard, directory) for shard, directory in facts if directory], output_name, formats, SHEETS)
+    changes = [(path.name, latest_output(path, 'NACDIFF')) for path in shard_dirs]
+    changes = [(shard, directory) for shard, directory in changes if directory]
+    if changes and diff_name:
+        merge_outputs(changes, diff_name, formats, DIFF_SHEETS)
+    return counts
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description='Run discovery sharded by site or tag in separate processes and merge the outputs.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run = subparsers.add_parser('run', help='collect every shard in its own process, then merge', epilog='Arguments after -- are passed to every collector.')
+    run.add_argument('--site', dest='sites', action='append', default=[], help='one shard for this inventory site, repeat for several')
+    run.add_argument('--tag', dest='tags', action='append', default=[], help='one shard for this inventory tag, repeat for several')
+    run.add_argument('--processes', type=int, default=os.cpu_count(), help='shards collected at the same time (default: CPU count)')
+    run.add_argument('--shards', metavar='DIR', default='shards', help='directory for the shard outputs (default: shards)')
+    merge = subparsers.add_parser('merge', help='merge the shard outputs of an earlier run directory')
+    merge.add_argument('run_dir', help='run directory, e.g. shards/<time>')
+    for subparser in (run, merge):
+        subparser.add_argument('--group', default='Sharded', help='name used in the merged output names (default: Sharded)')
+        subparser.add_argument('--format', dest='formats', action='append', choices=OUTPUT_FORMATS, help='merged output format, repeat for several (default: xlsx and csv)')
+    args, collector_args = parser.parse_known_args(argv)
+    if collector_args and args.command != 'run':
+        parser.error('unrecognized arguments: %s' % ' '.join(collector_args))
+    if collector_args[:1] == ['--']:
+        collector_args = collector_args[1:]
+    owned = shard_options(collector_args)
+    if owned:
+        parser.error('options set per shard cannot be passed to the collectors: %s' % ' '.join(owned))
+    formats = args.formats or ('xlsx', 'csv')
+
+    current_time = dt.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    status = 0
+    if args.command == 'run':
+        shards = [('site', site) for site in args.sites] + [('tag', tag) for tag in args.tags]
+        if not shards:
+            from nacinventory import inventory_sites
+            shards = [('site', site) for site in inventory_sites()]
+        if not shards:
+            parser.error('no --site or --tag given and no host in the inventory has a site')
+        run_dir = pathlib.Path(args.shards) / current_time
+        print(f"Collecting {len(shards)} shards with up to {args.processes} processes into {run_dir}")
+        start = time.perf_counter()
+        results = run_shards(shards, run_dir, args.processes, collector_args)
+        failed = sorted(name for name, (code, _) in results.items() if code)
+        print(f"Collected {len(shards)} shards in {time.perf_counter() - start:.1f}s")
+        if failed:
+            print('!Failed shards, see their console.log:', ', '.join(failed))
+            status = 1
+    else:
+        run_dir = pathlib.Path(args.run_dir)
+
+    output_name = "NACFACTS-" + args.group + "-" + current_time
+    counts = merge_run(run_dir, output_name, formats, "NACDIFF-" + args.group + "-" + current_time)
+    print(f"Merged {counts['Facts']} hosts and {counts['Failed Devices']} failed devices into {output_name}")
+    return status
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
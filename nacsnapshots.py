@@ -0,0 +1,59 @@
+"""
+    Per-host snapshots of raw napalm getter results.
+
+    In capture mode the collector writes each host's raw getter results to
+    <directory>/<host>.json.gz as soon as they return. Replay mode reads the snapshots back
+    and runs the same analysis and output without connecting to any device, so rules can be
+    re-tuned offline and captures can be used as fixtures.
+"""
+
+import datetime as dt
+import gzip
+import json
+import pathlib
+
+SNAPSHOT_SUFFIX = '.json.gz'
+SNAPSHOT_FORMAT = 1
+
+
+def snapshot_path(directory, host):
+    return pathlib.Path(directory) / (host + SNAPSHOT_SUFFIX)
+
+
+def save_snapshot(directory, host, hostname, getters_result=None, error=None, attempts=1, platform=None):
+    """
+    Write a host's raw getter results, or the error it failed with, to a compressed snapshot.
+    platform is the host's Nornir platform, which selects the normalizer on replay.
+    """
+    pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'host': host,
+        'hostname': hostname,
+        'platform': platform,
+        'captured': dt.datetime.now().isoformat(timespec='seconds'),
+        'failed': error is not None,
+        'error': None if error is None else str(error),
+        'attempts': attempts,
+        'getters': getters_result,
+    }
+    path = snapshot_path(directory, host)
+    #Write to a temporary name first so an interrupted capture never leaves a truncated snapshot.
+    tmp_path = path.with_name(path.name + '.tmp')
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        json.dump(snapshot, f, default=str)
+    tmp_path.replace(path)
+    return path
+
+
+def load_snapshot(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_snapshots(directory):
+    """
+    Yield every snapshot in a capture directory in host name order.
+    """
+    for path in sorted(pathlib.Path(directory).glob('*' + SNAPSHOT_SUFFIX)):
+        yield load_snapshot(path)
@@ -0,0 +1,125 @@
+"""
+    Persistent per-host discovery state for change-detection runs.
+
+    process_host records a compact HostState for every switch: the MACs learned per port,
+    the ports flagged as multi-MAC, the LLDP neighbor per port and the exclusion reasons per
+    port. Ports whose MACs were only sampled (--mac-sample) are listed as untracked and get
+    no MAC-level changes. The StateStore keeps the last state of each host in <directory>/<host>.json and
+    diff_states turns two states into rows for the Changes sheet. Hosts whose state digest
+    is unchanged since the previous run produce no rows at all.
+"""
+
+from collections import defaultdict
+import hashlib
+import json
+import pathlib
+
+STATE_FORMAT = 1
+
+
+class HostState:
+    """
+    The parts of a host's discovery results that are compared between runs.
+    """
+    __slots__ = ('macs', 'untracked', 'multimac', 'lldp', 'exclusions')
+
+    def __init__(self):
+        self.macs = defaultdict(set)
+        #Ports with more MACs than the sample -> MAC count. Their MACs are not recorded.
+        self.untracked = {}
+        self.multimac = set()
+        self.lldp = {}
+        self.exclusions = defaultdict(list)
+
+    def as_dict(self):
+        state = {
+            'macs': {port: sorted(macs) for port, macs in sorted(self.macs.items())},
+            'multimac': sorted(self.multimac),
+            'lldp': dict(sorted(self.lldp.items())),
+            'exclusions': {port: sorted(reasons) for port, reasons in sorted(self.exclusions.items())},
+        }
+        #Only present when sampling left ports untracked, so the digests of other hosts stay the same.
+        if self.untracked:
+            state['untracked'] = dict(sorted(self.untracked.items()))
+        return state
+
+
+def state_digest(state):
+    return hashlib.sha256(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class StateStore:
+    """
+    Last known state of every host, one JSON file per host. Each file is only read and
+    written by the thread processing that host.
+    """
+
+    def __init__(self, directory):
+        self.path = pathlib.Path(directory)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def host_path(self, host):
+        return self.path / (host + '.json')
+
+    def load(self, host):
+        try:
+            with open(self.host_path(host)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('format') != STATE_FORMAT:
+            return None
+        return entry
+
+    def save(self, host, state, digest):
+        entry = {'format': STATE_FORMAT, 'host': host, 'digest': digest, 'state': state}
+        path = self.host_path(host)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f, sort_keys=True)
+        tmp_path.replace(path)
+
+
+def diff_states(host, old, new):
+    """
+    Return Changes sheet rows [Switch, Interface, Change, Detail] describing how the state
+    dict new differs from old. MACs are not compared on ports untracked in either state.
+    """
+    rows = []
+    untracked = set(old.get('untracked', ())) | set(new.get('untracked', ()))
+    for port in sorted((set(old['macs']) | set(new['macs'])) - untracked):
+        old_macs = set(old['macs'].get(port, ()))
+        new_macs = set(new['macs'].get(port, ()))
+        for mac in sorted(new_macs - old_macs):
+            rows.append([host, port, 'MAC added', mac])
+        for mac in sorted(old_macs - new_macs):
+            rows.append([host, port, 'MAC removed', mac])
+
+    old_multimac = set(old['multimac'])
+    new_multimac = set(new['multimac'])
+    new_untracked = new.get('untracked', {})
+    for port in sorted(new_multimac - old_multimac):
+        rows.append([host, port, 'Multi MAC flagged', new_untracked.get(port, len(new['macs'].get(port, ())))])
+    for port in sorted(old_multimac - new_multimac):
+        rows.append([host, port, 'Multi MAC cleared', new_untracked.get(port, len(new['macs'].get(port, ())))])
+
+    for port in sorted(set(old['lldp']) | set(new['lldp'])):
+        old_neighbor = old['lldp'].get(port)
+        new_neighbor = new['lldp'].get(port)
+        if old_neighbor == new_neighbor:
+            continue
+        if old_neighbor is None:
+            rows.append([host, port, 'LLDP neighbor added', new_neighbor])
+        elif new_neighbor is None:
+            rows.append([host, port, 'LLDP neighbor removed', old_neighbor])
+        else:
+            rows.append([host, port, 'LLDP neighbor changed', old_neighbor + ' -> ' + new_neighbor])
+
+    for port in sorted(set(old['exclusions']) | set(new['exclusions'])):
+        old_reasons = set(old['exclusions'].get(port, ()))
+        new_reasons = set(new['exclusions'].get(port, ()))
+        for reason in sorted(new_reasons - old_reasons):
+            rows.append([host, port, 'Exclusion added', reason])
+        for reason in sorted(old_reasons - new_reasons):
+            rows.append([host, port, 'Exclusion removed', reason])
+    return rows
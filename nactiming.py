@@ -0,0 +1,146 @@
+"""
+    Per-host, per-phase timing for discovery runs.
+
+    Spans are recorded for every host and phase: connect, each getter (getter:<name>),
+    mac, facts, lldp, interfaces, exclusions and output. At the end of a run they are written
+    to the Run Stats sheet, one row per host and phase followed by p50/p95/max summaries per
+    model and OS version, and to a Prometheus textfile-format metrics file.
+"""
+
+from collections import defaultdict
+import math
+import pathlib
+import threading
+import time
+
+from naclogging import log
+
+UNKNOWN = 'unknown'
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    rank = max(1, int(math.ceil(pct / 100.0 * len(values))))
+    return values[rank - 1]
+
+
+class RunStats:
+    """
+    Thread-safe collection of timing spans for one run.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.spans = defaultdict(lambda: defaultdict(list))
+        self.labels = {}
+        self.run_phases = {}
+        self.started = time.perf_counter()
+
+    def record(self, host, phase, seconds):
+        with self.lock:
+            self.spans[host][phase].append(seconds)
+
+    def record_run(self, phase, seconds):
+        """Record a run-wide phase such as collection or saving the outputs."""
+        with self.lock:
+            self.run_phases[phase] = seconds
+
+    def set_labels(self, host, model, os_version):
+        with self.lock:
+            self.labels[host] = (str(model or UNKNOWN), str(os_version or UNKNOWN))
+
+    def host_rows(self):
+        """Run Stats rows for every host and phase."""
+        rows = []
+        for host in sorted(self.spans):
+            model, os_version = self.labels.get(host, (UNKNOWN, UNKNOWN))
+            for phase, values in sorted(self.spans[host].items()):
+                rows.append(summary_row(host, model, os_version, phase, values))
+        return rows
+
+    def grouped(self):
+        """Span durations of every phase grouped by (model, OS version, phase)."""
+        groups = defaultdict(list)
+        for host, phases in self.spans.items():
+            model, os_version = self.labels.get(host, (UNKNOWN, UNKNOWN))
+            for phase, values in phases.items():
+                groups[(model, os_version, phase)].extend(values)
+        return groups
+
+    def summary_rows(self):
+        """Run Stats rows with p50/p95/max per model, OS version and phase over all hosts."""
+        return [summary_row('ALL', model, os_version, phase, values) for (model, os_version, phase), values in sorted(self.grouped().items())]
+
+    def write_prometheus(self, path, processed_hosts=0, failed_hosts=0):
+        """
+        Write the summaries in Prometheus textfile format. The file is replaced atomically
+        so the node exporter textfile collector never reads a partial file.
+        """
+        lines = [
+            '# HELP nacdiscovery_phase_seconds Discovery phase duration per host by switch model and OS version.',
+            '# TYPE nacdiscovery_phase_seconds summary',
+        ]
+        for (model, os_version, phase), values in sorted(self.grouped().items()):
+            values = sorted(values)
+            labels = 'model="%s",os_version="%s",phase="%s"' % (_escape(model), _escape(os_version), _escape(phase))
+            for quantile, pct in (('0.5', 50), ('0.95', 95), ('1', 100)):
+                lines.append('nacdiscovery_phase_seconds{%s,quantile="%s"} %.6f' % (labels, quantile, percentile(values, pct)))
+            lines.append('nacdiscovery_phase_seconds_sum{%s} %.6f' % (labels, sum(values)))
+            lines.append('nacdiscovery_phase_seconds_count{%s} %d' % (labels, len(values)))
+        lines += [
+            '# HELP nacdiscovery_run_phase_seconds Duration of run-wide phases of the last discovery run.',
+            '# TYPE nacdiscovery_run_phase_seconds gauge',
+        ]
+        for phase, seconds in sorted(self.run_phases.items()):
+            lines.append('nacdiscovery_run_phase_seconds{phase="%s"} %.6f' % (_escape(phase), seconds))
+        lines += [
+            '# HELP nacdiscovery_run_seconds Wall clock duration of the last discovery run.',
+            '# TYPE nacdiscovery_run_seconds gauge',
+            'nacdiscovery_run_seconds %.6f' % (time.perf_counter() - self.started),
+            '# HELP nacdiscovery_hosts Hosts in the last discovery run by outcome.',
+            '# TYPE nacdiscovery_hosts gauge',
+            'nacdiscovery_hosts{outcome="processed"} %d' % processed_hosts,
+            'nacdiscovery_hosts{outcome="failed"} %d' % failed_hosts,
+            '# HELP nacdiscovery_last_run_timestamp_seconds Unix time the last discovery run finished.',
+            '# TYPE nacdiscovery_last_run_timestamp_seconds gauge',
+            'nacdiscovery_last_run_timestamp_seconds %d' % time.time(),
+        ]
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text('\n'.join(lines) + '\n')
+        tmp_path.replace(path)
+
+
+def summary_row(host, model, os_version, phase, values):
+    values = sorted(values)
+    return [host, model, os_version, phase, len(values), round(sum(values), 6), round(percentile(values, 50), 6), round(percentile(values, 95), 6), round(values[-1], 6)]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class HostTimer:
+    """
+    Lap timer for the sequential processing phases of one host: each lap(phase) records the
+    time since the previous lap, logs it as a DEBUG event and returns it. Nothing is
+    recorded when stats is None.
+    """
+    __slots__ = ('stats', 'host', 'last')
+
+    def __init__(self, stats, host):
+        self.stats = stats
+        self.host = host
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        duration = now - self.last
+        if self.stats is not None:
+            self.stats.record(self.host, phase, duration)
+        log.debug('Processed ' + phase, extra={'host': self.host, 'phase': phase, 'duration': duration})
+        self.last = now
+        return duration
@@ -0,0 +1,237 @@
+"""
+    Synthetic napalm driver for running and benchmarking discovery without real switches.
+
+    Registered through napalm's community driver naming (napalm_<platform>), so a Nornir
+    host with platform 'fakeswitch' uses it. Getter output is deterministic per hostname
+    and shaped like the Cisco IOS driver's, or like napalm-procurve's with personality
+    procurve. Behaviour is set with napalm optional_args,
+    e.g. in a Nornir group:
+
+        fakeswitch:
+          platform: fakeswitch
+          connection_options:
+            napalm:
+              extras:
+                optional_args: {ports: 48, macs_per_port: 2, latency: 0.05, failure_rate: 0.01}
+
+    ports             access ports per switch (default 48)
+    macs_per_port     MACs learned on each multi-MAC port (default 1)
+    multimac_ratio    share of ports with macs_per_port MACs, the others have one (default 0.1)
+    uplinks           ports with an LLDP switch/router neighbor and an 'UPLINK' description (default 2)
+    latency           seconds each getter sleeps, to mimic device round trips (default 0)
+    failure_rate      share of hosts that always refuse connections (default 0)
+    transient_rate    chance that any single connection attempt fails (default 0)
+    seed              changes the generated data for every host (default 0)
+    personality       'ios' or 'procurve': HP Procurve port names (1-48), vendor, MAC and VLAN
+                      notation, LLDP neighbor dicts and capability strings (default ios).
+                      The same switch data is generated either way and get_config always
+                      returns an IOS configuration.
+"""
+
+import hashlib
+import random
+import time
+
+import napalm.base.base as napalm_base
+from napalm.base.exceptions import ConnectionException
+
+#Organizationally unique identifiers of vendors commonly seen on access ports.
+VENDOR_OUIS = (
+    '00:50:56',  # VMware
+    '00:1B:21',  # Intel
+    '3C:D9:2B',  # Hewlett Packard
+    'F8:BC:12',  # Dell
+    '00:0B:82',  # Grandstream
+    '00:04:F2',  # Polycom
+    'AC:1F:6B',  # Super Micro
+    '00:1E:C9',  # Dell
+)
+
+NEIGHBOR_OUI = '00:00:0C'  # Cisco
+
+MODELS = (('C9300-48P', '16.12.4'), ('C9300-48P', '17.3.4'), ('WS-C3850-48P', '16.6.8'), ('C9500-24Y4C', '16.12.4'))
+PROCURVE_MODELS = (('2920-48G-POE+ (J9729A)', 'WB.16.10.0012'), ('2930F-48G-PoE+ (JL256A)', 'WC.16.10.0012'), ('5406Rzl2 (J9850A)', 'KB.16.10.0012'))
+
+PERSONALITIES = ('ios', 'procurve')
+
+
+def host_seed(hostname, seed=0):
+    return int(hashlib.sha256(('%s:%s' % (hostname, seed)).encode('utf-8')).hexdigest()[:16], 16)
+
+
+class FakeSwitchDriver(napalm_base.NetworkDriver):
+    """
+    NetworkDriver generating deterministic facts, interfaces, LLDP neighbors, MAC tables
+    and running configs for a synthetic access switch.
+    """
+
+    def __init__(self, hostname, username, password, timeout=60, optional_args=None):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        optional_args = optional_args or {}
+        self.ports = int(optional_args.get('ports', 48))
+        self.macs_per_port = int(optional_args.get('macs_per_port', 1))
+        self.multimac_ratio = float(optional_args.get('multimac_ratio', 0.1))
+        self.uplinks = min(int(optional_args.get('uplinks', 2)), self.ports)
+        self.latency = float(optional_args.get('latency', 0))
+        self.failure_rate = float(optional_args.get('failure_rate', 0))
+        self.transient_rate = float(optional_args.get('transient_rate', 0))
+        self.seed = host_seed(hostname, optional_args.get('seed', 0))
+        self.personality = optional_args.get('personality', 'ios')
+        if self.personality not in PERSONALITIES:
+            raise ValueError('Unknown fakeswitch personality: %s' % self.personality)
+        self.procurve = self.personality == 'procurve'
+        self.is_open = False
+
+    def open(self):
+        rng = random.Random(self.seed)
+        if rng.random() < self.failure_rate:
+            raise ConnectionException('Cannot connect to %s: connection refused' % self.hostname)
+        if self.transient_rate and random.random() < self.transient_rate:
+            raise ConnectionException('Cannot connect to %s: authentication timed out' % self.hostname)
+        self._wait()
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def is_alive(self):
+        return {'is_alive': self.is_open}
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _port_name(self, port, short=False):
+        if self.procurve:
+            return str(port)
+        return ('Gi1/0/%d' if short else 'GigabitEthernet1/0/%d') % port
+
+    def _port_names(self):
+        return [self._port_name(port) for port in range(1, self.ports + 1)]
+
+    def _mac(self, mac):
+        """Procurve shows MACs as 001b21-aabbcc."""
+        if not self.procurve:
+            return mac
+        digits = mac.replace(':', '').lower()
+        return digits[:6] + '-' + digits[6:]
+
+    def _uplink_ports(self):
+        #The last ports of the switch are the uplinks.
+        return set(range(self.ports - self.uplinks + 1, self.ports + 1))
+
+    def get_facts(self):
+        self._wait()
+        rng = random.Random(self.seed)
+        model, os_version = MODELS[rng.randrange(len(MODELS))]
+        if self.procurve:
+            model, os_version = PROCURVE_MODELS[rng.randrange(len(PROCURVE_MODELS))]
+        return {
+            'hostname': self.hostname,
+            'fqdn': self.hostname,
+            'vendor': 'HP' if self.procurve else 'Cisco',
+            'model': model,
+            'os_version': os_version,
+            'serial_number': 'FAKE%08X' % (self.seed & 0xFFFFFFFF),
+            'uptime': 86400 + rng.randrange(86400 * 30),
+            'interface_list': self._port_names(),
+        }
+
+    def get_interfaces(self):
+        self._wait()
+        rng = random.Random(self.seed + 1)
+        uplinks = self._uplink_ports()
+        interfaces = {}
+        for port, name in enumerate(self._port_names(), 1):
+            enabled = rng.random() > 0.05
+            interfaces[name] = {
+                'is_enabled': enabled,
+                'is_up': enabled and rng.random() > 0.3,
+                'description': 'UPLINK to distribution' if port in uplinks else ('user port %d' % port if rng.random() > 0.5 else ''),
+                'last_flapped': -1.0,
+                'speed': 1000,
+                'mtu': 1500,
+                'mac_address': '%s:%02X:%02X:%02X' % (NEIGHBOR_OUI, (self.seed >> 8) & 0xFF, self.seed & 0xFF, port),
+            }
+        return interfaces
+
+    def get_lldp_neighbors_detail(self, interface=''):
+        self._wait()
+        neighbors = {}
+        for port in sorted(self._uplink_ports()):
+            chassis_id = '%s:%02X:%02X:00' % (NEIGHBOR_OUI, (self.seed >> 16) & 0xFF, port & 0xFF)
+            neighbor = {
+                'parent_interface': '',
+                'remote_port': 'TenGigabitEthernet1/1/%d' % port,
+                'remote_port_description': 'downlink %s' % self.hostname,
+                'remote_chassis_id': chassis_id,
+                'remote_system_name': 'dist-%s' % self.hostname,
+                'remote_system_description': 'Cisco IOS Software, Catalyst L3 Switch Software',
+                'remote_system_capab': ['bridge', 'router'],
+                'remote_system_enable_capab': ['bridge', 'router'],
+            }
+            if self.procurve:
+                #One neighbor dict per port, chassis IDs as '00 00 0c 12 34 00' and capability strings.
+                neighbor.update(remote_chassis_id=chassis_id.replace(':', ' ').lower(), remote_system_capab='bridge, router', remote_system_enable_capab='bridge, router')
+                neighbors[self._port_name(port)] = neighbor
+            else:
+                neighbors[self._port_name(port)] = [neighbor]
+        return neighbors
+
+    def get_mac_address_table(self):
+        self._wait()
+        rng = random.Random(self.seed + 2)
+        uplinks = self._uplink_ports()
+        table = []
+        for port in range(1, self.ports + 1):
+            if port in uplinks:
+                continue
+            count = self.macs_per_port if rng.random() < self.multimac_ratio else 1
+            for _ in range(count):
+                oui = VENDOR_OUIS[rng.randrange(len(VENDOR_OUIS))]
+                table.append({
+                    'mac': self._mac('%s:%02X:%02X:%02X' % (oui, rng.randrange(256), rng.randrange(256), rng.randrange(256))),
+                    'interface': self._port_name(port, short=True),
+                    'vlan': str(10 + port % 4) if self.procurve else 10 + port % 4,
+                    'static': False,
+                    'active': True,
+                    'moves': 0,
+                    'last_move': 0.0,
+                })
+        #CPU entries are not bound to a port.
+        table.append({'mac': self._mac('%s:FF:FF:01' % NEIGHBOR_OUI), 'interface': '', 'vlan': 1, 'static': True, 'active': True, 'moves': 0, 'last_move': 0.0})
+        return table
+
+    def get_config(self, retrieve='all', full=False, sanitized=False):
+        self._wait()
+        running = generate_config(self.hostname, self.ports, self.uplinks, self.seed)
+        return {
+            'running': running if retrieve in ('all', 'running') else '',
+            'startup': running if retrieve in ('all', 'startup') else '',
+            'candidate': '',
+        }
+
+
+def generate_config(hostname, ports=48, uplinks=2, seed=0):
+    """
+    Return an IOS style running configuration with access, shutdown and uplink interfaces,
+    as parsed by iosnacconfparser.
+    """
+    rng = random.Random(seed)
+    lines = ['!', 'version 16.12', 'hostname %s' % hostname, '!']
+    for port in range(1, ports + 1):
+        lines.append('interface GigabitEthernet1/0/%d' % port)
+        if port > ports - uplinks:
+            lines += [' description UPLINK to distribution', ' switchport mode trunk']
+        else:
+            if rng.random() > 0.5:
+                lines.append(' description user port %d' % port)
+            lines += [' switchport access vlan %d' % (10 + port % 4), ' switchport mode access', ' spanning-tree portfast']
+            if rng.random() < 0.05:
+                lines.append(' shutdown')
+        lines.append('!')
+    lines += ['interface Vlan1', ' no ip address', ' shutdown', '!', 'line vty 0 4', ' transport input ssh', '!', 'end']
+    return '\n'.join(lines) + '\n'
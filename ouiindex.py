@@ -0,0 +1,154 @@
+"""
+    Process-wide MAC vendor (OUI) index.
+
+    Loads the IEEE vendor list used by mac_vendor_lookup once per process into integer keyed
+    prefix tables for 24-bit (MA-L), 28-bit (MA-M) and 36-bit (MA-S) assignments. Longer
+    prefixes are only probed for the OUIs split into MA-M or MA-S blocks, so most lookups are
+    a single dictionary probe, and lookup_many resolves each distinct address of a host once.
+    Nothing is cached per MAC, so memory does not grow with the number of addresses seen.
+
+    The mac_vendor_lookup cache only holds MA-L assignments. MA-M and MA-S blocks come from
+    the IEEE registry CSVs (mam.csv, oui36.csv), given to the collector with --oui-file.
+"""
+
+import csv
+import threading
+
+UNKNOWN_VENDOR = "Unknown"
+
+#Prefix length in hex digits mapped to the number of low bits dropped from a 48-bit MAC.
+PREFIX_SHIFTS = {9: 12, 7: 20, 6: 24}
+
+_MAC_SEPARATORS = str.maketrans('', '', ':-. ')
+
+
+def mac_to_int(mac):
+    """
+    Convert a MAC address in any of the common notations (aa:bb:.., aa-bb-.., aabb.ccdd.eeff)
+    to a 48-bit integer. Returns None for values that are not MAC addresses, such as LLDP
+    chassis IDs advertised as hostnames or IP addresses.
+    """
+    if not mac:
+        return None
+    digits = str(mac).translate(_MAC_SEPARATORS)
+    if len(digits) != 12:
+        return None
+    try:
+        return int(digits, 16)
+    except ValueError:
+        return None
+
+
+class OuiIndex:
+    """
+    Prefix hash of vendor assignments with batched lookups.
+    """
+
+    def __init__(self):
+        self.prefixes = {shift: {} for shift in PREFIX_SHIFTS.values()}
+        #24-bit OUIs split into 28 or 36-bit assignments, the only ones with longer prefixes to probe.
+        self.split_ouis = set()
+
+    def load(self, path):
+        """
+        Load a vendor file: the mac_vendor_lookup cache with one 'PREFIX:Vendor' line per
+        assignment, or an IEEE registry CSV (oui.csv, mam.csv, oui36.csv) with Assignment and
+        Organization Name columns. Returns the number of assignments read.
+        """
+        count = 0
+        if str(path).lower().endswith('.csv'):
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                for row in csv.DictReader(f):
+                    count += self.add(str(row.get('Assignment') or '').strip(), str(row.get('Organization Name') or '').strip())
+            return count
+        with open(path, 'rb') as vendor_file:
+            for raw_line in vendor_file:
+                prefix, sep, vendor = raw_line.partition(b':')
+                if sep:
+                    count += self.add(prefix, vendor.strip().decode('utf8', 'replace'))
+        return count
+
+    def add(self, prefix, vendor):
+        """
+        Add one assignment. The prefix length (6, 7 or 9 hex digits) selects the table.
+        Returns False for prefixes that are not assignments.
+        """
+        shift = PREFIX_SHIFTS.get(len(prefix))
+        if shift is None:
+            return False
+        try:
+            key = int(prefix, 16)
+        except ValueError:
+            return False
+        self.prefixes[shift][key] = vendor
+        if shift < 24:
+            self.split_ouis.add(key >> (24 - shift))
+        return True
+
+    def lookup_int(self, mac_int):
+        """
+        Return the vendor for a 48-bit MAC integer, longest assignment first.
+        """
+        prefixes = self.prefixes
+        if mac_int >> 24 in self.split_ouis:
+            vendor = prefixes[12].get(mac_int >> 12)
+            if vendor is None:
+                vendor = prefixes[20].get(mac_int >> 20)
+            if vendor is not None:
+                return vendor
+        return prefixes[24].get(mac_int >> 24, UNKNOWN_VENDOR)
+
+    def lookup(self, mac):
+        """
+        Return the vendor for a single MAC address or chassis ID, or UNKNOWN_VENDOR.
+        """
+        mac_int = mac_to_int(mac)
+        if mac_int is None:
+            return UNKNOWN_VENDOR
+        return self.lookup_int(mac_int)
+
+    def lookup_many(self, macs):
+        """
+        Resolve every distinct MAC address or chassis ID in macs in one call.
+        Returns a dictionary of the original values to their vendor.
+        """
+        lookup_int = self.lookup_int
+        results = {}
+        for mac in set(macs):
+            mac_int = mac_to_int(mac)
+            results[mac] = UNKNOWN_VENDOR if mac_int is None else lookup_int(mac_int)
+        return results
+
+    def __len__(self):
+        return sum(len(table) for table in self.prefixes.values())
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_oui_index(extra_paths=()):
+    """
+    Return the process-wide OuiIndex, loading it on first use. The IEEE list is read from
+    the mac_vendor_lookup cache and downloaded there first if it has never been fetched.
+    extra_paths are vendor files loaded on top of it (see OuiIndex.load), only read when the
+    index is first loaded.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from mac_vendor_lookup import MacLookup
+
+                mac_lookup = MacLookup()
+                vendors_path = mac_lookup.find_vendors_list()
+                if not vendors_path:
+                    mac_lookup.update_vendors()
+                    vendors_path = mac_lookup.find_vendors_list()
+                index = OuiIndex()
+                if vendors_path:
+                    index.load(vendors_path)
+                for path in extra_paths:
+                    index.load(path)
+                _index = index
+    return _index
@@ -0,0 +1,45 @@
+"""
+    Shared fixtures for the test suite. The modules live at the repository root, so it is
+    put on sys.path for the tests.
+"""
+
+import pathlib
+import sys
+
+import pytest
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+if str(REPO) not in sys.path:
+    sys.path.insert(0, str(REPO))
+
+
+class ListOutput:
+    """Output sink keeping the rows of every sheet in lists, in place of nacoutput.OutputSinks."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def append(self, sheet, row):
+        self.rows.setdefault(sheet, []).append(row)
+
+    def flush(self):
+        pass
+
+    def sheet(self, sheet):
+        return self.rows.get(sheet, [])
+
+
+@pytest.fixture
+def output():
+    return ListOutput()
+
+
+@pytest.fixture
+def oui_index(monkeypatch):
+    """An empty OUI index, so tests never load or download the IEEE vendor list."""
+    import collectswitchfacts_hybrid
+    from ouiindex import OuiIndex
+
+    index = OuiIndex()
+    monkeypatch.setattr(collectswitchfacts_hybrid, 'get_oui_index', lambda *args: index)
+    return index
@@ -0,0 +1,67 @@
+"""
+    GetterCache: per-getter TTLs and invalidation by the facts validator.
+"""
+
+import pytest
+
+from naccache import DEFAULT_TTLS, GetterCache, parse_ttls
+
+GETTERS = ['facts', 'interfaces', 'lldp_neighbors_detail', 'mac_address_table']
+FACTS = {'hostname': 'sw1', 'os_version': '17.9.4', 'uptime': 1000}
+INTERFACES = {'GigabitEthernet1/0/1': {'is_enabled': True, 'is_up': True, 'description': '', 'speed': 1000}}
+RESULTS = {'facts': FACTS, 'interfaces': INTERFACES, 'lldp_neighbors_detail': {}, 'mac_address_table': []}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = GetterCache(tmp_path / 'cache', {'facts': 0, 'interfaces': 3600, 'lldp_neighbors_detail': 0, 'mac_address_table': 0})
+    cache.update('sw1', FACTS, RESULTS, now=100)
+    return cache
+
+
+def test_only_getters_with_a_ttl_are_cached(cache):
+    assert cache.lookup('sw1', GETTERS, FACTS, now=200) == ({'interfaces': INTERFACES}, ['lldp_neighbors_detail', 'mac_address_table'])
+    assert sorted(cache.load('sw1')['getters']) == ['interfaces']
+
+
+def test_expired_ttl(cache):
+    assert cache.lookup('sw1', GETTERS, FACTS, now=100 + 3599)[0] == {'interfaces': INTERFACES}
+    assert cache.lookup('sw1', GETTERS, FACTS, now=100 + 3600) == ({}, ['interfaces', 'lldp_neighbors_detail', 'mac_address_table'])
+
+
+def test_unknown_host(cache):
+    assert cache.lookup('sw2', GETTERS, FACTS, now=200) == ({}, ['interfaces', 'lldp_neighbors_detail', 'mac_address_table'])
+
+
+@pytest.mark.parametrize('facts, valid', [
+    (dict(FACTS, uptime=5000), True),
+    (dict(FACTS, uptime=-1), True),
+    (dict(FACTS, uptime=10), False),
+    (dict(FACTS, os_version='17.12.1'), False),
+], ids=['later-uptime', 'unknown-uptime', 'reloaded', 'upgraded'])
+def test_facts_validate_the_cache(cache, facts, valid):
+    assert bool(cache.lookup('sw1', GETTERS, facts, now=200)[0]) == valid
+
+
+def test_upgrade_drops_cached_getters(cache):
+    upgraded = dict(FACTS, os_version='17.12.1')
+    cache.update('sw1', upgraded, {'facts': upgraded, 'mac_address_table': []}, now=200)
+    entry = cache.load('sw1')
+    assert (entry['os_version'], entry['getters']) == ('17.12.1', {})
+    assert cache.lookup('sw1', GETTERS, upgraded, now=300)[0] == {}
+
+
+def test_corrupt_cache_file(cache):
+    cache.host_path('sw1').write_bytes(b'not gzip')
+    assert cache.load('sw1') is None
+    assert cache.lookup('sw1', GETTERS, FACTS, now=200)[0] == {}
+
+
+def test_parse_ttls():
+    ttls = parse_ttls(['interfaces=60', 'mac_address_table=30', 'facts=10'])
+    assert ttls == dict(DEFAULT_TTLS, interfaces=60, mac_address_table=30)
+    assert DEFAULT_TTLS['interfaces'] == 6 * 3600
+    with pytest.raises(ValueError):
+        parse_ttls(['arp_table=60'])
+    with pytest.raises(ValueError):
+        parse_ttls(['interfaces'])
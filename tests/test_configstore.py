@@ -0,0 +1,69 @@
+"""
+    ConfigStore: identical configs are stored once, refs and history only change with the
+    configs, and export writes the latest running configs.
+"""
+
+import json
+
+import pytest
+
+from nacconfigstore import ConfigStore, main
+
+RUNNING = 'hostname sw1\n!\ninterface GigabitEthernet1/0/1\n switchport mode access\n!\n'
+STARTUP = 'hostname sw1\n!\n'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ConfigStore(tmp_path / 'store')
+
+
+def objects(store):
+    return sorted(path.name for path in (store.path / 'objects').rglob('*.gz'))
+
+
+def history(store, host):
+    with open(str(store.path / 'refs' / (host + '.history.jsonl'))) as f:
+        return [json.loads(line)['configs'] for line in f]
+
+
+def test_identical_configs_are_stored_once(store):
+    digest = store.put(RUNNING)
+    assert store.put(RUNNING) == digest
+    assert store.get(digest) == RUNNING
+    assert objects(store) == [digest + '.gz']
+    assert store.object_path(digest).parent.name == digest[:2]
+    assert not list(store.path.rglob('*.tmp'))
+
+
+def test_hosts_share_objects(store):
+    store.save_host('sw1', {'running': RUNNING, 'startup': STARTUP, 'candidate': ''})
+    store.save_host('sw2', {'running': RUNNING, 'startup': STARTUP, 'candidate': ''})
+    assert len(objects(store)) == 2
+    assert store.hosts() == ['sw1', 'sw2']
+    assert store.latest('sw1')['configs'] == store.latest('sw2')['configs'] == {'running': store.put(RUNNING), 'startup': store.put(STARTUP)}
+
+
+def test_history_only_records_changes(store):
+    assert store.save_host('sw1', {'running': RUNNING, 'startup': STARTUP})
+    assert not store.save_host('sw1', {'running': RUNNING, 'startup': STARTUP})
+    changed = RUNNING.replace('access', 'trunk')
+    assert store.save_host('sw1', {'running': changed, 'startup': STARTUP})
+    assert history(store, 'sw1') == [
+        {'running': store.put(RUNNING), 'startup': store.put(STARTUP)},
+        {'running': store.put(changed), 'startup': store.put(STARTUP)},
+    ]
+    assert store.latest('sw1')['configs']['running'] == store.put(changed)
+    assert store.latest('sw2') is None
+
+
+def test_export_writes_changed_configs(store, tmp_path, capsys):
+    store.save_host('sw1', {'running': RUNNING, 'startup': STARTUP})
+    store.save_host('sw2', {'startup': STARTUP})
+    configs = tmp_path / 'configs'
+    assert main(['export', str(store.path), str(configs)]) == 0
+    assert capsys.readouterr().out == f'Exported 1 changed running configs of 2 hosts to {configs}\n'
+    assert (configs / 'sw1.txt').read_text() == RUNNING
+    assert store.export(configs) == 0
+    assert store.export(configs, 'startup') == 2
+    assert (configs / 'sw2.txt').read_text() == STARTUP
@@ -0,0 +1,48 @@
+"""
+    The configuration scanner, the CiscoConfParse engine and the in-memory pipeline path
+    must write byte-identical .delta and .new files for every config in tests/configs.
+"""
+
+import filecmp
+import pathlib
+
+import pytest
+
+from iosnacconfparser import generate_nac_config, parse_config
+from nacrules import load_rules
+
+CONFIGS = pathlib.Path(__file__).resolve().parent / 'configs'
+CORPUS = sorted(path.name for path in CONFIGS.glob('*.cfg'))
+
+
+@pytest.fixture
+def changes(tmp_path):
+    for engine in ('scan', 'ciscoconfparse', 'pipeline'):
+        (tmp_path / engine).mkdir()
+    return tmp_path
+
+
+def test_corpus_covers_line_endings():
+    raw = {name: (CONFIGS / name).read_bytes() for name in CORPUS}
+    assert any(b'\r\n' in data for data in raw.values())
+    assert any(b'\r' in data and b'\n' not in data for data in raw.values())
+
+
+@pytest.mark.parametrize('name', CORPUS)
+def test_engines_write_identical_files(name, changes):
+    scan = parse_config(name, str(CONFIGS), str(changes / 'scan'), engine='scan')
+    reference = parse_config(name, str(CONFIGS), str(changes / 'ciscoconfparse'), engine='ciscoconfparse')
+    assert scan == reference
+    assert scan
+    for suffix in ('.delta', '.new'):
+        assert filecmp.cmp(str(changes / 'scan' / (name + suffix)), str(changes / 'ciscoconfparse' / (name + suffix)), shallow=False)
+
+
+@pytest.mark.parametrize('name', CORPUS)
+def test_pipeline_writes_identical_files(name, changes):
+    parse_config(name, str(CONFIGS), str(changes / 'scan'), engine='scan')
+    with open(str(CONFIGS / name), newline='') as f:
+        text = f.read()
+    generate_nac_config(name, text, str(changes / 'pipeline'), load_rules())
+    for suffix in ('.delta', '.new'):
+        assert filecmp.cmp(str(changes / 'scan' / (name + suffix)), str(changes / 'pipeline' / (name + suffix)), shallow=False)
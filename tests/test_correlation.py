@@ -0,0 +1,120 @@
+"""
+    --correlate in the stream processor: correlation reasons join the host's own reasons in a
+    single row per port, and ports it flags get no NAC config.
+"""
+
+from collectswitchfacts_hybrid import HostStreamProcessor, RunOptions
+from naccorrelation import CorrelationIndex
+from nacexclusions import PortExclusions
+from nacnormalize import normalize_host
+from nacrules import load_rules
+from nacstate import StateStore
+
+#MACs of the users behind acc1, learned on acc1's access ports and on dist1's downlink.
+USER_MACS = ['00:50:56:00:00:%02X' % number for number in range(1, 7)]
+
+
+def facts(host):
+    return {'hostname': host, 'fqdn': host, 'vendor': 'Cisco', 'model': 'C9300-48P', 'os_version': '16.12.4', 'serial_number': 'FOC1', 'uptime': 1, 'interface_list': []}
+
+
+def neighbor(system_name, capabilities):
+    return [{
+        'remote_chassis_id': '',
+        'remote_system_name': system_name,
+        'remote_system_description': '',
+        'remote_port': 'Gi1/0/48',
+        'remote_port_description': '',
+        'remote_system_capab': capabilities,
+    }]
+
+
+def interface(description=''):
+    return {'is_enabled': True, 'is_up': True, 'description': description, 'speed': 1000}
+
+
+DIST1 = {
+    'facts': facts('dist1'),
+    'mac_address_table': [{'mac': mac, 'interface': 'Te1/1/1', 'vlan': 10} for mac in USER_MACS],
+    'lldp_neighbors_detail': {'TenGigabitEthernet1/1/1': neighbor('acc1', ['bridge'])},
+    'interfaces': {'TenGigabitEthernet1/1/1': interface()},
+}
+
+#acc1's uplink is configured as an access port and its LLDP neighbor advertises no
+#capabilities, so only the correlation knows it faces dist1.
+ACC1 = {
+    'facts': facts('acc1'),
+    'mac_address_table': [{'mac': mac, 'interface': 'Gi1/0/%d' % port, 'vlan': 10} for port, mac in enumerate(USER_MACS, 1)],
+    'lldp_neighbors_detail': {'GigabitEthernet1/0/48': neighbor('dist1.example.com', [])},
+    'interfaces': dict({'GigabitEthernet1/0/%d' % port: interface() for port in range(1, 7)}, **{'GigabitEthernet1/0/48': interface()}),
+}
+
+ACC1_CONFIG = ''.join(
+    'interface GigabitEthernet1/0/%d\n switchport mode access\n!\n' % port for port in list(range(1, 7)) + [48]
+)
+
+
+def run(output, oui_index, state_dir=None, nac_dir=None):
+    options = RunOptions(state_dir=state_dir, nac_dir=str(nac_dir) if nac_dir else None, correlate=True)
+    processor = HostStreamProcessor(output, PortExclusions(), load_rules(), options, diff_output=output)
+    processor.host_completed('dist1', DIST1, platform='ios')
+    processor.host_completed('acc1', ACC1, {'running': ACC1_CONFIG}, platform='ios')
+    flagged = processor.add_correlation_exclusions()
+    return processor, flagged
+
+
+def test_one_row_per_port_with_correlation_reasons(output, oui_index):
+    processor, flagged = run(output, oui_index)
+    rows = output.sheet('Port Exclusion Recommendations')
+    assert len({(row[0], row[1]) for row in rows}) == len(rows)
+    rows = {(row[0], row[1]): row[2] for row in rows}
+    dist1 = rows[('dist1', 'Te1/1/1')]
+    assert 'multimac' in dist1
+    assert "LLDP Neighbor['bridge']" in dist1
+    assert 'Uplink: 6 of 6 MACs attached to other switches' in dist1
+    assert 'Faces inventory device acc1' in dist1
+    assert rows[('acc1', 'Gi1/0/48')] == "['Faces inventory device dist1']"
+    assert flagged == 2
+    assert not processor.deferred
+
+
+def test_correlated_ports_get_no_nac_config(output, oui_index, tmp_path):
+    run(output, oui_index, nac_dir=tmp_path)
+    delta = (tmp_path / 'acc1.delta').read_text()
+    assert 'interface GigabitEthernet1/0/1\n' in delta
+    assert 'interface GigabitEthernet1/0/48' not in delta
+
+
+def test_state_includes_correlation_reasons(output, oui_index, tmp_path):
+    run(output, oui_index, state_dir=tmp_path)
+    state = StateStore(tmp_path).load('acc1')['state']
+    assert state['exclusions']['Gi1/0/48'] == ['Faces inventory device dist1']
+
+
+def test_locate_bisects_sorted_buckets():
+    index = CorrelationIndex()
+    index.add_host('dist1', normalize_host(DIST1, 'ios'))
+    index.add_host('acc1', normalize_host(ACC1, 'ios'))
+    assert index.locate(USER_MACS[0].lower()) == [('dist1', 'Te1/1/1', 10), ('acc1', 'Gi1/0/1', 10)]
+    assert index.sorted
+    assert all(list(macs) == sorted(macs) for macs in index.macs)
+    assert index.locate('00:50:56:00:01:01') == []
+    assert index.locate('not a mac') == []
+
+    #A host added after a lookup is sorted into the buckets at the next one.
+    index.add_host('acc2', normalize_host({'mac_address_table': [{'mac': USER_MACS[0], 'interface': 'Gi1/0/9', 'vlan': 20}]}, 'ios'))
+    assert not index.sorted
+    assert index.locate(USER_MACS[0]) == [('dist1', 'Te1/1/1', 10), ('acc1', 'Gi1/0/1', 10), ('acc2', 'Gi1/0/9', 20)]
+
+
+def test_neighbor_outside_the_run_resolves_to_the_inventory():
+    acc1 = dict(ACC1, lldp_neighbors_detail={'GigabitEthernet1/0/48': neighbor('dist2.example.com', [])})
+    index = CorrelationIndex()
+    index.add_host('acc1', normalize_host(acc1, 'ios'))
+    assert index.find_exclusions() == []
+
+    index.add_inventory_host('dist2', '10.83.8.2')
+    index.add_inventory_host('acc1', 'acc1.example.com')
+    assert index.find_exclusions() == [('acc1', 'Gi1/0/48', 'Faces inventory device dist2')]
+    #IP address hostnames are not names LLDP neighbors are matched on.
+    assert '10' not in index.names
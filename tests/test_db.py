@@ -0,0 +1,81 @@
+"""
+    The SQLite results store: rows written through open_sinks come back unchanged from
+    export_run, booleans included.
+"""
+
+import pytest
+
+from nacdb import DATABASE_NAME, SqliteSink, connect, export_run, list_runs
+from nacoutput import DIFF_SHEETS, SHEETS, open_sinks
+from nacshards import read_sheet
+
+RUN_ID = 'NACFACTS-MixGrouping1-2021-03-01-10-00-00'
+
+ROWS = [
+    ('Facts', ['sw1', 'Cisco', 'C9300-48P', '16.12.4', 'FOC1', 3600]),
+    ('Interfaces', ['sw1', 'Gi1/0/1', 'ESXI host', True, False, 1000.0]),
+    ('Interfaces', ['sw1', 'Gi1/0/2', '', False, None, 0]),
+    ('Mac Table Vendors', ['sw1', 'Gi1/0/1', '00:50:56:00:00:01', 'VMware, Inc.']),
+    ('Multi Mac Ports', ['sw1', 'Gi1/0/1', 2, ['VMware, Inc.']]),
+    ('Failed Devices', ['sw2', '10.0.0.2', 'Timed out', 2]),
+]
+
+
+def write_run(tmp_path, run_id=RUN_ID, rows=ROWS, sheets=SHEETS):
+    output = open_sinks(str(tmp_path / run_id), ('sqlite',), sheets)
+    for sheet, row in rows:
+        output.append(sheet, row)
+        output.flush()
+    assert output.close() == []
+    return tmp_path / DATABASE_NAME
+
+
+def test_round_trip(tmp_path):
+    database = write_run(tmp_path)
+    counts = export_run(database, RUN_ID, str(tmp_path / 'export'), ('csv',))
+    assert counts == dict(dict.fromkeys(SHEETS, 0), **{'Facts': 1, 'Interfaces': 2, 'Mac Table Vendors': 1, 'Multi Mac Ports': 1, 'Failed Devices': 1})
+
+    connection = connect(database)
+    assert connection.execute('SELECT admin_status, oper_status, speed FROM interfaces ORDER BY rowid').fetchall() == [(1, 0, 1000.0), (0, None, 0)]
+    #Values SQLite has no type for are stored as their text.
+    assert connection.execute('SELECT vendors FROM multimac_ports').fetchone() == ("['VMware, Inc.']",)
+    connection.close()
+
+    #CSV holds the text of every value, so exported booleans read as they were written.
+    assert list(read_sheet(tmp_path / 'export', 'Interfaces')) == [['sw1', 'Gi1/0/1', 'ESXI host', 'True', 'False', '1000.0'], ['sw1', 'Gi1/0/2', '', 'False', '', '0']]
+    assert list(read_sheet(tmp_path / 'export', 'Facts')) == [['sw1', 'Cisco', 'C9300-48P', '16.12.4', 'FOC1', '3600']]
+
+
+def test_runs_are_kept_apart(tmp_path):
+    write_run(tmp_path)
+    database = write_run(tmp_path, 'NACDIFF-MixGrouping1-2021-03-01-10-00-00', [('Changes', ['sw1', '', 'Host added', ''])], DIFF_SHEETS)
+    assert [(run_id, rows) for run_id, started, rows in list_runs(database)] == [('NACDIFF-MixGrouping1-2021-03-01-10-00-00', 1), (RUN_ID, 1)]
+    assert export_run(database, 'NACDIFF-MixGrouping1-2021-03-01-10-00-00', str(tmp_path / 'diff'), ('csv',)) == {'Changes': 1}
+    assert export_run(database, RUN_ID, str(tmp_path / 'facts'), ('csv',))['Facts'] == 1
+
+
+def test_unknown_run(tmp_path):
+    database = write_run(tmp_path)
+    with pytest.raises(KeyError):
+        export_run(database, 'NACFACTS-missing', str(tmp_path / 'export'), ('csv',))
+
+
+def test_sheet_without_table(tmp_path):
+    with pytest.raises(ValueError):
+        SqliteSink(tmp_path / DATABASE_NAME, RUN_ID, {'Unknown': ['Switch']})
+
+
+def test_reused_run_id_replaces_the_run(tmp_path):
+    write_run(tmp_path)
+    database = write_run(tmp_path, rows=ROWS[:2])
+    assert [(run_id, rows) for run_id, started, rows in list_runs(database)] == [(RUN_ID, 1)]
+    assert export_run(database, RUN_ID, str(tmp_path / 'export'), ('csv',)) == dict(dict.fromkeys(SHEETS, 0), Facts=1, Interfaces=1)
+
+
+def test_vendor_prefix_search_uses_the_index(tmp_path):
+    connection = connect(write_run(tmp_path))
+    query = "SELECT switch, interface, mac FROM mac_entries WHERE vendor LIKE 'vmware%'"
+    assert connection.execute(query).fetchall() == [('sw1', 'Gi1/0/1', '00:50:56:00:00:01')]
+    plan = ' '.join(row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + query))
+    assert 'USING INDEX mac_entries_vendor_nocase' in plan
+    connection.close()
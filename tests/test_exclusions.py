@@ -0,0 +1,97 @@
+"""
+    Port exclusion store and the Port Exclusion Recommendations sheet: one row per excluded
+    (switch, port), however many hosts are processed.
+"""
+
+import pytest
+
+from collectswitchfacts_hybrid import process_host
+from nacexclusions import PortExclusions
+from nacnormalize import normalize_host
+from nacrules import load_rules
+
+#Ports of every synthetic host excluded for a reason: Gi1/0/1 multi-MAC, Gi1/0/2 description,
+#Gi1/0/48 description and LLDP neighbor.
+EXCLUDED_PORTS = 3
+
+
+def getters_result(host):
+    """ios shaped napalm_get results of a switch with a multi-MAC port and an uplink."""
+    return {
+        'facts': {'hostname': host, 'fqdn': host, 'vendor': 'Cisco', 'model': 'C9300-48P', 'os_version': '16.12.4', 'serial_number': 'FOC' + host, 'uptime': 100, 'interface_list': []},
+        'mac_address_table': [
+            {'mac': '00:50:56:00:00:01', 'interface': 'Gi1/0/1', 'vlan': 10},
+            {'mac': '00:50:56:00:00:02', 'interface': 'Gi1/0/1', 'vlan': 10},
+            {'mac': '00:1B:21:00:00:03', 'interface': 'Gi1/0/3', 'vlan': 10},
+            {'mac': '00:00:0C:FF:FF:01', 'interface': '', 'vlan': 1},
+        ],
+        'lldp_neighbors_detail': {
+            'GigabitEthernet1/0/48': [{
+                'remote_chassis_id': '00:00:0C:12:34:00',
+                'remote_system_name': 'dist-' + host,
+                'remote_system_description': 'Cisco IOS Software',
+                'remote_port': 'TenGigabitEthernet1/1/1',
+                'remote_port_description': 'downlink',
+                'remote_system_capab': ['bridge', 'router'],
+            }],
+        },
+        'interfaces': {
+            'GigabitEthernet1/0/%d' % port: {
+                'is_enabled': True,
+                'is_up': True,
+                'description': {2: 'ESXI host', 48: 'UPLINK to distribution'}.get(port, ''),
+                'speed': 1000,
+            }
+            for port in (1, 2, 3, 48)
+        },
+    }
+
+
+def run_hosts(hosts, output):
+    portexclusions = PortExclusions()
+    rules = load_rules()
+    for number in range(hosts):
+        host = 'sw%04d' % number
+        process_host(host, normalize_host(getters_result(host), 'ios'), output, portexclusions, rules)
+    return portexclusions
+
+
+@pytest.mark.parametrize('hosts', [1, 5, 50])
+def test_one_row_per_excluded_port(hosts, output, oui_index):
+    portexclusions = run_hosts(hosts, output)
+    rows = output.sheet('Port Exclusion Recommendations')
+    assert len(rows) == EXCLUDED_PORTS * hosts
+    assert len({(row[0], row[1]) for row in rows}) == len(rows)
+    #Exported records are removed from the store.
+    assert len(portexclusions) == 0
+
+
+def test_rows_grow_linearly_with_hosts(output, oui_index):
+    counts = []
+    for hosts in (10, 20, 40):
+        output.rows.clear()
+        run_hosts(hosts, output)
+        counts.append(len(output.sheet('Port Exclusion Recommendations')))
+    assert counts == [EXCLUDED_PORTS * 10, EXCLUDED_PORTS * 20, EXCLUDED_PORTS * 40]
+
+
+def test_reasons_of_a_port_are_merged(output, oui_index):
+    run_hosts(1, output)
+    rows = {row[1]: row for row in output.sheet('Port Exclusion Recommendations')}
+    assert set(rows) == {'Gi1/0/1', 'Gi1/0/2', 'Gi1/0/48'}
+    uplink = rows['Gi1/0/48']
+    assert "LLDP Neighbor['bridge', 'router']" in uplink[2]
+    assert 'Description contains: UPLINK' in uplink[2]
+    assert uplink[3] == 'UPLINK to distribution'
+
+
+def test_store_keeps_one_record_per_port():
+    portexclusions = PortExclusions()
+    portexclusions.add('sw1', 'Gi1/0/1', 'multimac')
+    portexclusions.add('sw1', 'Gi1/0/1', 'Description contains: UPLINK', 'UPLINK')
+    portexclusions.add('sw2', 'Gi1/0/1', 'multimac')
+    assert len(portexclusions) == 2
+    assert portexclusions.get('sw1', 'Gi1/0/1').reasons == ['multimac', 'Description contains: UPLINK']
+    assert [exclusion.port for exclusion in portexclusions.pop_switch('sw1')] == ['Gi1/0/1']
+    assert portexclusions.pop_switch('sw1') == []
+    assert len(portexclusions) == 1
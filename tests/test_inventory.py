@@ -0,0 +1,99 @@
+"""
+    FileInventory and its per-site cache, built from inventory-example.csv.
+"""
+
+import shutil
+
+import pytest
+
+from conftest import REPO
+from nacinventory import inventory_hosts, load_source, parse_record, read_source, select_records
+
+EXAMPLE = REPO / 'inventory-example.csv'
+
+GROUPS = """\
+cisco:
+  platform: ios
+procurve:
+  platform: procurve
+"""
+
+
+def names(records):
+    return sorted(record[0] for record in records)
+
+
+def test_read_source_groups_by_site():
+    sites = read_source(EXAMPLE)
+    assert sorted(sites) == ['herndon-dev', 'reston']
+    assert names(sites['herndon-dev']) == ['hdn-idf1-sw01', 'hdn-idf1-sw02', 'hdn-idf2-sw01', 'hdn-mdf-sw01']
+    name, hostname, platform, port, username, password, groups, data = sites['reston'][0]
+    assert (name, hostname, platform, port, groups) == ('rst-idf1-sw01', '10.84.1.20', 'ios', None, ('cisco',))
+    assert data == {'site': 'reston', 'role': 'access', 'tags': ['idf'], 'building': 'RST-1'}
+
+
+def test_json_record_lists_and_defaults():
+    record = parse_record({'name': 'sw1', 'platform': 'procurve', 'port': '2222', 'groups': ['procurve'], 'tags': ['idf', 'mix'], 'site': 'reston', 'role': ''})
+    assert record == ('sw1', 'sw1', 'procurve', 2222, None, None, ('procurve',), {'tags': ['idf', 'mix'], 'site': 'reston'})
+
+
+@pytest.mark.parametrize('roles, tags, expected', [
+    (None, None, ['hdn-idf1-sw01', 'hdn-idf1-sw02', 'hdn-idf2-sw01', 'hdn-mdf-sw01', 'rst-idf1-sw01']),
+    (['distribution'], None, ['hdn-mdf-sw01']),
+    (None, ['mix'], ['hdn-idf1-sw01', 'hdn-idf1-sw02', 'hdn-idf2-sw01']),
+    (['access'], ['idf'], ['hdn-idf1-sw01', 'hdn-idf1-sw02', 'hdn-idf2-sw01', 'rst-idf1-sw01']),
+])
+def test_select_records(roles, tags, expected):
+    assert names(select_records(read_source(EXAMPLE), roles, tags)) == expected
+
+
+def test_cache_is_keyed_on_content(tmp_path):
+    source = tmp_path / 'devices.csv'
+    shutil.copy(str(EXAMPLE), str(source))
+    cache_dir = tmp_path / 'cache'
+    assert load_source(source, cache_dir) == read_source(source)
+    first = list(cache_dir.iterdir())
+    assert len(first) == 1
+    #Served from the cache, one site's pickle only.
+    assert list(load_source(source, cache_dir, ['reston'])) == ['reston']
+
+    with open(str(source), 'a') as f:
+        f.write('rst-idf1-sw02,10.84.1.21,ios,cisco,reston,access,idf,RST-1\n')
+    assert names(load_source(source, cache_dir, ['reston'])['reston']) == ['rst-idf1-sw01', 'rst-idf1-sw02']
+    #The cache of the earlier version of the export is removed.
+    assert len(list(cache_dir.iterdir())) == 1
+    assert list(cache_dir.iterdir()) != first
+
+
+def test_file_inventory_builds_only_selected_hosts(tmp_path):
+    from nornir import InitNornir
+
+    from collectswitchfacts_hybrid import target_filter
+
+    (tmp_path / 'groups.yaml').write_text(GROUPS)
+    nr = InitNornir(
+        core={'num_workers': 5},
+        logging={'enabled': False},
+        inventory={'plugin': 'nacinventory.FileInventory', 'options': {
+            'source': str(EXAMPLE),
+            'group_file': str(tmp_path / 'groups.yaml'),
+            'defaults_file': str(tmp_path / 'defaults.yaml'),
+            'cache_dir': str(tmp_path / 'cache'),
+            'sites': ['herndon-dev'],
+            'roles': ['access'],
+        }},
+    )
+    hosts = nr.inventory.hosts
+    assert sorted(hosts) == ['hdn-idf1-sw01', 'hdn-idf1-sw02', 'hdn-idf2-sw01']
+    assert hosts['hdn-idf2-sw01'].platform == 'procurve'
+    assert hosts['hdn-idf2-sw01'].get('building') == 'HDN-2'
+    assert sorted(nr.filter(target_filter(tags=['mix'])).inventory.hosts) == sorted(hosts)
+    assert sorted(nr.filter(target_filter(sites=['reston'])).inventory.hosts) == []
+
+
+def test_inventory_hosts_ignore_the_run_targets(tmp_path):
+    config = tmp_path / 'config.yaml'
+    config.write_text('inventory:\n  plugin: nacinventory.FileInventory\n  options:\n    source: %s\n    sites: [reston]\n' % EXAMPLE)
+    hosts = dict(inventory_hosts(str(config)))
+    assert sorted(hosts) == ['hdn-idf1-sw01', 'hdn-idf1-sw02', 'hdn-idf2-sw01', 'hdn-mdf-sw01', 'rst-idf1-sw01']
+    assert hosts['rst-idf1-sw01'] == '10.84.1.20'
@@ -0,0 +1,96 @@
+"""
+    Incremental iosnacconfparser runs: the manifest skips configs whose input, ruleset and
+    outputs are unchanged and rebuilds everything else.
+"""
+
+import json
+import shutil
+
+import pytest
+
+from conftest import REPO
+from iosnacconfparser import MANIFEST_NAME, build_config, file_digest, is_unchanged, load_manifest, main
+from nacrules import NacRules, load_rules
+
+CONFIGS = REPO / 'tests' / 'configs'
+NAME = 'banners.cfg'
+
+
+@pytest.fixture
+def configs(tmp_path):
+    shutil.copytree(str(CONFIGS), str(tmp_path / 'configs'))
+    return tmp_path / 'configs'
+
+
+@pytest.fixture
+def entry(tmp_path):
+    changes = tmp_path / 'nac'
+    changes.mkdir()
+    rules = load_rules()
+    interfaces, outputs = build_config(NAME, str(CONFIGS), str(changes))
+    return {
+        'sha256': file_digest(str(CONFIGS / NAME)),
+        'ruleset_version': rules.version,
+        'ruleset_digest': rules.digest,
+        'outputs': outputs,
+        'interfaces': len(interfaces),
+    }
+
+
+def run(configs, capsys, *args):
+    assert main(['--configs', str(configs), '--output', str(configs.parent / 'nac'), '--workers', '1'] + list(args)) == 0
+    return capsys.readouterr().out
+
+
+def test_unchanged_entry(tmp_path, entry):
+    assert is_unchanged(entry, entry['sha256'], load_rules(), str(tmp_path / 'nac'))
+
+
+def test_changed_input_or_missing_entry(tmp_path, entry):
+    rules = load_rules()
+    assert not is_unchanged(entry, '0' * 64, rules, str(tmp_path / 'nac'))
+    assert not is_unchanged(None, entry['sha256'], rules, str(tmp_path / 'nac'))
+
+
+def test_changed_ruleset(tmp_path, entry):
+    rules = load_rules()
+    bumped = NacRules(rules.description_keywords, version=rules.version + 1)
+    assert not is_unchanged(entry, entry['sha256'], bumped, str(tmp_path / 'nac'))
+    entry['ruleset_digest'] = 'edited'
+    assert not is_unchanged(entry, entry['sha256'], rules, str(tmp_path / 'nac'))
+
+
+def test_changed_or_deleted_output(tmp_path, entry):
+    rules = load_rules()
+    delta = tmp_path / 'nac' / (NAME + '.delta')
+    with open(str(delta), 'a') as f:
+        f.write('!edited\n')
+    assert not is_unchanged(entry, entry['sha256'], rules, str(tmp_path / 'nac'))
+    delta.unlink()
+    assert not is_unchanged(entry, entry['sha256'], rules, str(tmp_path / 'nac'))
+
+
+def test_incremental_runs(configs, capsys):
+    count = len(list(configs.iterdir()))
+    assert f'Rebuilt: {count}  Skipped (unchanged): 0' in run(configs, capsys)
+    assert f'Rebuilt: 0  Skipped (unchanged): {count}' in run(configs, capsys)
+
+    with open(str(configs / NAME), 'a') as f:
+        f.write('!\n')
+    assert f'Rebuilt: 1  Skipped (unchanged): {count - 1}' in run(configs, capsys)
+    assert f'Rebuilt: {count}  Skipped (unchanged): 0' in run(configs, capsys, '--force')
+
+
+def test_deleted_config_is_pruned(configs, capsys):
+    run(configs, capsys)
+    (configs / NAME).unlink()
+    assert 'Removed (deleted): 1' in run(configs, capsys)
+    nac = configs.parent / 'nac'
+    assert not (nac / (NAME + '.delta')).exists() and not (nac / (NAME + '.new')).exists()
+    assert sorted(path.name for path in nac.glob('*.delta')) == sorted(path.name + '.delta' for path in configs.iterdir())
+    assert 'Removed (deleted): 0' in run(configs, capsys)
+    manifest = load_manifest(str(configs.parent / 'nac'))
+    assert NAME not in manifest['files']
+    assert sorted(manifest['files']) == sorted(path.name for path in configs.iterdir())
+    with open(str(configs.parent / 'nac' / MANIFEST_NAME)) as f:
+        assert json.load(f) == manifest
@@ -0,0 +1,224 @@
+"""
+    Per-driver normalization: interface names, MAC, VLAN and capability notations, LLDP
+    neighbor shapes and the choice of driver by platform or vendor.
+"""
+
+import pytest
+
+from interfacenames import normalize_interface
+from nacnormalize import (
+    Interface,
+    LldpNeighbor,
+    MacEntry,
+    canonical_mac,
+    driver_for,
+    normalize_host,
+    normalize_ios,
+    normalize_procurve,
+    split_capabilities,
+    vlan_id,
+)
+
+CANONICAL = '00:11:22:33:44:55'
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('HundredGigE1/0/49', 'Hu1/0/49'),
+    ('HundredGigabitEthernet1/0/49', 'Hu1/0/49'),
+    ('FortyGigabitEthernet1/1/1', 'Fo1/1/1'),
+    ('Fo1/1/1', 'Fo1/1/1'),
+    ('TwentyFiveGigE1/0/1', 'Twe1/0/1'),
+    ('TenGigabitEthernet1/1/1', 'Te1/1/1'),
+    ('Te1/1/1', 'Te1/1/1'),
+    ('FiveGigabitEthernet1/0/1', 'Fi1/0/1'),
+    ('TwoGigabitEthernet1/0/1', 'Tw1/0/1'),
+    ('AppGigabitEthernet1/0/1', 'Ap1/0/1'),
+    ('GigabitEthernet1/0/1', 'Gi1/0/1'),
+    ('gigabitethernet1/0/1', 'Gi1/0/1'),
+    ('Gi1/0/1', 'Gi1/0/1'),
+    (' Gi 1/0/1 ', 'Gi1/0/1'),
+    ('GigabitEthernet1/0/1.100', 'Gi1/0/1.100'),
+    ('FastEthernet0/1', 'Fa0/1'),
+    ('Ethernet1/1', 'Et1/1'),
+    ('Port-channel10', 'Po10'),
+    ('Port-Channel10', 'Po10'),
+    ('port-channel10', 'Po10'),
+    ('Vlan10', 'Vl10'),
+    ('Loopback0', 'Lo0'),
+    ('Tunnel1', 'Tu1'),
+    ('mgmt0', 'Mg0'),
+    #ProCurve numeric, module and trunk ports have no type prefix to shorten.
+    ('1', '1'),
+    ('24', '24'),
+    ('A1', 'A1'),
+    ('Trk1', 'Trk1'),
+    (' 7 ', '7'),
+    #Unknown types and values that are not interface names are kept.
+    ('Serial0/0/0', 'Serial0/0/0'),
+    ('CPU', 'CPU'),
+    ('', ''),
+    (None, None),
+])
+def test_normalize_interface(name, expected):
+    assert normalize_interface(name) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('00:11:22:33:44:55', CANONICAL),
+    ('aa:bb:cc:dd:ee:ff', 'AA:BB:CC:DD:EE:FF'),
+    ('001122-334455', CANONICAL),
+    ('00 11 22 33 44 55', CANONICAL),
+    ('00-11-22-33-44-55', CANONICAL),
+    ('0011.2233.4455', CANONICAL),
+    ('001122334455', CANONICAL),
+    #Chassis IDs that are not MAC addresses are kept as advertised.
+    ('dist1.example.com', 'dist1.example.com'),
+    ('10.83.8.2', '10.83.8.2'),
+    ('', ''),
+    (None, None),
+])
+def test_canonical_mac(value, expected):
+    assert canonical_mac(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    (10, 10),
+    ('10', 10),
+    (' 20 ', 20),
+    ('', None),
+    (None, None),
+    ('default', None),
+])
+def test_vlan_id(value, expected):
+    assert vlan_id(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    (['router', 'bridge'], ['bridge', 'router']),
+    ('bridge, router', ['bridge', 'router']),
+    ('Bridge,Router', ['bridge', 'router']),
+    ('bridge', ['bridge']),
+    ('', []),
+    (None, []),
+])
+def test_split_capabilities(value, expected):
+    assert split_capabilities(value) == expected
+
+
+@pytest.mark.parametrize('platform, vendor, expected', [
+    ('ios', 'HP', 'ios'),
+    ('iosxe', None, 'iosxe'),
+    ('aruba_os_switch', 'Cisco', 'aruba_os_switch'),
+    (None, 'Cisco', 'ios'),
+    (None, 'HP', 'procurve'),
+    (None, 'Hewlett Packard', 'procurve'),
+    (None, ' Aruba', 'procurve'),
+    ('nxos', 'Cisco', 'ios'),
+    (None, 'Juniper', 'ios'),
+    (None, None, 'ios'),
+])
+def test_driver_for(platform, vendor, expected):
+    assert driver_for(platform, {'vendor': vendor}) == expected
+
+
+def test_driver_for_without_facts():
+    assert driver_for(None, None) == 'ios'
+
+
+def neighbor(chassis_id, capabilities):
+    return {
+        'remote_chassis_id': chassis_id,
+        'remote_system_name': 'dist1',
+        'remote_system_description': '',
+        'remote_port': '49',
+        'remote_port_description': '',
+        'remote_system_capab': capabilities,
+    }
+
+
+PROCURVE_FACTS = {'hostname': 'hdn-idf2-sw01', 'vendor': 'HP', 'interface_list': ['1', '2', 'A1', 'Trk1']}
+
+
+@pytest.mark.parametrize('lldp', [
+    {'Trk1': neighbor('001122-334455', 'bridge, router')},
+    {'Trk1': [neighbor('00 11 22 33 44 55', 'bridge,router')]},
+    {'Trk1': [neighbor('00:11:22:33:44:55', ['router', 'bridge'])]},
+], ids=['dict', 'list', 'capability-list'])
+def test_procurve_lldp_neighbor_shapes(lldp):
+    record = normalize_procurve({'facts': PROCURVE_FACTS, 'lldp_neighbors_detail': lldp})
+    assert record.lldp == [LldpNeighbor('Trk1', CANONICAL, 'dist1', '', '49', '', ['bridge', 'router'])]
+
+
+def test_procurve_mac_table():
+    record = normalize_procurve({
+        'facts': PROCURVE_FACTS,
+        'mac_address_table': [
+            {'mac': '001122-334455', 'interface': '1', 'vlan': '10'},
+            {'mac': '00 11 22 33 44 66', 'interface': 'A1', 'vlan': 20},
+            {'mac': '0011.2233.4477', 'interface': 'Trk1', 'vlan': ''},
+            {'mac': '001122-334488', 'interface': '', 'vlan': '1'},
+            {'mac': '001122-334499', 'vlan': '1'},
+        ],
+    })
+    assert list(record.mac_table) == [
+        MacEntry('1', CANONICAL, 10),
+        MacEntry('A1', '00:11:22:33:44:66', 20),
+        MacEntry('Trk1', '00:11:22:33:44:77', None),
+    ]
+    assert record.platform == 'procurve'
+    assert record.facts.interface_list == ('1', '2', 'A1', 'Trk1')
+
+
+def test_ios_record():
+    record = normalize_ios({
+        'facts': {'hostname': 'sw1', 'vendor': 'Cisco', 'interface_list': ['GigabitEthernet1/0/1', 'TenGigabitEthernet1/1/1']},
+        'mac_address_table': [
+            {'mac': CANONICAL, 'interface': 'Gi1/0/1', 'vlan': 10},
+            {'mac': '00:11:22:33:44:66', 'interface': '', 'vlan': 1},
+        ],
+        'lldp_neighbors_detail': {
+            'TenGigabitEthernet1/1/1': [neighbor('0011.2233.4455', ['bridge', 'router']), neighbor('dist2.example.com', [])],
+        },
+        'interfaces': {'GigabitEthernet1/0/1': {'is_enabled': True, 'is_up': False, 'description': None, 'speed': 1000}},
+    })
+    assert list(record.mac_table) == [MacEntry('Gi1/0/1', CANONICAL, 10)]
+    assert [(entry.port, entry.chassis_id, entry.capabilities) for entry in record.lldp] == [
+        ('Te1/1/1', CANONICAL, ['bridge', 'router']),
+        ('Te1/1/1', 'dist2.example.com', []),
+    ]
+    assert record.interfaces == [Interface('Gi1/0/1', '', True, False, 1000)]
+    assert record.facts.interface_list == ('Gi1/0/1', 'Te1/1/1')
+
+
+def test_empty_getters():
+    record = normalize_ios({})
+    assert (list(record.mac_table), record.lldp, record.interfaces) == ([], [], [])
+    assert record.facts.interface_list == ()
+    assert normalize_procurve({'lldp_neighbors_detail': {'1': None}}).lldp == []
+
+
+@pytest.mark.parametrize('platform, vendor, expected', [
+    ('hp_procurve', 'HP', 'hp_procurve'),
+    (None, 'Aruba', 'procurve'),
+    (None, 'Cisco', 'ios'),
+    (None, 'Unknown', 'ios'),
+])
+def test_normalize_host_vendor_fallback(platform, vendor, expected):
+    record = normalize_host({
+        'facts': {'hostname': 'sw1', 'vendor': vendor},
+        'mac_address_table': [{'mac': '001122-334455', 'interface': '1', 'vlan': '10'}],
+    }, platform)
+    assert record.platform == expected
+    if expected == 'ios':
+        #The ios driver leaves MACs and VLANs as napalm returned them.
+        assert list(record.mac_table) == [MacEntry('1', '001122-334455', '10')]
+    else:
+        assert list(record.mac_table) == [MacEntry('1', CANONICAL, 10)]
+
+
+def test_mac_table_is_converted_on_every_iteration():
+    raw = [{'mac': '001122-334455', 'interface': '1', 'vlan': '10'}, {'mac': '001122-334466', 'interface': '', 'vlan': '10'}]
+    record = normalize_procurve({'mac_address_table': raw})
+    #No list of MacEntry records is kept next to the raw table, and the table can be walked again.
+    assert record.mac_table.entries is raw
+    assert list(record.mac_table) == list(record.mac_table) == [MacEntry('1', CANONICAL, 10)]
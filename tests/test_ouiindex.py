@@ -0,0 +1,114 @@
+"""
+    OUI index lookups: the longest assignment wins and nothing is cached per MAC.
+"""
+
+import pytest
+
+from ouiindex import UNKNOWN_VENDOR, OuiIndex
+
+VENDORS = """\
+005056:VMware, Inc.
+70B3D5:IEEE Registration Authority
+70B3D51:MA-M vendor
+70B3D5123:MA-S vendor
+not a line
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = tmp_path / 'mac-vendors.txt'
+    path.write_text(VENDORS)
+    index = OuiIndex()
+    assert index.load(str(path)) == 4
+    return index
+
+
+@pytest.mark.parametrize('mac, vendor', [
+    ('00:50:56:8A:00:01', 'VMware, Inc.'),
+    ('70:B3:D5:12:30:01', 'MA-S vendor'),
+    ('70:B3:D5:12:40:01', 'MA-M vendor'),
+    ('70:B3:D5:22:30:01', 'IEEE Registration Authority'),
+    ('3C:52:82:00:00:01', UNKNOWN_VENDOR),
+    ('dist1.example.com', UNKNOWN_VENDOR),
+])
+def test_longest_prefix_wins(index, mac, vendor):
+    assert index.lookup(mac) == vendor
+
+
+def sizes(index):
+    return {name: len(value) for name, value in vars(index).items() if hasattr(value, '__len__')}
+
+
+def test_lookups_keep_no_per_mac_state(index):
+    before = sizes(index)
+    macs = ['00:50:56:00:%02X:%02X' % (number >> 8, number & 0xff) for number in range(5000)]
+    assert set(index.lookup_many(macs + ['bad']).values()) == {'VMware, Inc.', UNKNOWN_VENDOR}
+    assert sizes(index) == before
+    assert index.split_ouis == {0x70B3D5}
+
+
+REGISTRY = {
+    'oui.csv': 'Registry,Assignment,Organization Name,Organization Address\nMA-L,70B3D5,IEEE Registration Authority,Piscataway\n',
+    'mam.csv': 'Registry,Assignment,Organization Name,Organization Address\nMA-M,70B3D51,"Block Vendor, Inc.",Somewhere\n',
+    'oui36.csv': '﻿Registry,Assignment,Organization Name,Organization Address\nMA-S,70B3D5123,Sensor Vendor,Elsewhere\nMA-S,bad,Broken,\n',
+}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    paths = []
+    for name, text in REGISTRY.items():
+        path = tmp_path / name
+        path.write_text(text, encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize('mac, vendor', [
+    ('70:B3:D5:12:30:01', 'Sensor Vendor'),
+    ('70:B3:D5:1F:FF:FF', 'Block Vendor, Inc.'),
+    ('70:B3:D5:22:30:01', 'IEEE Registration Authority'),
+])
+def test_registry_csv_longest_prefix(registry, mac, vendor):
+    index = OuiIndex()
+    assert [index.load(path) for path in registry] == [1, 1, 1]
+    assert index.lookup(mac) == vendor
+
+
+def test_get_oui_index_loads_extra_files(registry, tmp_path, monkeypatch):
+    import mac_vendor_lookup
+    import ouiindex
+
+    cache = tmp_path / 'mac-vendors.txt'
+    cache.write_text('005056:VMware, Inc.\n')
+    monkeypatch.setattr(mac_vendor_lookup.MacLookup, 'find_vendors_list', lambda self: str(cache))
+    monkeypatch.setattr(ouiindex, '_index', None)
+    index = ouiindex.get_oui_index(registry[1:])
+    assert index.lookup('00:50:56:00:00:01') == 'VMware, Inc.'
+    assert index.lookup('70:B3:D5:12:30:01') == 'Sensor Vendor'
+    assert ouiindex.get_oui_index() is index
+
+
+def test_replay_with_oui_files(tmp_path, monkeypatch):
+    """--oui-file assignments reach the Mac Table Vendors sheet of a run."""
+    import csv
+    import gzip
+
+    import mac_vendor_lookup
+    import ouiindex
+    from collectswitchfacts_hybrid import RunOptions, run_discovery
+    from conftest import REPO
+
+    cache = tmp_path / 'mac-vendors.txt'
+    cache.write_text('005056:VMware, Inc.\n')
+    oui36 = tmp_path / 'oui36.csv'
+    oui36.write_text('Registry,Assignment,Organization Name,Organization Address\nMA-S,3C5282000,Sensor Vendor,\n')
+    monkeypatch.setattr(mac_vendor_lookup.MacLookup, 'find_vendors_list', lambda self: str(cache))
+    monkeypatch.setattr(ouiindex, '_index', None)
+    options = RunOptions(output_formats=('csv',), replay_dir=str(REPO / 'tests' / 'captures' / 'herndon-dev'), metrics_file=None, output_dir=str(tmp_path / 'out'), group_name='test', oui_files=[str(oui36)])
+    run_discovery('now', options)
+    with gzip.open(str(next((tmp_path / 'out').glob('NACFACTS-test-now/mac*vendors*.csv.gz'))), 'rt') as f:
+        vendors = {row[2]: row[3] for row in csv.reader(f)}
+    assert vendors['00:50:56:8A:00:01'] == 'VMware, Inc.'
+    assert vendors['3C:52:82:00:00:03'] == 'Sensor Vendor'
@@ -0,0 +1,42 @@
+"""
+    Output sinks: a missing optional dependency skips its format with a logged warning, and
+    Parquet rows are written in full row groups rather than one per flush.
+"""
+
+import logging
+
+import pytest
+
+import nacoutput
+from naclogging import LOGGER_NAME
+
+
+def test_missing_pyarrow_is_logged(tmp_path, monkeypatch, caplog, capsys):
+    def no_pyarrow(*args):
+        raise ImportError('No module named pyarrow')
+
+    monkeypatch.setattr(nacoutput, 'ParquetSink', no_pyarrow)
+    with caplog.at_level(logging.WARNING, logger=LOGGER_NAME):
+        output = nacoutput.open_sinks(str(tmp_path / 'NACFACTS'), ('csv', 'parquet'))
+    output.close()
+    assert [type(sink).__name__ for sink in output.sinks] == ['CsvSink']
+    assert [record.getMessage() for record in caplog.records] == ['pyarrow is not installed, skipping Parquet output']
+    assert capsys.readouterr().out == ''
+
+
+def test_parquet_row_groups(tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    sheets = {'Facts': nacoutput.SHEETS['Facts']}
+    sink = nacoutput.ParquetSink(tmp_path, sheets, row_group_rows=3)
+    for number in range(8):
+        sink.append('Facts', ['sw%d' % number, 'Cisco', None, '16.12.4', 'FOC1', number])
+        #The collector flushes after every host.
+        sink.flush()
+    assert len(sink.buffers['Facts']) == 2
+    sink.close()
+    facts = parquet.ParquetFile(str(tmp_path / 'facts.parquet'))
+    assert [facts.metadata.row_group(group).num_rows for group in range(facts.metadata.num_row_groups)] == [3, 3, 2]
+    table = facts.read()
+    assert table.column('Switch Hostname').to_pylist() == ['sw%d' % number for number in range(8)]
+    assert table.column('Model').to_pylist() == [None] * 8
+    assert table.column('Uptime').to_pylist()[-1] == '7'
@@ -0,0 +1,74 @@
+"""
+    HostStreamProcessor keeps the run going when one host's results cannot be processed: the
+    host is listed in Failed Devices and the other hosts are written as usual.
+"""
+
+from collectswitchfacts_hybrid import HostStreamProcessor, RunOptions
+from nacexclusions import PortExclusions
+from nacrules import load_rules
+
+
+def getters_result(host):
+    return {
+        'facts': {'hostname': host, 'vendor': 'Cisco', 'model': 'C9300-48P'},
+        'mac_address_table': [{'mac': '00:50:56:00:00:%02X' % number, 'interface': 'Gi1/0/1', 'vlan': 10} for number in range(3)],
+        'interfaces': {'GigabitEthernet1/0/1': {'is_enabled': True, 'is_up': True, 'description': '', 'speed': 1000}},
+    }
+
+
+#napalm returns a dict of interfaces, not a list.
+MALFORMED = dict(getters_result('bad'), interfaces=['GigabitEthernet1/0/1'])
+
+
+class FakeResult:
+    """The parts of a Nornir MultiResult the processor reads."""
+
+    def __init__(self, result):
+        self.failed = False
+        self.results = [type('Result', (), {'result': result})()]
+
+    def __getitem__(self, index):
+        return self.results[index]
+
+
+class FakeHost:
+    def __init__(self, name):
+        self.name = name
+        self.hostname = '10.0.0.1'
+        self.platform = 'ios'
+
+
+def test_malformed_host_is_reported_and_the_run_goes_on(output, oui_index):
+    portexclusions = PortExclusions()
+    processor = HostStreamProcessor(output, portexclusions, load_rules())
+    processor.host_completed('bad', MALFORMED, hostname='10.0.0.1')
+    processor.host_completed('good', getters_result('good'))
+    assert processor.failed_hosts == ['bad']
+    [failure] = output.sheet('Failed Devices')
+    assert failure[:2] == ['bad', '10.0.0.1']
+    assert failure[2].startswith('Processing failed: AttributeError')
+    assert processor.processed_hosts == 1
+    assert [row[:2] for row in output.sheet('Port Exclusion Recommendations')] == [['good', 'Gi1/0/1']]
+    assert len(portexclusions) == 0
+
+
+def test_nornir_callback_does_not_raise(output, oui_index):
+    processor = HostStreamProcessor(output, PortExclusions(), load_rules())
+    result = FakeResult(MALFORMED)
+    processor.task_instance_completed(None, FakeHost('bad'), result)
+    assert processor.failed_hosts == ['bad']
+    assert result[0].result is None
+
+
+def test_nac_config_failure_during_correlation(output, oui_index, tmp_path):
+    #A file where the NAC config directory should be makes every write fail.
+    nac_dir = tmp_path / 'nac'
+    nac_dir.write_text('')
+    processor = HostStreamProcessor(output, PortExclusions(), load_rules(), RunOptions(nac_dir=str(nac_dir), correlate=True))
+    processor.host_completed('sw1', getters_result('sw1'), {'running': 'interface GigabitEthernet1/0/2\n switchport mode access\n!\n'})
+    processor.host_completed('sw2', getters_result('sw2'))
+    processor.add_correlation_exclusions()
+    assert processor.failed_hosts == ['sw1']
+    assert not processor.deferred
+    #sw2 had no running config, so its exclusions are exported without a NAC config write.
+    assert {row[0] for row in output.sheet('Port Exclusion Recommendations')} == {'sw1', 'sw2'}
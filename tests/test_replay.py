@@ -0,0 +1,63 @@
+"""
+    Replay of the capture in tests/captures/herndon-dev, made with --capture from three of the
+    inventory-example.csv switches: an IOS switch, a Procurve captured without its platform
+    and one that timed out.
+"""
+
+import gzip
+import json
+
+from collectswitchfacts_hybrid import HostStreamProcessor, replay_snapshots
+from conftest import REPO
+from nacexclusions import PortExclusions
+from nacrules import load_rules
+from nacsnapshots import iter_snapshots, load_snapshot, save_snapshot
+
+CAPTURE = REPO / 'tests' / 'captures' / 'herndon-dev'
+
+
+def replay(output):
+    processor = HostStreamProcessor(output, PortExclusions(), load_rules())
+    replay_snapshots(CAPTURE, processor)
+    return processor
+
+
+def test_snapshots_in_host_order():
+    assert [snapshot['host'] for snapshot in iter_snapshots(CAPTURE)] == ['hdn-idf1-sw01', 'hdn-idf1-sw02', 'hdn-idf2-sw01']
+
+
+def test_snapshot_round_trip(tmp_path):
+    getters = {'facts': {'hostname': 'sw1'}, 'mac_address_table': []}
+    path = save_snapshot(tmp_path, 'sw1', '10.0.0.1', getters, platform='ios')
+    snapshot = load_snapshot(path)
+    assert (snapshot['getters'], snapshot['platform'], snapshot['failed']) == (getters, 'ios', False)
+    with gzip.open(str(path), 'rt') as f:
+        assert json.load(f)['hostname'] == '10.0.0.1'
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_replay_exclusions(output, oui_index):
+    processor = replay(output)
+    assert processor.processed_hosts == 2
+    rows = {(row[0], row[1]): row[2] for row in output.sheet('Port Exclusion Recommendations')}
+    assert rows == {
+        ('hdn-idf1-sw01', 'Gi1/0/1'): "['multimac']",
+        ('hdn-idf1-sw01', 'Gi1/0/2'): "['Description contains: ESXI']",
+        ('hdn-idf1-sw01', 'Te1/1/1'): str(["LLDP Neighbor['bridge', 'router']", 'Description contains: UPLINK']),
+        ('hdn-idf2-sw01', '1'): "['multimac']",
+        ('hdn-idf2-sw01', 'A1'): str(["LLDP Neighbor['bridge', 'router']"]),
+    }
+
+
+def test_replay_normalizes_procurve_by_vendor(output, oui_index):
+    replay(output)
+    macs = [row[2] for row in output.sheet('Mac Table Vendors') if row[0] == 'hdn-idf2-sw01']
+    assert macs == ['00:11:22:AA:00:01', '00:11:22:AA:00:02', '00:11:22:AA:00:03', '3C:52:82:00:00:04']
+    lldp = [row for row in output.sheet('LLDP Neighbors') if row[0] == 'hdn-idf2-sw01']
+    assert [(row[1], row[2], row[7]) for row in lldp] == [('A1', '00:11:22:33:44:00', "['bridge', 'router']")]
+
+
+def test_replay_failed_host(output, oui_index):
+    processor = replay(output)
+    assert processor.failed_hosts == ['hdn-idf1-sw02']
+    assert output.sheet('Failed Devices') == [['hdn-idf1-sw02', '10.83.8.164', 'Timed out after 30 seconds waiting for mac_address_table', 2]]
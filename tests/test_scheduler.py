@@ -0,0 +1,103 @@
+"""
+    CollectionScheduler worker cap, getter timeouts and host ordering, with stand-ins for the
+    Nornir task and the napalm connection.
+"""
+
+import threading
+import time
+
+import pytest
+
+from nacscheduler import CollectionScheduler, GetterTimeout
+
+
+class FakeDevice:
+    def __init__(self, release):
+        self.release = release
+
+    def get_facts(self):
+        return {'hostname': 'sw1'}
+
+    def get_mac_address_table(self):
+        #Hangs like a stuck session until the test ends.
+        self.release.wait()
+        return []
+
+
+class FakeHost:
+    def __init__(self, name, device, site=None):
+        self.name = name
+        self.device = device
+        self.data = {'site': site}
+        self.connections = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def get_connection(self, connection, config):
+        self.connections[connection] = self.device
+        return self.device
+
+    def close_connection(self, connection):
+        self.connections.pop(connection, None)
+
+
+class FakeTask:
+    def __init__(self, host):
+        self.host = host
+        self.nornir = type('Nornir', (), {'config': None})()
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_worker_cap_defaults_to_nornir_num_workers():
+    assert CollectionScheduler().start(100) == 100
+    assert CollectionScheduler(max_workers=8).start(100) == 8
+
+
+def test_timed_out_getters_do_not_use_up_capacity(release):
+    scheduler = CollectionScheduler(getter_timeouts={'mac_address_table': 0.05, 'facts': 5})
+    task = FakeTask(FakeHost('sw1', FakeDevice(release)))
+    #More hung getters than any fixed pool would hold.
+    for _ in range(30):
+        with pytest.raises(GetterTimeout):
+            scheduler.call_getter(task, 'mac_address_table')
+    assert len(scheduler.abandoned) == 30
+    start = time.perf_counter()
+    assert scheduler.call_getter(task, 'facts') == {'hostname': 'sw1'}
+    assert time.perf_counter() - start < 1
+
+
+def test_timeout_closes_the_session(release):
+    scheduler = CollectionScheduler(getter_timeouts={'mac_address_table': 0.05})
+    host = FakeHost('sw1', FakeDevice(release))
+    with pytest.raises(GetterTimeout):
+        scheduler.call_getter(FakeTask(host), 'mac_address_table')
+    assert 'napalm' not in host.connections
+
+
+def test_getter_errors_are_raised_in_the_caller():
+    class BrokenDevice(FakeDevice):
+        def get_facts(self):
+            raise ValueError('bad output')
+
+    scheduler = CollectionScheduler()
+    with pytest.raises(ValueError):
+        scheduler.call_getter(FakeTask(FakeHost('sw1', BrokenDevice(None))), 'facts')
+
+
+def test_order_hosts_interleaves_sites():
+    from nornir.core.inventory import Hosts
+
+    hosts = Hosts()
+    for name, site in [('a1', 'a'), ('a2', 'a'), ('a3', 'a'), ('b1', 'b'), ('c1', 'c'), ('c2', 'c')]:
+        hosts[name] = FakeHost(name, None, site)
+    nornir = type('Nornir', (), {})()
+    nornir.inventory = type('Inventory', (), {'hosts': hosts})()
+    CollectionScheduler().order_hosts(nornir)
+    assert list(nornir.inventory.hosts) == ['a1', 'b1', 'c1', 'a2', 'c2', 'a3']
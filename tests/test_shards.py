@@ -0,0 +1,94 @@
+"""
+    nacshards.py merging: the CSV outputs of every shard are appended into one output per
+    sheet, with each shard's ALL summary rows kept apart.
+"""
+
+import pytest
+
+from nacoutput import DIFF_SHEETS, SHEETS, open_sinks
+from nacshards import main, merge_outputs, merge_run, read_sheet, shard_name, shard_options
+
+
+def write_output(directory, rows, sheets=SHEETS):
+    output = open_sinks(str(directory), ('csv',), sheets)
+    for sheet, row in rows:
+        output.append(sheet, row)
+    assert output.close() == []
+    return directory
+
+
+def shard_rows(shard, host):
+    return [
+        ('Facts', [host, 'Cisco', 'C9300-48P', '16.12.4', 'FOC1', '1']),
+        ('Mac Table Vendors', [host, 'Gi1/0/1', '00:50:56:00:00:01', 'VMware, Inc.']),
+        ('Run Stats', [host, 'C9300-48P', '16.12.4', 'collect', '1', '2.0', '2.0', '2.0', '2.0']),
+        ('Run Stats', ['ALL', '', '', 'collect', '1', '2.0', '2.0', '2.0', '2.0']),
+    ]
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    run_dir = tmp_path / 'shards' / '2021-03-01-10-00-00'
+    write_output(run_dir / 'herndon' / 'NACFACTS-herndon-2021-03-01-10-00-00', shard_rows('herndon', 'hdn-sw1'))
+    write_output(run_dir / 'reston' / 'NACFACTS-reston-2021-03-01-09-00-00', [('Facts', ['old', '', '', '', '', ''])])
+    write_output(run_dir / 'reston' / 'NACFACTS-reston-2021-03-01-10-00-00', shard_rows('reston', 'rst-sw1') + [
+        ('Failed Devices', ['rst-sw2', '10.84.1.21', 'Timed out', '2']),
+    ])
+    write_output(run_dir / 'reston' / 'NACDIFF-reston-2021-03-01-10-00-00', [('Changes', ['rst-sw1', '', 'Host added', ''])], DIFF_SHEETS)
+    return run_dir
+
+
+def test_merge_outputs(run_dir, tmp_path):
+    shards = [('herndon', run_dir / 'herndon' / 'NACFACTS-herndon-2021-03-01-10-00-00'), ('reston', run_dir / 'reston' / 'NACFACTS-reston-2021-03-01-10-00-00')]
+    sheets = {sheet: SHEETS[sheet] for sheet in ('Facts', 'Run Stats', 'Failed Devices')}
+    counts = merge_outputs(shards, str(tmp_path / 'merged'), ('csv',), sheets)
+    assert counts == {'Facts': 2, 'Run Stats': 4, 'Failed Devices': 1}
+    assert [row[0] for row in read_sheet(tmp_path / 'merged', 'Facts')] == ['hdn-sw1', 'rst-sw1']
+    assert [row[0] for row in read_sheet(tmp_path / 'merged', 'Run Stats')] == ['hdn-sw1', 'ALL:herndon', 'rst-sw1', 'ALL:reston']
+    assert list(read_sheet(tmp_path / 'merged', 'Failed Devices')) == [['rst-sw2', '10.84.1.21', 'Timed out', '2']]
+
+
+def test_merge_run_uses_the_latest_output_of_each_shard(run_dir, tmp_path):
+    counts = merge_run(run_dir, str(tmp_path / 'NACFACTS'), ('csv',), str(tmp_path / 'NACDIFF'))
+    assert (counts['Facts'], counts['Mac Table Vendors'], counts['Interfaces']) == (2, 2, 0)
+    assert 'old' not in [row[0] for row in read_sheet(tmp_path / 'NACFACTS', 'Facts')]
+    assert list(read_sheet(tmp_path / 'NACDIFF', 'Changes')) == [['rst-sw1', '', 'Host added', '']]
+
+
+def test_merge_run_without_changes(run_dir, tmp_path):
+    (run_dir / 'reston' / 'NACDIFF-reston-2021-03-01-10-00-00' / 'changes.csv.gz').unlink()
+    (run_dir / 'reston' / 'NACDIFF-reston-2021-03-01-10-00-00').rmdir()
+    merge_run(run_dir, str(tmp_path / 'NACFACTS'), ('csv',), str(tmp_path / 'NACDIFF'))
+    assert not (tmp_path / 'NACDIFF').exists()
+
+
+def test_missing_sheet_reads_empty(tmp_path):
+    assert list(read_sheet(tmp_path, 'Facts')) == []
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('herndon', 'herndon'),
+    ('herndon-dev', 'herndon-dev'),
+    ('Building 7/IDF', 'Building_7_IDF'),
+])
+def test_shard_name(value, expected):
+    assert shard_name(value) == expected
+
+
+@pytest.mark.parametrize('collector_args, expected', [
+    (['--retries', '3', '--cache', 'cache'], []),
+    (['--site', 'reston'], ['--site']),
+    (['--format=xlsx', '--tag', 'idf'], ['--format', '--tag']),
+    (['--output-d', 'out', '--metrics', 'x.prom', '--group', 'all'], ['--output-d', '--metrics', '--group']),
+    (['--site-limit', '2', '--role', 'access'], []),
+])
+def test_shard_options(collector_args, expected):
+    assert shard_options(collector_args) == expected
+
+
+def test_shard_options_are_rejected(tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit:
+        main(['run', '--site', 'herndon', '--shards', str(tmp_path), '--', '--retries', '3', '--format', 'xlsx'])
+    assert exit.value.code == 2
+    assert 'options set per shard cannot be passed to the collectors: --format' in capsys.readouterr().err
+    assert not list(tmp_path.iterdir())
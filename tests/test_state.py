@@ -0,0 +1,136 @@
+"""
+    Change detection: HostState as filled in by process_host, the Changes rows of
+    diff_states and the StateStore kept between runs.
+"""
+
+from collectswitchfacts_hybrid import HostStreamProcessor, RunOptions, process_host
+from conftest import ListOutput
+from nacexclusions import PortExclusions
+from nacnormalize import normalize_host
+from nacrules import load_rules
+from nacstate import HostState, StateStore, diff_states, state_digest
+
+
+def host_state(port_macs, mac_sample=None):
+    """State of a switch with port_macs MACs on Gi1/0/1, processed with mac_sample."""
+    getters_result = {
+        'facts': {'hostname': 'sw1', 'vendor': 'Cisco'},
+        'mac_address_table': [{'mac': '00:50:56:00:00:%02X' % number, 'interface': 'Gi1/0/1', 'vlan': 10} for number in range(port_macs)],
+    }
+    state = HostState()
+    process_host('sw1', normalize_host(getters_result, 'ios'), ListSink(), PortExclusions(), load_rules(), state, mac_sample=mac_sample)
+    return state.as_dict()
+
+
+class ListSink:
+    def append(self, sheet, row):
+        pass
+
+
+def mac_changes(rows):
+    return [row for row in rows if row[2] in ('MAC added', 'MAC removed')]
+
+
+def test_sampled_port_growing_past_the_sample(oui_index):
+    old = host_state(5, mac_sample=10)
+    new = host_state(15, mac_sample=10)
+    assert old['macs']['Gi1/0/1'] and 'untracked' not in old
+    assert new['untracked'] == {'Gi1/0/1': 15} and 'Gi1/0/1' not in new['macs']
+    assert mac_changes(diff_states('sw1', old, new)) == []
+
+
+def test_multimac_flag_on_an_untracked_port_reports_its_count(oui_index):
+    rows = diff_states('sw1', host_state(1, mac_sample=10), host_state(15, mac_sample=10))
+    assert rows == [['sw1', 'Gi1/0/1', 'Multi MAC flagged', 15], ['sw1', 'Gi1/0/1', 'Exclusion added', 'multimac']]
+
+
+def test_sampled_port_shrinking_into_the_sample(oui_index):
+    assert mac_changes(diff_states('sw1', host_state(15, mac_sample=10), host_state(5, mac_sample=10))) == []
+
+
+def test_sampled_ports_within_the_sample_are_compared(oui_index):
+    rows = mac_changes(diff_states('sw1', host_state(3, mac_sample=10), host_state(5, mac_sample=10)))
+    assert rows == [['sw1', 'Gi1/0/1', 'MAC added', '00:50:56:00:00:03'], ['sw1', 'Gi1/0/1', 'MAC added', '00:50:56:00:00:04']]
+
+
+def test_unsampled_state_has_no_untracked_key(oui_index):
+    assert 'untracked' not in host_state(15)
+
+
+def state(macs=None, multimac=(), lldp=None, exclusions=None):
+    return {'macs': macs or {}, 'multimac': list(multimac), 'lldp': lldp or {}, 'exclusions': exclusions or {}}
+
+
+def test_identical_states_have_no_changes():
+    old = state({'Gi1/0/1': ['00:50:56:00:00:01']}, lldp={'Te1/1/1': 'dist1'}, exclusions={'Te1/1/1': ['uplink']})
+    assert diff_states('sw1', old, old) == []
+
+
+def test_mac_changes():
+    old = state({'Gi1/0/1': ['00:50:56:00:00:01', '00:50:56:00:00:02'], 'Gi1/0/2': ['00:50:56:00:00:03']})
+    new = state({'Gi1/0/1': ['00:50:56:00:00:02', '00:50:56:00:00:04'], 'Gi1/0/3': ['00:50:56:00:00:03']})
+    assert diff_states('sw1', old, new) == [
+        ['sw1', 'Gi1/0/1', 'MAC added', '00:50:56:00:00:04'],
+        ['sw1', 'Gi1/0/1', 'MAC removed', '00:50:56:00:00:01'],
+        ['sw1', 'Gi1/0/2', 'MAC removed', '00:50:56:00:00:03'],
+        ['sw1', 'Gi1/0/3', 'MAC added', '00:50:56:00:00:03'],
+    ]
+
+
+def test_multimac_changes_report_the_mac_count():
+    old = state({'Gi1/0/1': ['00:50:56:00:00:01', '00:50:56:00:00:02']}, multimac=['Gi1/0/1'])
+    new = state({'Gi1/0/1': ['00:50:56:00:00:01'], 'Gi1/0/2': ['00:50:56:00:00:03', '00:50:56:00:00:04']}, multimac=['Gi1/0/2'])
+    rows = [row for row in diff_states('sw1', old, new) if row[2].startswith('Multi MAC')]
+    assert rows == [['sw1', 'Gi1/0/2', 'Multi MAC flagged', 2], ['sw1', 'Gi1/0/1', 'Multi MAC cleared', 1]]
+
+
+def test_lldp_changes():
+    old = state(lldp={'Te1/1/1': 'dist1', 'Te1/1/2': 'dist2'})
+    new = state(lldp={'Te1/1/1': 'dist3', 'Gi1/0/48': 'ap1'})
+    assert diff_states('sw1', old, new) == [
+        ['sw1', 'Gi1/0/48', 'LLDP neighbor added', 'ap1'],
+        ['sw1', 'Te1/1/1', 'LLDP neighbor changed', 'dist1 -> dist3'],
+        ['sw1', 'Te1/1/2', 'LLDP neighbor removed', 'dist2'],
+    ]
+
+
+def test_exclusion_changes():
+    old = state(exclusions={'Gi1/0/1': ['multimac'], 'Te1/1/1': ['Description contains: UPLINK']})
+    new = state(exclusions={'Gi1/0/1': ['multimac', 'Description contains: ESXI']})
+    assert diff_states('sw1', old, new) == [
+        ['sw1', 'Gi1/0/1', 'Exclusion added', 'Description contains: ESXI'],
+        ['sw1', 'Te1/1/1', 'Exclusion removed', 'Description contains: UPLINK'],
+    ]
+
+
+def test_state_store_round_trip(tmp_path):
+    store = StateStore(tmp_path / 'state')
+    new_state = host_state(2)
+    store.save('sw1', new_state, state_digest(new_state))
+    assert store.load('sw1') == {'format': 1, 'host': 'sw1', 'digest': state_digest(new_state), 'state': new_state}
+    assert store.load('sw2') is None
+    store.host_path('sw2').write_text('{truncated')
+    assert store.load('sw2') is None
+
+
+def test_record_changes_between_runs(tmp_path, output, oui_index):
+    options = RunOptions(state_dir=str(tmp_path / 'state'))
+
+    def run(port_macs):
+        changes = ListOutput()
+        processor = HostStreamProcessor(output, PortExclusions(), load_rules(), options, diff_output=changes)
+        getters_result = {
+            'facts': {'hostname': 'sw1', 'vendor': 'Cisco'},
+            'mac_address_table': [{'mac': '00:50:56:00:00:%02X' % number, 'interface': 'Gi1/0/1', 'vlan': 10} for number in range(port_macs)],
+        }
+        processor.host_completed('sw1', getters_result, platform='ios')
+        return processor, changes.sheet('Changes')
+
+    processor, rows = run(1)
+    assert rows == [['sw1', '', 'Host added', '']]
+    #An unchanged host matches the saved digest and writes no rows.
+    processor, rows = run(1)
+    assert (rows, processor.unchanged_hosts, processor.changed_hosts) == ([], 1, 0)
+    processor, rows = run(2)
+    assert mac_changes(rows) == [['sw1', 'Gi1/0/1', 'MAC added', '00:50:56:00:00:01']]
+    assert processor.changed_hosts == 1